@@ -1,8 +1,12 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 from pydantic import BaseModel
 from typing import Dict, Any
 from app.services.database_cloud import CloudDatabaseService
+from app.services.query_scheduler import query_scheduler, QueryPriority, QueueFullError
+from app.services.result_cache import normalize_sql
+from app.services.single_flight import query_flights
 from app.middleware.auth import get_current_user
+from app.core.security import connection_fingerprint
 
 router = APIRouter()
 
@@ -18,20 +22,30 @@ class DatabaseQueryRequest(BaseModel):
 async def test_database_connection(request: ConnectionTestRequest):
     """Test connection to a remote cloud database (public endpoint)"""
     try:
-        result = CloudDatabaseService.test_connection(request.connection_string)
+        result = await CloudDatabaseService.test_connection_async(request.connection_string)
         return result
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/execute-query") 
-async def execute_database_query(request: DatabaseQueryRequest):
+async def execute_database_query(request: DatabaseQueryRequest, http_request: Request):
     """Execute read-only query on remote database"""
     try:
-        result = CloudDatabaseService.execute_read_only_query(
-            request.connection_string, 
-            request.sql_query
-        )
-        return result
+        # Unauthenticated endpoint: share fairly by client address
+        client_id = f"anonymous:{http_request.client.host if http_request.client else 'unknown'}"
+        
+        async def execute():
+            async with query_scheduler.slot(client_id, priority=QueryPriority.INTERACTIVE):
+                return await CloudDatabaseService.execute_read_only_query_async(
+                    request.connection_string, 
+                    request.sql_query
+                )
+        
+        # Callers presenting the same credentials and query share one execution
+        key = (connection_fingerprint(request.connection_string), normalize_sql(request.sql_query), "rows")
+        return await query_flights.do(key, execute)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -39,7 +53,7 @@ async def execute_database_query(request: DatabaseQueryRequest):
 async def get_database_schema(request: ConnectionTestRequest):
     """Get schema information from remote database"""
     try:
-        result = CloudDatabaseService.get_schema_info(request.connection_string)
+        result = await CloudDatabaseService.get_schema_info_async(request.connection_string)
         return result
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
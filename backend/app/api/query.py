@@ -1,15 +1,38 @@
-from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
-from typing import List, Dict, Any
+from fastapi import APIRouter, HTTPException, Depends, Response
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, Field
+from typing import List, Dict, Any, AsyncIterator, Optional, Literal, Tuple
+from contextlib import AsyncExitStack
 from app.services.llm_service import llm_service
 from app.services.database_cloud import CloudDatabaseService
 from app.services.audit_service import audit_service
+from app.services.query_scheduler import query_scheduler, QueryPriority, QueueFullError
+from app.services.pagination import page_store, fetch_first_page, fetch_next_page
+from app.services.result_spill import SpillExpiredError
+from app.services.result_cache import result_cache, normalize_sql
+from app.services.schema_cache import schema_cache
+from app.services.single_flight import query_flights
+from app.services.columnar import ColumnarResult
+from app.services.running_queries import running_queries, QueryCancelledError
+from app.services.query_cost import cost_limit_exceeded
+from app.services.sql_rewriter import rewrite_query, sample_query, sql_dialect
 from app.api.sessions import get_user_session
 from app.middleware.auth import get_current_user
+from app.core.json_encoding import dumps, dumps_bytes
+from app.core.metrics import metrics
+from app.core.config import settings
+from app.core.security import connection_fingerprint
+import asyncio
+import time
 import uuid
 
 router = APIRouter()
 
+# Result wire formats: row dicts (default, for existing clients), columnar JSON, Arrow IPC stream
+ResultFormat = Literal["rows", "columnar", "arrow"]
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
 class NaturalLanguageQueryRequest(BaseModel):
     prompt: str
     session_id: str
@@ -20,11 +43,18 @@ class QueryPreviewResponse(BaseModel):
     explanation: str
     warnings: List[str]
     confidence: float
+    estimated_rows: Optional[int] = None  # Planner estimates (None if EXPLAIN was unavailable)
+    estimated_cost: Optional[float] = None
 
 class QueryExecutionRequest(BaseModel):
     query_id: str
     sql_query: str
     confirm_execution: bool = False
+    stream: bool = False  # Stream rows as NDJSON instead of a single JSON payload
+    page_size: Optional[int] = Field(None, ge=1, le=settings.MAX_PAGE_SIZE)
+    bypass_cache: bool = False  # Always re-run against the database
+    format: ResultFormat = "rows"
+    sample_percent: Optional[float] = Field(None, gt=0, lt=100)  # Quick look: run on a random sample
 
 class QueryExecutionResponse(BaseModel):
     success: bool
@@ -33,6 +63,53 @@ class QueryExecutionResponse(BaseModel):
     row_count: int
     explanation: str
     follow_up_suggestions: List[str]
+    next_token: Optional[str] = None
+    has_more: bool = False
+    truncated: bool = False  # Fetching stopped at the row or byte budget
+    truncation: Optional[Dict[str, Any]] = None  # {"reason": "max_rows" | "max_bytes", "limit": n}
+    rewrites: List[str] = []  # Changes made to bound the SQL before execution
+    approximate: bool = False  # Computed from a sample; run again without sample_percent for exact results
+    sample_percent: Optional[float] = None
+
+class QueryPageRequest(BaseModel):
+    continuation_token: str
+    format: ResultFormat = "rows"
+
+class QueryPageResponse(BaseModel):
+    success: bool
+    data: List[Dict[str, Any]]
+    columns: List[str]
+    row_count: int
+    next_token: Optional[str] = None
+    has_more: bool = False
+    truncated: bool = False
+    truncation: Optional[Dict[str, Any]] = None
+
+class QueryBatchItem(BaseModel):
+    query_id: str
+    sql_query: str
+
+class QueryBatchRequest(BaseModel):
+    queries: List[QueryBatchItem] = Field(..., min_length=1, max_length=settings.QUERY_BATCH_MAX_QUERIES)
+    confirm_execution: bool = False
+    bypass_cache: bool = False
+
+class QueryBatchResult(BaseModel):
+    query_id: str
+    success: bool
+    status_code: int = 200  # What /query/execute would have answered for this query
+    error: Optional[str] = None
+    data: List[Dict[str, Any]] = []
+    columns: List[str] = []
+    row_count: int = 0
+    truncated: bool = False
+    truncation: Optional[Dict[str, Any]] = None
+    rewrites: List[str] = []
+    cache: Optional[str] = None  # HIT | MISS | BYPASS
+
+class QueryBatchResponse(BaseModel):
+    success: bool  # Every query succeeded
+    results: List[QueryBatchResult]
 
 # In-memory storage for query previews (no local persistence)
 _query_cache = {}
@@ -49,8 +126,16 @@ async def preview_natural_language_query(
         # Get connection string for the session
         connection_string = get_user_session(request.session_id, current_user)
         
-        # Get schema info for context
-        schema_result = CloudDatabaseService.get_schema_info(connection_string)
+        # Get schema info for context (cached: only a miss or an expired entry touches the database)
+        schema_result = schema_cache.lookup(connection_string)
+        if schema_result is None:
+            async with query_scheduler.slot(
+                user_id,
+                request.session_id,
+                priority=QueryPriority.INTERACTIVE,
+                weight=query_scheduler.weight_for_role(current_user.get('role'))
+            ):
+                schema_result = await schema_cache.get(connection_string)
         schema_info = schema_result if schema_result["success"] else None
         
         # Generate SQL using real LLM service
@@ -62,14 +147,35 @@ async def preview_natural_language_query(
         if not llm_result["success"]:
             raise HTTPException(status_code=400, detail="Failed to generate SQL")
         
+        # Bound the generated SQL (LIMIT, explicit columns) so the preview shows what will run
+        schema_columns = schema_info.get("columns") if schema_info else None
+        rewrite = rewrite_query(llm_result["sql"], sql_dialect(connection_string), schema_columns=schema_columns)
+        sql = rewrite["sql"]
+        
+        # Cost preflight: planner estimates for the generated SQL (best effort)
+        async with query_scheduler.slot(
+            user_id,
+            request.session_id,
+            priority=QueryPriority.INTERACTIVE,
+            weight=query_scheduler.weight_for_role(current_user.get('role'))
+        ):
+            plan = await CloudDatabaseService.explain_query_async(connection_string, sql)
+        if not plan["success"]:
+            plan = {"estimated_rows": None, "estimated_cost": None, "warnings": []}
+        
         query_id = str(uuid.uuid4())
         
         # Store in cache temporarily (associated with session and user)
         _query_cache[query_id] = {
-            "sql": llm_result["sql"],
+            "sql": sql,
             "prompt": request.prompt,
             "session_id": request.session_id,
-            "user_id": user_id
+            "user_id": user_id,
+            "estimated_cost": plan["estimated_cost"],
+            "schema_columns": schema_columns,
+            # Relations that can't be block-sampled (TABLESAMPLE rejects views)
+            "views": [name for name, table in schema_info.get("schema", {}).items() if table.get("kind") == "view"]
+                     if schema_info else None
         }
         
         # Log audit event
@@ -77,24 +183,31 @@ async def preview_natural_language_query(
             user_id=user_id,
             session_id=request.session_id,
             natural_language=request.prompt,
-            generated_sql=llm_result["sql"],
+            generated_sql=sql,
             confidence=llm_result["confidence"]
         )
         
         return QueryPreviewResponse(
             query_id=query_id,
-            sql_generated=llm_result["sql"],
+            sql_generated=sql,
             explanation=llm_result["explanation"],
-            warnings=llm_result["warnings"],
-            confidence=llm_result["confidence"]
+            warnings=llm_result["warnings"] + rewrite["changes"] + plan["warnings"],
+            confidence=llm_result["confidence"],
+            estimated_rows=plan["estimated_rows"],
+            estimated_cost=plan["estimated_cost"]
         )
         
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/execute", response_model=QueryExecutionResponse)
 async def execute_query(
     request: QueryExecutionRequest,
+    response: Response,
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """Execute confirmed SQL query using secure session context"""
@@ -118,11 +231,82 @@ async def execute_query(
         # Get connection string for the session
         connection_string = get_user_session(cached_query["session_id"], current_user)
         
-        # Execute the query
-        result = CloudDatabaseService.execute_read_only_query(
-            connection_string,
-            request.sql_query
+        # The submitted SQL may have been edited since the preview: bound it again
+        rewrite = rewrite_query(
+            request.sql_query,
+            sql_dialect(connection_string),
+            schema_columns=cached_query.get("schema_columns")
         )
+        sql_query = rewrite["sql"]
+        rewrites = rewrite["changes"]
+        
+        sample_percent = None
+        if request.sample_percent:
+            sample = sample_query(
+                sql_query, sql_dialect(connection_string), request.sample_percent, views=cached_query.get("views")
+            )
+            sql_query = sample["sql"]
+            rewrites = rewrites + sample["changes"]
+            sample_percent = request.sample_percent if sample["sampled"] else None
+        
+        if request.stream:
+            await _enforce_cost_limit(connection_string, sql_query, cached_query)
+            stream_response = await _stream_query_results(
+                request.query_id,
+                sql_query,
+                connection_string,
+                user_id,
+                cached_query["session_id"],
+                query_scheduler.weight_for_role(current_user.get('role')),
+                running_queries.timeout_for_role(current_user.get('role')),
+                sample_percent
+            )
+            if sample_percent is None:
+                _query_cache.pop(request.query_id, None)
+            return stream_response
+        
+        # Serve repeated queries from the result cache (paginated results are never cached)
+        fingerprint = connection_fingerprint(connection_string)
+        role = current_user.get('role')
+        cacheable = not request.page_size and not request.bypass_cache
+        cache_hit = result_cache.get(fingerprint, sql_query, role, cached_query["session_id"]) if cacheable else None
+        
+        if cache_hit:
+            result, age = cache_hit
+            response.headers["X-Cache"] = "HIT"
+            response.headers["Age"] = str(int(age))
+        else:
+            await _enforce_cost_limit(connection_string, sql_query, cached_query)
+            
+            if request.page_size:
+                # Execute the query (cancellable via DELETE /query/{query_id} while it runs)
+                with running_queries.track(request.query_id, user_id):
+                    async with query_scheduler.slot(
+                        user_id,
+                        cached_query["session_id"],
+                        priority=QueryPriority.INTERACTIVE,
+                        weight=query_scheduler.weight_for_role(role)
+                    ):
+                        result = await fetch_first_page(
+                            connection_string,
+                            sql_query,
+                            request.page_size,
+                            user_id,
+                            cached_query["session_id"],
+                            query_id=request.query_id,
+                            statement_timeout=running_queries.timeout_for_role(role)
+                        )
+                    
+                    if running_queries.is_cancelled(request.query_id):
+                        raise HTTPException(status_code=409, detail="Query was cancelled")
+            else:
+                result = await _execute_shared(
+                    connection_string, sql_query, request.query_id, user_id, cached_query["session_id"], role
+                )
+            
+            if cacheable and result["success"]:
+                result_cache.put(fingerprint, sql_query, role, result, cached_query["session_id"])
+            response.headers["X-Cache"] = "MISS" if cacheable else "BYPASS"
         
         if not result["success"]:
             raise HTTPException(status_code=400, detail=result["message"])
@@ -133,7 +317,7 @@ async def execute_query(
         # Generate explanations and suggestions
         explanation = await llm_service.explain_results(
             result["data"], 
-            request.sql_query, 
+            sql_query, 
             original_prompt
         )
         
@@ -142,21 +326,407 @@ async def execute_query(
             original_prompt
         )
         
-        # Clean up cache
-        del _query_cache[request.query_id]
+        # Clean up cache (a sampled run keeps the query so the full version can follow)
+        if sample_percent is None:
+            _query_cache.pop(request.query_id, None)
         
-        return QueryExecutionResponse(
+        if request.format != "rows":
+            return _columnar_response(request.format, result, response, {
+                "explanation": explanation,
+                "follow_up_suggestions": suggestions,
+                "rewrites": rewrites,
+                "approximate": sample_percent is not None,
+                "sample_percent": sample_percent
+            })
+        
+        return _rows_response(QueryExecutionResponse(
             success=True,
-            data=result["data"],
+            data=[],
             columns=result["columns"],
             row_count=result["row_count"],
             explanation=explanation,
-            follow_up_suggestions=suggestions
-        )
+            follow_up_suggestions=suggestions,
+            next_token=result.get("next_token"),
+            has_more=result.get("has_more", False),
+            truncated=result.get("truncated", False),
+            truncation=result.get("truncation"),
+            rewrites=rewrites,
+            approximate=sample_percent is not None,
+            sample_percent=sample_percent
+        ), result, response)
+        
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/page", response_model=QueryPageResponse)
+async def get_next_page(
+    request: QueryPageRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Fetch the next page of a paginated query result"""
+    try:
+        user_id = current_user['user_id']
+        
+        state = page_store.take(request.continuation_token, user_id)
+        if not state:
+            raise HTTPException(status_code=404, detail="Continuation token not found or expired")
+        
+        connection_string = get_user_session(state["session_id"], current_user)
+        
+        async with query_scheduler.slot(
+            user_id,
+            state["session_id"],
+            priority=QueryPriority.INTERACTIVE,
+            weight=query_scheduler.weight_for_role(current_user.get('role'))
+        ):
+            result = await fetch_next_page(state, connection_string)
+        
+        if not result["success"]:
+            raise HTTPException(status_code=400, detail=result["message"])
+        
+        if request.format != "rows":
+            return _columnar_response(request.format, result)
+        
+        return _rows_response(QueryPageResponse(
+            success=True,
+            data=[],
+            columns=result["columns"],
+            row_count=result["row_count"],
+            next_token=result["next_token"],
+            has_more=result["has_more"],
+            truncated=result["truncated"],
+            truncation=result["truncation"]
+        ), result)
+        
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except SpillExpiredError as e:
+        raise HTTPException(status_code=410, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/batch", response_model=QueryBatchResponse)
+async def execute_query_batch(
+    request: QueryBatchRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Execute several previewed queries of one session concurrently (e.g. a dashboard).
+    
+    Authorization and session lookup happen once; each query then runs
+    like a non-streamed /query/execute (rewrite, cache, cost limit,
+    scheduler slot), at most QUERY_BATCH_MAX_CONCURRENCY at a time.
+    Per-query failures are reported in place rather than failing the batch.
+    """
+    try:
+        user_id = current_user['user_id']
+        role = current_user.get('role')
+        
+        if not request.confirm_execution:
+            raise HTTPException(status_code=400, detail="Query execution must be confirmed")
+        
+        query_ids = [item.query_id for item in request.queries]
+        if len(set(query_ids)) != len(query_ids):
+            raise HTTPException(status_code=400, detail="Each query may appear only once in a batch")
+        
+        # Verify every query belongs to the current user and the same session
+        cached_queries = {}
+        for query_id in query_ids:
+            cached_query = _query_cache.get(query_id)
+            if not cached_query or cached_query.get("user_id") != user_id:
+                raise HTTPException(status_code=403, detail="Query not found or not authorized for this user")
+            cached_queries[query_id] = cached_query
+        
+        session_ids = {q["session_id"] for q in cached_queries.values()}
+        if len(session_ids) != 1:
+            raise HTTPException(status_code=400, detail="All queries in a batch must belong to the same session")
+        session_id = session_ids.pop()
+        
+        connection_string = get_user_session(session_id, current_user)
+        fingerprint = connection_fingerprint(connection_string)
+        dialect = sql_dialect(connection_string)
+        limit = asyncio.Semaphore(settings.QUERY_BATCH_MAX_CONCURRENCY)
+        # Successful results by query id; rows are spliced into the response body unvalidated
+        results: Dict[str, Dict[str, Any]] = {}
+        
+        async def run(item: QueryBatchItem) -> QueryBatchResult:
+            cached_query = cached_queries[item.query_id]
+            try:
+                rewrite = rewrite_query(item.sql_query, dialect, schema_columns=cached_query.get("schema_columns"))
+                sql_query = rewrite["sql"]
+                async with limit:
+                    cache_hit = None if request.bypass_cache else result_cache.get(fingerprint, sql_query, role, session_id)
+                    if cache_hit:
+                        result, cache = cache_hit[0], "HIT"
+                    else:
+                        await _enforce_cost_limit(connection_string, sql_query, cached_query)
+                        result = await _execute_shared(connection_string, sql_query, item.query_id, user_id, session_id, role)
+                        if not request.bypass_cache and result["success"]:
+                            result_cache.put(fingerprint, sql_query, role, result, session_id)
+                        cache = "BYPASS" if request.bypass_cache else "MISS"
+                
+                if not result["success"]:
+                    return QueryBatchResult(query_id=item.query_id, success=False, status_code=400,
+                                            error=result["message"], rewrites=rewrite["changes"])
+                
+                _query_cache.pop(item.query_id, None)
+                results[item.query_id] = result
+                return QueryBatchResult(
+                    query_id=item.query_id,
+                    success=True,
+                    columns=result["columns"],
+                    row_count=result["row_count"],
+                    truncated=result.get("truncated", False),
+                    truncation=result.get("truncation"),
+                    rewrites=rewrite["changes"],
+                    cache=cache
+                )
+            except QueueFullError as e:
+                return QueryBatchResult(query_id=item.query_id, success=False, status_code=429, error=str(e))
+            except HTTPException as e:
+                return QueryBatchResult(query_id=item.query_id, success=False, status_code=e.status_code, error=e.detail)
+            except Exception as e:
+                return QueryBatchResult(query_id=item.query_id, success=False, status_code=400, error=str(e))
+        
+        items = await asyncio.gather(*(run(item) for item in request.queries))
+        metrics.increment("query_batches_total")
+        metrics.observe("query_batch_size", len(items))
+        
+        started = time.perf_counter()
+        body = QueryBatchResponse(success=all(i.success for i in items), results=items).model_dump(mode="json")
+        for item in body["results"]:
+            if item["query_id"] in results:
+                item["data"] = _json_records(results[item["query_id"]])
+        content = dumps_bytes(body)
+        metrics.observe("result_serialization_seconds", time.perf_counter() - started, format="rows")
+        return Response(content, media_type="application/json")
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.delete("/{query_id}")
+async def cancel_query(
+    query_id: str,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Cancel a running query server-side and free its connection"""
+    try:
+        cancelled = await asyncio.to_thread(running_queries.cancel, query_id, current_user['user_id'])
+        if not cancelled:
+            raise HTTPException(status_code=404, detail="Query not found or not running")
+        
+        return {"success": True, "query_id": query_id, "message": "Query cancelled"}
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+# Shared executions in flight: query_flights key -> (execution query_id, owner user_id)
+_shared_executions: Dict[Any, Tuple[str, str]] = {}
+
+async def _execute_shared(connection_string: str, sql_query: str, query_id: str,
+                          user_id: str, session_id: str, role: Optional[str]) -> Dict[str, Any]:
+    """Run a query as a columnar result, cancellable via DELETE /query/{query_id} while it runs.
+    
+    Identical queries already running on the same database share that
+    execution; callers must have checked ownership of the query first.
+    Cancelling withdraws only the caller (answered with 409 right away);
+    the shared statement is interrupted on the server once no caller is
+    left waiting for it.
+    """
+    key = (connection_fingerprint(connection_string), normalize_sql(sql_query), "columnar", role)
+    
+    async def execute():
+        # Tracked under its own id so the server-side cancel handle belongs to no single caller
+        execution_id = f"{query_id}:shared"
+        with running_queries.track(execution_id, user_id):
+            _shared_executions[key] = (execution_id, user_id)
+            try:
+                async with query_scheduler.slot(
+                    user_id,
+                    session_id,
+                    priority=QueryPriority.INTERACTIVE,
+                    weight=query_scheduler.weight_for_role(role)
+                ):
+                    return await CloudDatabaseService.execute_read_only_query_async(
+                        connection_string,
+                        sql_query,
+                        columnar=True,
+                        query_id=execution_id,
+                        statement_timeout=running_queries.timeout_for_role(role)
+                    )
+            finally:
+                _shared_executions.pop(key, None)
+    
+    with running_queries.track(query_id, user_id):
+        loop = asyncio.get_running_loop()
+        withdrawn = asyncio.Event()
+        try:
+            running_queries.attach(query_id, lambda: loop.call_soon_threadsafe(withdrawn.set))
+        except QueryCancelledError:
+            raise HTTPException(status_code=409, detail="Query was cancelled")
+        
+        flight = asyncio.ensure_future(query_flights.do(key, execute))
+        withdrawal = asyncio.ensure_future(withdrawn.wait())
+        try:
+            await asyncio.wait({flight, withdrawal}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            withdrawal.cancel()
+        
+        if not flight.done():
+            # Stop waiting (the shared work is shielded), then interrupt it if nobody else is
+            flight.cancel()
+            await asyncio.gather(flight, return_exceptions=True)
+            execution = _shared_executions.get(key)
+            if execution is not None and query_flights.waiters(key) == 0:
+                await asyncio.to_thread(running_queries.cancel, *execution)
+            raise HTTPException(status_code=409, detail="Query was cancelled")
+        
+        result = flight.result()
+        if running_queries.is_cancelled(query_id):
+            raise HTTPException(status_code=409, detail="Query was cancelled")
+    return result
+
+async def _enforce_cost_limit(connection_string: str, sql_query: str, cached_query: Dict[str, Any]):
+    """Refuse queries whose planner cost exceeds QUERY_MAX_ESTIMATED_COST (when configured)"""
+    if not settings.QUERY_MAX_ESTIMATED_COST:
+        return
+    
+    # The SQL may have been edited since the preview estimated it
+    cost = cached_query.get("estimated_cost") if cached_query["sql"] == sql_query else None
+    if cost is None:
+        plan = await CloudDatabaseService.explain_query_async(connection_string, sql_query)
+        cost = plan.get("estimated_cost")
+    
+    if cost_limit_exceeded(cost):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Estimated query cost {cost:,.0f} exceeds the limit of {settings.QUERY_MAX_ESTIMATED_COST:,.0f}"
+        )
+
+def _cache_headers(response: Optional[Response]) -> Optional[Dict[str, str]]:
+    """X-Cache / Age headers set on the injected response, for endpoints returning their own Response"""
+    return {k: v for k, v in response.headers.items() if k in ("x-cache", "age")} if response else None
+
+def _json_records(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Row-dict data for the legacy JSON format, converted to JSON types once per column"""
+    table = result.get("result")
+    if table is None:
+        table = ColumnarResult.from_rows(result["columns"], [tuple(row.values()) for row in result["data"]])
+    return table.to_json_records()
+
+def _rows_response(model: BaseModel, result: Dict[str, Any], response: Optional[Response] = None) -> Response:
+    """Serialize a row-format response without validating every cell.
+    
+    The model validates and serializes every field except `data`, whose
+    rows are converted column by column and spliced in before encoding.
+    """
+    started = time.perf_counter()
+    body = model.model_dump(mode="json")
+    body["data"] = _json_records(result)
+    content = dumps_bytes(body)
+    metrics.observe("result_serialization_seconds", time.perf_counter() - started, format="rows")
+    return Response(content, media_type="application/json", headers=_cache_headers(response))
+
+def _columnar_response(format: str, result: Dict[str, Any], response: Optional[Response] = None,
+                       extra: Optional[Dict[str, Any]] = None) -> Response:
+    """Serialize a result as columnar JSON or an Arrow IPC stream.
+    
+    For Arrow, the non-tabular fields (row count, continuation token,
+    explanation...) travel as JSON-encoded schema metadata.
+    """
+    table = result.get("result")
+    if table is None:
+        table = ColumnarResult.from_rows(result["columns"], [tuple(row.values()) for row in result["data"]])
+    
+    meta = {
+        "success": True,
+        "row_count": result["row_count"],
+        "next_token": result.get("next_token"),
+        "has_more": result.get("has_more", False),
+        "truncated": result.get("truncated", False),
+        "truncation": result.get("truncation"),
+        **(extra or {})
+    }
+    headers = _cache_headers(response)
+    
+    if format == "arrow":
+        body = table.to_arrow_ipc({key: dumps(value) for key, value in meta.items()})
+        return Response(body, media_type=ARROW_STREAM_MEDIA_TYPE, headers=headers)
+    
+    return Response(dumps({**meta, "format": "columnar", **table.to_columnar_json()}),
+                    media_type="application/json", headers=headers)
+
+async def _stream_query_results(query_id: str, sql_query: str, connection_string: str,
+                                user_id: str, session_id: str, weight: float,
+                                statement_timeout: float, sample_percent: Optional[float] = None) -> StreamingResponse:
+    """Stream query rows as NDJSON from a server-side cursor.
+    
+    The first line is a meta object with the column names (and the sampling
+    rate for sampled runs), each following line is one row as a JSON array,
+    and the last line reports the row count (or an error that occurred mid-stream).
+    """
+    stack = AsyncExitStack()
+    try:
+        stack.enter_context(running_queries.track(query_id, user_id))
+        await stack.enter_async_context(
+            query_scheduler.slot(user_id, session_id, priority=QueryPriority.INTERACTIVE, weight=weight)
+        )
+    except BaseException:
+        await stack.aclose()
+        raise
+    
+    # Fetch the first batch before answering so connection errors still map to HTTP errors
+    try:
+        started = time.monotonic()
+        batches = CloudDatabaseService.stream_read_only_query_async(
+            connection_string, sql_query, query_id=query_id, statement_timeout=statement_timeout
+        )
+        columns, rows = await batches.__anext__()
+        metrics.observe("query_time_to_first_row_seconds", time.monotonic() - started)
+    except Exception as e:
+        await stack.aclose()
+        raise ValueError(f"Query failed: {str(e)}")
+    
+    async def body() -> AsyncIterator[str]:
+        row_count = 0
+        try:
+            meta = {"type": "meta", "query_id": query_id, "columns": columns}
+            if sample_percent is not None:
+                meta.update(approximate=True, sample_percent=sample_percent)
+            yield dumps(meta) + "\n"
+            
+            current = rows
+            while True:
+                if current:
+                    yield "".join(dumps(list(row)) + "\n" for row in current)
+                    row_count += len(current)
+                try:
+                    _, current = await batches.__anext__()
+                except StopAsyncIteration:
+                    break
+            
+            yield dumps({"type": "end", "row_count": row_count}) + "\n"
+        except Exception as e:
+            yield dumps({"type": "error", "row_count": row_count, "message": f"Query failed: {str(e)}"}) + "\n"
+        finally:
+            await release()
+    
+    async def release():
+        await batches.aclose()
+        await stack.aclose()
+    
+    # The background task also runs when the client disconnects before the body is iterated
+    return StreamingResponse(body(), media_type="application/x-ndjson", background=BackgroundTask(release))
+
 @router.get("/providers-info")
 async def get_database_providers_info():
     """Get information about supported free-tier database providers"""
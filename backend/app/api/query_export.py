@@ -0,0 +1,156 @@
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, Field
+from typing import Dict, Any, AsyncIterator, Literal
+from contextlib import AsyncExitStack
+from app.services.export import EXPORTERS, EXPORT_MEDIA_TYPES, plan_partitions, export_partitioned
+from app.services.query_scheduler import query_scheduler, QueryPriority, QueueFullError
+from app.services.running_queries import running_queries
+from app.api.query import _query_cache, _enforce_cost_limit
+from app.api.sessions import get_user_session
+from app.middleware.auth import get_current_user
+from app.core.metrics import metrics
+from app.core.config import settings
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+class QueryExportRequest(BaseModel):
+    query_id: str
+    sql_query: str
+    confirm_execution: bool = False
+    format: Literal["csv", "parquet"] = "csv"
+    # Split the scan into this many key ranges read over separate connections (1 = single cursor)
+    parallelism: int = Field(1, ge=1, le=settings.EXPORT_MAX_PARALLELISM)
+    # Keep range order in the output; unordered exports emit batches as ranges deliver them
+    ordered: bool = True
+
+@router.post("")
+async def export_query(
+    request: QueryExportRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Stream the full result of a confirmed query as a CSV or Parquet download.
+    
+    Unlike /query/execute no LIMIT is imposed; rows are streamed as the
+    database produces them, so memory use doesn't depend on export size.
+    With parallelism > 1, single-table scans are split into key ranges
+    read concurrently over separate pooled connections. The export can be
+    cancelled via DELETE /query/{query_id}.
+    
+    The ranges are separate transactions without a shared snapshot: rows
+    written while a partitioned export runs may appear in some ranges and
+    not others, so use parallelism = 1 when the export must be a
+    consistent point-in-time copy of a table that is being written to.
+    """
+    stack = AsyncExitStack()
+    try:
+        user_id = current_user['user_id']
+        
+        if not request.confirm_execution:
+            raise HTTPException(status_code=400, detail="Query execution must be confirmed")
+        
+        # Verify query belongs to current user and get session info
+        cached_query = _query_cache.get(request.query_id)
+        if not cached_query or cached_query.get("user_id") != user_id:
+            raise HTTPException(status_code=403, detail="Query not found or not authorized for this user")
+        
+        connection_string = get_user_session(cached_query["session_id"], current_user)
+        await _enforce_cost_limit(connection_string, request.sql_query, cached_query)
+        
+        session_id = cached_query["session_id"]
+        weight = query_scheduler.weight_for_role(current_user.get('role'))
+        stack.enter_context(running_queries.track(request.query_id, user_id))
+        
+        plan = {"queries": [request.sql_query]}
+        # More ranges than the session may run at once would only queue behind each other
+        parallelism = min(request.parallelism, query_scheduler.max_per_session)
+        if parallelism > 1:
+            async with query_scheduler.slot(user_id, session_id, priority=QueryPriority.EXPORT, weight=weight):
+                plan = await plan_partitions(connection_string, request.sql_query, parallelism)
+            if "reason" in plan:
+                logger.info(f"Export {request.query_id} runs on one connection: {plan['reason']}")
+        
+        # Produce the first chunk before answering so connection errors still map to HTTP errors
+        started = time.monotonic()
+        if len(plan["queries"]) > 1:
+            # Each range takes its own scheduler slot, so per-user and per-session caps still apply
+            chunks = export_partitioned(
+                request.format,
+                connection_string,
+                plan["queries"],
+                request.ordered or plan["ordered_by_key"],
+                request.query_id,
+                user_id,
+                session_id,
+                weight=weight,
+                statement_timeout=settings.EXPORT_STATEMENT_TIMEOUT_SECONDS
+            )
+        else:
+            await stack.enter_async_context(
+                query_scheduler.slot(user_id, session_id, priority=QueryPriority.EXPORT, weight=weight)
+            )
+            chunks = EXPORTERS[request.format](
+                connection_string,
+                request.sql_query,
+                query_id=request.query_id,
+                statement_timeout=settings.EXPORT_STATEMENT_TIMEOUT_SECONDS
+            )
+        try:
+            first = await chunks.__anext__()
+        except StopAsyncIteration:
+            first = b""
+        except QueueFullError:
+            raise
+        except Exception as e:
+            raise ValueError(f"Export failed: {str(e)}")
+        
+    except QueueFullError as e:
+        await stack.aclose()
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except HTTPException:
+        await stack.aclose()
+        raise
+    except Exception as e:
+        await stack.aclose()
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    _query_cache.pop(request.query_id, None)
+    
+    async def release():
+        await chunks.aclose()
+        await stack.aclose()
+    
+    async def body() -> AsyncIterator[bytes]:
+        sent = len(first)
+        status = "succeeded"
+        try:
+            yield first
+            async for chunk in chunks:
+                sent += len(chunk)
+                yield chunk
+        except Exception as e:
+            # Headers are already sent: abort the response so the download is visibly incomplete
+            status = "failed"
+            logger.error(f"Export {request.query_id} failed after {sent} bytes: {e}")
+            raise
+        finally:
+            await release()
+            metrics.increment("query_exports_total", format=request.format, status=status)
+            metrics.increment("query_export_bytes_total", sent, format=request.format)
+            metrics.observe("query_export_seconds", time.monotonic() - started, format=request.format)
+    
+    return StreamingResponse(
+        body(),
+        media_type=EXPORT_MEDIA_TYPES[request.format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{request.query_id}.{request.format}"',
+            "X-Export-Partitions": str(len(plan["queries"]))
+        },
+        # Also runs when the client disconnects before the body is iterated
+        background=BackgroundTask(release)
+    )
@@ -0,0 +1,197 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from typing import List, Dict, Any, AsyncIterator, Optional
+from app.services.query_jobs import query_jobs, SUCCEEDED
+from app.services.result_spill import SpillExpiredError
+from app.services.query_scheduler import QueueFullError
+from app.services.sql_rewriter import rewrite_query, sql_dialect
+from app.api.query import _query_cache, _enforce_cost_limit, _columnar_response, _rows_response, ResultFormat
+from app.api.sessions import get_user_session
+from app.middleware.auth import get_current_user
+from app.core.json_encoding import dumps
+from app.core.config import settings
+import asyncio
+
+router = APIRouter()
+
+# Seconds between SSE keepalive comments while a job makes no progress
+_SSE_KEEPALIVE_SECONDS = 15.0
+
+class QueryJobRequest(BaseModel):
+    query_id: str
+    sql_query: str
+    confirm_execution: bool = False
+
+class QueryJobStatus(BaseModel):
+    job_id: str
+    status: str  # queued | running | succeeded | failed | cancelled
+    rows_fetched: int
+    columns: List[str]
+    row_count: Optional[int] = None
+    truncated: bool = False
+    truncation: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    expires_at: Optional[str] = None
+    rewrites: List[str] = []
+
+class QueryJobResultsResponse(BaseModel):
+    success: bool
+    job_id: str
+    data: List[Dict[str, Any]]
+    columns: List[str]
+    row_count: int
+    offset: int
+    next_offset: Optional[int] = None
+    has_more: bool = False
+    truncated: bool = False
+    truncation: Optional[Dict[str, Any]] = None
+
+def _get_job(job_id: str, current_user: Dict[str, Any]) -> Dict[str, Any]:
+    job = query_jobs.get(job_id, current_user['user_id'])
+    if job is None:
+        raise HTTPException(status_code=404, detail="Query job not found or expired")
+    return job
+
+@router.post("", response_model=QueryJobStatus, status_code=202)
+async def submit_query_job(
+    request: QueryJobRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Run a confirmed query in the background and return its job id immediately"""
+    try:
+        user_id = current_user['user_id']
+        
+        if not request.confirm_execution:
+            raise HTTPException(status_code=400, detail="Query execution must be confirmed")
+        
+        # Verify query belongs to current user and get session info
+        cached_query = _query_cache.get(request.query_id)
+        if not cached_query or cached_query.get("user_id") != user_id:
+            raise HTTPException(status_code=403, detail="Query not found or not authorized for this user")
+        
+        connection_string = get_user_session(cached_query["session_id"], current_user)
+        
+        # Jobs may return up to the full result budget rather than the interactive LIMIT cap
+        rewrite = rewrite_query(
+            request.sql_query,
+            sql_dialect(connection_string),
+            max_limit=settings.MAX_RESULT_ROWS,
+            schema_columns=cached_query.get("schema_columns")
+        )
+        await _enforce_cost_limit(connection_string, rewrite["sql"], cached_query)
+        
+        job = query_jobs.submit(
+            user_id,
+            cached_query["session_id"],
+            connection_string,
+            rewrite["sql"],
+            role=current_user.get('role')
+        )
+        _query_cache.pop(request.query_id, None)
+        
+        return QueryJobStatus(**query_jobs.status(job), rewrites=rewrite["changes"])
+        
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/{job_id}", response_model=QueryJobStatus)
+async def get_query_job(
+    job_id: str,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Poll a job's status and progress (rows fetched so far)"""
+    return QueryJobStatus(**query_jobs.status(_get_job(job_id, current_user)))
+
+@router.get("/{job_id}/events")
+async def stream_query_job_events(
+    job_id: str,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Server-sent events: a `status` event on every change, then `done` once the job finishes"""
+    job = _get_job(job_id, current_user)
+    
+    async def events() -> AsyncIterator[str]:
+        while True:
+            status = query_jobs.status(job)
+            if status["finished_at"]:
+                yield f"event: done\ndata: {dumps(status)}\n\n"
+                return
+            yield f"event: status\ndata: {dumps(status)}\n\n"
+            
+            if not await query_jobs.wait_for_change(job, _SSE_KEEPALIVE_SECONDS):
+                if job['status'] == status["status"] and job['rows_fetched'] == status["rows_fetched"]:
+                    yield ": keepalive\n\n"
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/{job_id}/results", response_model=QueryJobResultsResponse)
+async def get_query_job_results(
+    job_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(settings.QUERY_JOB_DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    format: ResultFormat = "rows",
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Fetch a page of a finished job's result"""
+    job = _get_job(job_id, current_user)
+    if job['status'] != SUCCEEDED:
+        detail = job['error'] if job['error'] else f"Query job is {job['status']}"
+        raise HTTPException(status_code=409, detail=detail)
+    
+    result = job['result']
+    try:
+        page = result.slice(offset, offset + limit)
+    except SpillExpiredError as e:
+        raise HTTPException(status_code=410, detail=str(e))
+    next_offset = offset + page.row_count if offset + page.row_count < result.row_count else None
+    
+    if format != "rows":
+        return _columnar_response(format, {
+            "result": page,
+            "row_count": page.row_count,
+            "truncated": job['truncation'] is not None,
+            "truncation": job['truncation']
+        }, extra={"job_id": job_id, "offset": offset, "next_offset": next_offset, "has_more": next_offset is not None})
+    
+    return _rows_response(QueryJobResultsResponse(
+        success=True,
+        job_id=job_id,
+        data=[],
+        columns=result.columns,
+        row_count=page.row_count,
+        offset=offset,
+        next_offset=next_offset,
+        has_more=next_offset is not None,
+        truncated=job['truncation'] is not None,
+        truncation=job['truncation']
+    ), {"result": page})
+
+@router.delete("/{job_id}")
+async def cancel_query_job(
+    job_id: str,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Cancel a queued or running job"""
+    try:
+        cancelled = await asyncio.to_thread(query_jobs.cancel, job_id, current_user['user_id'])
+        if not cancelled:
+            raise HTTPException(status_code=404, detail="Query job not found or expired")
+        
+        return {"success": True, "job_id": job_id, "message": "Query job cancelled"}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -3,6 +3,7 @@ from pydantic import BaseModel
 from typing import Optional, Dict, Any
 from app.core.security import secure_context
 from app.services.database_cloud import CloudDatabaseService
+from app.services.session_warmup import session_warmer
 from app.middleware.auth import get_current_user
 
 router = APIRouter()
@@ -31,7 +32,7 @@ async def create_database_session(
         user_id = current_user['user_id']
         
         # Validate connection first
-        test_result = CloudDatabaseService.test_connection(request.connection_string)
+        test_result = await CloudDatabaseService.test_connection_async(request.connection_string)
         
         if not test_result["success"]:
             raise HTTPException(
@@ -49,8 +50,12 @@ async def create_database_session(
             }
         )
         
+        # Open pooled connections and load the schema while the client gets its response
+        session_warmer.schedule(session_id, request.connection_string)
+        
         # Get session info (without sensitive data)
         session_info = secure_context.get_session_info(session_id, user_id)
+        session_info['warmup'] = session_warmer.status(session_id)
         
         return SessionResponse(
             session_id=session_id,
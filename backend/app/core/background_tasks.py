@@ -1,7 +1,13 @@
 import asyncio
 from datetime import datetime, timedelta
 import logging
+from app.core.config import settings
 from app.core.security import secure_context
+from app.core.engine_registry import engine_registry
+from app.services.pagination import page_store
+from app.services.result_cache import result_cache
+from app.services.query_jobs import query_jobs
+from app.services.result_spill import spill_store
 
 logger = logging.getLogger(__name__)
 
@@ -10,6 +16,7 @@ class BackgroundTasks:
     
     def __init__(self):
         self._cleanup_task = None
+        self._keepalive_task = None
         self._running = False
     
     async def start_cleanup_scheduler(self):
@@ -19,17 +26,20 @@ class BackgroundTasks:
         
         self._running = True
         self._cleanup_task = asyncio.create_task(self._cleanup_loop())
+        if settings.DB_KEEPALIVE_INTERVAL_SECONDS > 0:
+            self._keepalive_task = asyncio.create_task(self._keepalive_loop())
         logger.info("Background cleanup scheduler started")
     
     async def stop_cleanup_scheduler(self):
         """Stop the cleanup scheduler"""
         self._running = False
-        if self._cleanup_task:
-            self._cleanup_task.cancel()
-            try:
-                await self._cleanup_task
-            except asyncio.CancelledError:
-                pass
+        for task in (self._cleanup_task, self._keepalive_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
         logger.info("Background cleanup scheduler stopped")
     
     async def _cleanup_loop(self):
@@ -41,6 +51,23 @@ class BackgroundTasks:
                 if cleaned > 0:
                     logger.info(f"Cleaned up {cleaned} expired sessions")
                 
+                # Drop continuation tokens nobody came back for
+                page_store.cleanup_expired()
+                result_cache.cleanup_expired()
+                
+                # Drop finished query job results past their TTL
+                expired_jobs = query_jobs.cleanup_expired()
+                if expired_jobs > 0:
+                    logger.info(f"Removed {expired_jobs} expired query jobs")
+                
+                # Delete spill files whose owner never released them
+                spill_store.cleanup_expired()
+                
+                # Dispose connection pools nobody has used recently
+                evicted = engine_registry.evict_idle()
+                if evicted > 0:
+                    logger.info(f"Disposed {evicted} idle connection pools")
+                
                 # Wait 10 minutes before next cleanup
                 await asyncio.sleep(600)  # 10 minutes
                 
@@ -50,5 +77,19 @@ class BackgroundTasks:
                 logger.error(f"Error in cleanup loop: {e}")
                 await asyncio.sleep(60)  # Wait 1 minute on error
 
+    async def _keepalive_loop(self):
+        """Ping quiet pools of live sessions so serverless computes don't suspend"""
+        # Check twice per interval so no pool stays quiet much longer than the interval
+        period = settings.DB_KEEPALIVE_INTERVAL_SECONDS / 2
+        while self._running:
+            try:
+                await asyncio.sleep(period)
+                await engine_registry.ping_idle()
+                
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error in keepalive loop: {e}")
+
 # Global background tasks instance
 background_tasks = BackgroundTasks()
\ No newline at end of file
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 class Settings(BaseSettings):
     PROJECT_NAME: str = "DataVibe"
@@ -19,6 +19,103 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: Optional[str] = None
     ANTHROPIC_API_KEY: Optional[str] = None
     
+    # Remote database connection pooling (per connection fingerprint)
+    DB_CONNECT_TIMEOUT: int = 10
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 5
+    DB_POOL_TIMEOUT: int = 10
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_MAX_ENGINES: int = 50
+    DB_ENGINE_IDLE_SECONDS: int = 900
+    # Serverless computes (Neon, Supabase) suspend after ~5 idle minutes
+    DB_WARMUP_CONNECTIONS: int = 2
+    DB_KEEPALIVE_INTERVAL_SECONDS: int = 240  # 0 disables keepalive pings
+    # Supabase direct-vs-REST connection race
+    CONNECT_RACE_GRACE_SECONDS: float = 0.3
+    CONNECT_METHOD_MEMORY_SECONDS: int = 3600
+    
+    # Remote query scheduling (fair share between users)
+    QUERY_MAX_CONCURRENT: int = 32
+    QUERY_MAX_PER_USER: int = 4
+    QUERY_MAX_PER_SESSION: int = 2
+    QUERY_MAX_QUEUE_DEPTH: int = 200
+    QUERY_MAX_QUEUED_PER_USER: int = 10
+    QUERY_QUEUE_TIMEOUT_SECONDS: float = 30.0
+    QUERY_ROLE_WEIGHTS: Dict[str, float] = {"admin": 2.0, "developer": 1.5}
+    
+    # Server-side statement timeouts (0 disables)
+    QUERY_STATEMENT_TIMEOUT_SECONDS: float = 60.0
+    QUERY_ROLE_STATEMENT_TIMEOUTS: Dict[str, float] = {"admin": 300.0, "developer": 120.0}
+    
+    # EXPLAIN preflight for previews (cost limit of None disables refusal)
+    EXPLAIN_TIMEOUT_SECONDS: float = 5.0
+    EXPLAIN_SEQ_SCAN_ROW_THRESHOLD: int = 100_000
+    QUERY_MAX_ESTIMATED_COST: Optional[float] = None
+    
+    # SQL rewriting before execution (outer LIMIT cap, SELECT * expansion)
+    SQL_REWRITE_MAX_LIMIT: int = 10_000
+    SQL_REWRITE_MAX_STAR_COLUMNS: int = 50
+    
+    # Sampled "quick look" execution (engines without TABLESAMPLE read at most this many sampled rows)
+    SQL_SAMPLE_MAX_ROWS: int = 100_000
+    
+    # Result streaming
+    STREAM_BATCH_SIZE: int = 1000
+    
+    # Hard result budgets for non-streamed queries (enforced while fetching)
+    MAX_RESULT_ROWS: int = 100_000
+    MAX_RESULT_BYTES: int = 128 * 1024 * 1024
+    
+    # Spill job and paginated results past this size to memory-mapped temp files (None disables)
+    RESULT_SPILL_THRESHOLD_BYTES: Optional[int] = 32 * 1024 * 1024
+    RESULT_SPILL_MAX_BYTES: int = 2 * 1024 * 1024 * 1024
+    RESULT_SPILL_MAX_ROWS: int = 5_000_000
+    RESULT_SPILL_TTL_SECONDS: int = 3600
+    RESULT_SPILL_DIR: Optional[str] = None  # Defaults to the system temp directory
+    
+    # /query/batch: queries per request and how many run at once
+    QUERY_BATCH_MAX_QUERIES: int = 20
+    QUERY_BATCH_MAX_CONCURRENCY: int = 4
+    
+    # Exports (/query/export): no row cap, a long statement timeout, Parquet row group size
+    EXPORT_STATEMENT_TIMEOUT_SECONDS: float = 1800.0
+    EXPORT_PARQUET_ROW_GROUP_ROWS: int = 50_000
+    # Parallel exports: max key ranges per export (each needs a scheduler slot, so also capped at
+    # QUERY_MAX_PER_SESSION), batches read ahead per range
+    EXPORT_MAX_PARALLELISM: int = 4
+    EXPORT_PARTITION_QUEUE_BATCHES: int = 2
+    
+    # Background query jobs (results kept in memory until the TTL after completion)
+    QUERY_JOB_MAX_ACTIVE_PER_USER: int = 5
+    QUERY_JOB_STATEMENT_TIMEOUT_SECONDS: float = 1800.0
+    QUERY_JOB_RESULT_TTL_SECONDS: int = 1800
+    QUERY_JOB_DEFAULT_PAGE_SIZE: int = 1000
+    
+    # Response compression negotiated from Accept-Encoding (levels trade CPU for bandwidth;
+    # streamed responses flush per chunk, so they use cheaper levels)
+    COMPRESSION_MINIMUM_SIZE: int = 1024
+    COMPRESSION_LEVELS: Dict[str, int] = {"zstd": 6, "br": 5, "gzip": 6}
+    COMPRESSION_STREAMING_LEVELS: Dict[str, int] = {"zstd": 3, "br": 4, "gzip": 4}
+    
+    # Result pagination
+    MAX_PAGE_SIZE: int = 5000
+    PAGE_TOKEN_TTL_SECONDS: int = 900
+    
+    # Query result cache (keyed by connection fingerprint, normalized SQL and role)
+    RESULT_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    RESULT_CACHE_MAX_ENTRY_BYTES: int = 8 * 1024 * 1024
+    RESULT_CACHE_TTL_SECONDS: int = 300
+    
+    # Schema cache (per connection fingerprint): served as-is while fresh, then served stale
+    # while a background version check runs, and re-checked before use once past the max age
+    SCHEMA_CACHE_FRESH_SECONDS: int = 60
+    SCHEMA_CACHE_MAX_STALE_SECONDS: int = 3600
+    SCHEMA_CACHE_MAX_ENTRIES: int = 256
+    
+    # LLM prompt schema: larger schemas are pruned to the top-k BM25 matches plus their FK neighbours
+    SCHEMA_PROMPT_MAX_TABLES: int = 25
+    SCHEMA_PROMPT_TOP_K: int = 10
+    
     # Environment
     ENVIRONMENT: str = "production"
     
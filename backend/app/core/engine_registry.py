@@ -0,0 +1,359 @@
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+import asyncio
+import re
+import ssl
+import threading
+import time
+import logging
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine, URL, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from app.core.config import settings
+from app.core.security import secure_context, connection_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Hosts that always require TLS on their PostgreSQL endpoints
+_SSL_REQUIRED_HOSTS = ['.supabase.co', '.neon.tech']
+
+# Async driver used for each backend
+_ASYNC_DRIVERS = {
+    'postgresql': 'asyncpg',
+    'mysql': 'aiomysql',
+}
+
+# URL query options asyncpg accepts as-is; other libpq options are translated or dropped
+_ASYNCPG_QUERY_OPTIONS = {'target_session_attrs', 'prepared_statement_cache_size', 'passfile'}
+_LIBPQ_SETTING = re.compile(r'-c\s*([\w.]+)=(\S+)')
+
+def _asyncpg_query(query: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """Split a libpq-style URL query into what asyncpg accepts and its server_settings.
+
+    application_name and `options=-c name=value` become server settings;
+    libpq-only options (channel_binding, gssencmode, keepalives, Neon's
+    `options=endpoint=...` which asyncpg replaces with SNI...) are dropped
+    instead of failing the connect as unknown keyword arguments.
+    """
+    kept: Dict[str, Any] = {}
+    server_settings: Dict[str, str] = {}
+    for name, value in query.items():
+        if name in _ASYNCPG_QUERY_OPTIONS:
+            kept[name] = value
+        elif name == 'application_name':
+            server_settings[name] = value
+        elif name == 'options':
+            server_settings.update(_LIBPQ_SETTING.findall(value if isinstance(value, str) else ' '.join(value)))
+        else:
+            logger.debug(f"Dropping libpq option {name} for asyncpg")
+    return kept, server_settings
+
+# Connection info flag: a MySQL session MAX_EXECUTION_TIME was set on this pooled connection
+SESSION_TIMEOUT_SET = 'dv_session_timeout_set'
+
+def _restore_session_timeout(dbapi_connection, connection_record, reset_state):
+    """Pool reset hook: put MAX_EXECUTION_TIME back to the server default before the connection is reused.
+
+    MySQL has no transaction-local variables, so without this the next
+    checkout would inherit the previous caller's timeout.
+    """
+    if not connection_record.info.pop(SESSION_TIMEOUT_SET, False):
+        return
+    if reset_state.terminate_only or not reset_state.asyncio_safe:
+        # The connection is being discarded anyway
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("SET SESSION MAX_EXECUTION_TIME = DEFAULT")
+    finally:
+        cursor.close()
+
+class EngineRegistry:
+    """Process-wide registry of pooled engines keyed by connection fingerprint"""
+
+    def __init__(self):
+        # fingerprint -> {'engine': Engine, 'async_engine': AsyncEngine, 'created_at': float,
+        #                 'last_used': float, 'last_pinged': float}
+        self._engines: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.RLock()
+        # Backends whose async driver is not installed (served from a worker thread instead)
+        self._missing_async_drivers: set = set()
+
+    def _get_entry(self, connection_string: str) -> Dict[str, Any]:
+        """Return the registry entry for a connection string, marking it as recently used"""
+        fingerprint = connection_fingerprint(connection_string)
+
+        with self._lock:
+            entry = self._engines.get(fingerprint)
+            if entry is None:
+                entry = {
+                    'engine': None,
+                    'async_engine': None,
+                    'created_at': time.monotonic(),
+                    'last_used': time.monotonic(),
+                    'last_pinged': 0.0
+                }
+                self._engines[fingerprint] = entry
+                self._evict_over_capacity()
+
+            entry['last_used'] = time.monotonic()
+            self._engines.move_to_end(fingerprint)
+            return entry
+
+    def get_engine(self, connection_string: str, connect_timeout: Optional[int] = None) -> Engine:
+        """Return the pooled engine for a connection string, creating it on first use"""
+        with self._lock:
+            entry = self._get_entry(connection_string)
+            if entry['engine'] is None:
+                entry['engine'] = self._create_engine(connection_string, connect_timeout)
+            return entry['engine']
+
+    def get_async_engine(self, connection_string: str, connect_timeout: Optional[int] = None) -> Optional[AsyncEngine]:
+        """Return the pooled async engine, or None when no async driver is available"""
+        url = make_url(connection_string)
+        backend = url.get_backend_name()
+        if backend not in _ASYNC_DRIVERS or backend in self._missing_async_drivers:
+            return None
+
+        with self._lock:
+            entry = self._get_entry(connection_string)
+            if entry['async_engine'] is None:
+                try:
+                    entry['async_engine'] = self._create_async_engine(url, connect_timeout)
+                except ImportError as e:
+                    logger.warning(f"Async driver for {backend} not installed, using worker threads: {e}")
+                    self._missing_async_drivers.add(backend)
+                    return None
+            return entry['async_engine']
+
+    def _create_engine(self, connection_string: str, connect_timeout: Optional[int]) -> Engine:
+        """Create an engine with bounded pool settings for a remote database"""
+        url = make_url(connection_string)
+        backend = url.get_backend_name()
+        timeout = connect_timeout or settings.DB_CONNECT_TIMEOUT
+
+        engine_args: Dict[str, Any] = {"pool_pre_ping": True}
+        connect_args: Dict[str, Any] = {}
+
+        if backend == 'postgresql':
+            connect_args["connect_timeout"] = timeout
+            if any(host in connection_string.lower() for host in _SSL_REQUIRED_HOSTS):
+                connect_args["sslmode"] = "require"
+        elif backend == 'mysql':
+            connect_args["connect_timeout"] = timeout
+
+        if backend != 'sqlite':
+            engine_args.update(
+                pool_size=settings.DB_POOL_SIZE,
+                max_overflow=settings.DB_MAX_OVERFLOW,
+                pool_timeout=settings.DB_POOL_TIMEOUT,
+                pool_recycle=settings.DB_POOL_RECYCLE_SECONDS
+            )
+
+        engine = create_engine(connection_string, connect_args=connect_args, **engine_args)
+        if backend == 'mysql':
+            event.listen(engine, "reset", _restore_session_timeout)
+        return engine
+
+    def _create_async_engine(self, url: URL, connect_timeout: Optional[int]) -> AsyncEngine:
+        """Create an async engine (asyncpg / aiomysql) with the same pool bounds"""
+        backend = url.get_backend_name()
+        timeout = connect_timeout or settings.DB_CONNECT_TIMEOUT
+        host = (url.host or '').lower()
+
+        # Async drivers don't understand libpq-style query options
+        query = dict(url.query)
+        sslmode = query.pop('sslmode', None)
+        query.pop('connect_timeout', None)
+        server_settings: Dict[str, str] = {}
+        if backend == 'postgresql':
+            query, server_settings = _asyncpg_query(query)
+        async_url = url.set(drivername=f"{backend}+{_ASYNC_DRIVERS[backend]}", query=query)
+
+        connect_args: Dict[str, Any] = {}
+        if backend == 'postgresql':
+            connect_args["timeout"] = timeout
+            if server_settings:
+                connect_args["server_settings"] = server_settings
+            if sslmode in ('require', 'verify-ca', 'verify-full') or any(h in host for h in _SSL_REQUIRED_HOSTS):
+                connect_args["ssl"] = "require"
+            # Transaction-mode poolers (pgbouncer / Supavisor) can't hold prepared statements
+            if 'pooler.supabase.com' in host or url.port == 6543:
+                connect_args["statement_cache_size"] = 0
+        elif backend == 'mysql':
+            connect_args["connect_timeout"] = timeout
+            if '.psdb.cloud' in host:
+                connect_args["ssl"] = ssl.create_default_context()
+
+        engine = create_async_engine(
+            async_url,
+            connect_args=connect_args,
+            pool_pre_ping=True,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE_SECONDS
+        )
+        if backend == 'mysql':
+            event.listen(engine.sync_engine, "reset", _restore_session_timeout)
+        return engine
+
+    def _evict_over_capacity(self):
+        """Dispose least recently used engines that have no checked-out connections"""
+        for fingerprint in list(self._engines.keys())[:-1]:
+            if len(self._engines) <= settings.DB_MAX_ENGINES:
+                break
+            if self._checked_out(self._engines[fingerprint]) == 0:
+                self.dispose(fingerprint)
+
+    @staticmethod
+    def _checked_out(entry: Dict[str, Any]) -> int:
+        """Number of connections currently in use across the sync and async pools"""
+        in_use = 0
+        if entry['engine'] is not None:
+            in_use += entry['engine'].pool.checkedout()
+        if entry['async_engine'] is not None:
+            in_use += entry['async_engine'].sync_engine.pool.checkedout()
+        return in_use
+
+    def dispose(self, fingerprint: str) -> bool:
+        """Dispose the engine for a fingerprint and close its pooled connections"""
+        with self._lock:
+            entry = self._engines.pop(fingerprint, None)
+
+        if entry is None:
+            return False
+
+        try:
+            if entry['engine'] is not None:
+                entry['engine'].dispose()
+            if entry['async_engine'] is not None:
+                self._dispose_async(entry['async_engine'])
+        except Exception as e:
+            logger.error(f"Failed to dispose engine: {e}")
+        return True
+
+    @staticmethod
+    def _dispose_async(async_engine: AsyncEngine):
+        """Close async pool connections on the running loop, or drop the pool outside one"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            async_engine.sync_engine.dispose(close=False)
+            return
+        loop.create_task(async_engine.dispose())
+
+    def discard(self, connection_string: str) -> bool:
+        """Dispose the engine for a connection string (e.g. after a failed connection test)"""
+        return self.dispose(connection_fingerprint(connection_string))
+
+    def evict_idle(self, idle_seconds: Optional[int] = None) -> int:
+        """Dispose engines unused for longer than idle_seconds (called periodically)"""
+        idle_seconds = idle_seconds if idle_seconds is not None else settings.DB_ENGINE_IDLE_SECONDS
+        now = time.monotonic()
+
+        with self._lock:
+            idle = [
+                fingerprint for fingerprint, entry in self._engines.items()
+                if now - entry['last_used'] > idle_seconds
+                and self._checked_out(entry) == 0
+                and not secure_context.is_fingerprint_active(fingerprint)
+            ]
+
+        for fingerprint in idle:
+            self.dispose(fingerprint)
+
+        return len(idle)
+
+    async def warm(self, connection_string: str, connections: Optional[int] = None) -> int:
+        """Open pooled connections ahead of the first query (wakes suspended serverless computes)"""
+        connections = min(connections or settings.DB_WARMUP_CONNECTIONS, settings.DB_POOL_SIZE)
+        async_engine = self.get_async_engine(connection_string)
+        if async_engine is None:
+            return await asyncio.to_thread(self._warm_sync, self.get_engine(connection_string), connections)
+
+        # Hold all connections open together so the pool keeps distinct ones
+        opened = await asyncio.gather(*(async_engine.connect().start() for _ in range(connections)),
+                                      return_exceptions=True)
+        conns = [c for c in opened if not isinstance(c, BaseException)]
+        try:
+            await asyncio.gather(*(c.execute(text("SELECT 1")) for c in conns))
+        finally:
+            for conn in conns:
+                await conn.close()
+
+        if not conns:
+            raise opened[0]
+        return len(conns)
+
+    @staticmethod
+    def _warm_sync(engine: Engine, connections: int) -> int:
+        conns = []
+        try:
+            for _ in range(connections):
+                conn = engine.connect()
+                conns.append(conn)
+                conn.execute(text("SELECT 1"))
+        finally:
+            for conn in conns:
+                conn.close()
+        return len(conns)
+
+    async def ping_idle(self, interval_seconds: Optional[int] = None) -> int:
+        """Ping pools of live sessions that have been quiet for interval_seconds (called periodically).
+
+        Keeps serverless computes from suspending between a user's queries;
+        pings stop once the session expires.
+        """
+        interval_seconds = interval_seconds if interval_seconds is not None else settings.DB_KEEPALIVE_INTERVAL_SECONDS
+        active = secure_context.active_fingerprints()
+        now = time.monotonic()
+
+        with self._lock:
+            due = [
+                entry for fingerprint, entry in self._engines.items()
+                if fingerprint in active and now - max(entry['last_used'], entry['last_pinged']) > interval_seconds
+            ]
+            for entry in due:
+                entry['last_pinged'] = now
+
+        results = await asyncio.gather(*(self._ping(entry) for entry in due), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                logger.warning(f"Keepalive ping failed: {result}")
+        return len(due)
+
+    async def _ping(self, entry: Dict[str, Any]):
+        if entry['async_engine'] is not None:
+            async with entry['async_engine'].connect() as conn:
+                await conn.execute(text("SELECT 1"))
+        elif entry['engine'] is not None:
+            await asyncio.to_thread(self._warm_sync, entry['engine'], 1)
+
+    def release_session(self, session_id: str, session: Dict[str, Any]):
+        """Session destroy listener: dispose the pool once no live session uses it"""
+        fingerprint = session.get('fingerprint')
+        if fingerprint and not secure_context.is_fingerprint_active(fingerprint):
+            self.dispose(fingerprint)
+
+    def dispose_all(self) -> int:
+        """Dispose every registered engine (application shutdown)"""
+        with self._lock:
+            fingerprints = list(self._engines.keys())
+
+        for fingerprint in fingerprints:
+            self.dispose(fingerprint)
+
+        return len(fingerprints)
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool statistics without any connection details"""
+        with self._lock:
+            return {
+                "engines": len(self._engines),
+                "checked_out": sum(self._checked_out(e) for e in self._engines.values())
+            }
+
+# Global instance (in-memory only)
+engine_registry = EngineRegistry()
+secure_context.add_destroy_listener(engine_registry.release_session)
@@ -0,0 +1,83 @@
+from typing import Any, Callable, Dict, List
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from uuid import UUID
+import base64
+import json
+from pydantic_core import to_jsonable_python
+
+try:
+    import orjson
+except ImportError:  # optional: faster encoding of large row payloads
+    orjson = None
+
+def dumps(value: Any) -> str:
+    """Compact JSON encoding for result payloads"""
+    return json.dumps(value, default=json_default, separators=(',', ':'))
+
+def dumps_bytes(value: Any) -> bytes:
+    """UTF-8 JSON for large payloads (orjson when installed; NaN encodes as null)"""
+    if orjson is not None:
+        return orjson.dumps(value, default=json_default)
+    return json.dumps(value, default=json_default, separators=(',', ':')).encode()
+
+def _text_or_base64(value: Any) -> str:
+    value = bytes(value)
+    try:
+        return value.decode()
+    except UnicodeDecodeError:
+        return base64.b64encode(value).decode()
+
+def _pydantic_json(value: Any) -> Any:
+    return to_jsonable_python(value, fallback=json_default)
+
+# Per-type converters producing the same JSON values as a Pydantic response model
+_COLUMN_CONVERTERS: Dict[type, Callable[[Any], Any]] = {
+    Decimal: str,
+    UUID: str,
+    date: date.isoformat,
+    time: time.isoformat,
+    datetime: _pydantic_json,
+    timedelta: _pydantic_json,
+    bytes: _text_or_base64,
+    bytearray: _text_or_base64,
+    memoryview: _text_or_base64,
+}
+_JSON_NATIVE = {str, int, float, bool, type(None)}
+
+def json_default(value: Any) -> Any:
+    """Encode database values exactly as json_column and the Pydantic response models do.
+
+    Every format (row JSON, columnar JSON, NDJSON) goes through the same
+    converters, so e.g. Decimal is always a string and never loses precision.
+    """
+    convert = _COLUMN_CONVERTERS.get(type(value))
+    if convert is not None:
+        return convert(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    try:
+        return to_jsonable_python(value)
+    except Exception:
+        return str(value)
+
+def json_column(values: List[Any]) -> List[Any]:
+    """Convert one result column to JSON-native values.
+
+    The converter is chosen once from the types present in the column
+    instead of dispatching on every cell; columns that are already
+    JSON-native are returned untouched.
+    """
+    kinds = set(map(type, values))
+    if kinds <= _JSON_NATIVE:
+        return values
+
+    kinds.discard(type(None))
+    convert = _COLUMN_CONVERTERS.get(kinds.pop(), _pydantic_json) if len(kinds) == 1 else _convert_value
+    return [None if v is None else convert(v) for v in values]
+
+def _convert_value(value: Any) -> Any:
+    """Fallback for columns mixing several types: dispatch per cell"""
+    if type(value) in _JSON_NATIVE:
+        return value
+    return _COLUMN_CONVERTERS.get(type(value), _pydantic_json)(value)
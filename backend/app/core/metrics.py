@@ -0,0 +1,85 @@
+from collections import defaultdict, deque
+from typing import Dict, Any, Deque, Tuple
+import threading
+
+# Samples kept per histogram for percentile estimates
+_RESERVOIR_SIZE = 1024
+
+def _metric_key(name: str, labels: Dict[str, Any]) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+class MetricsRegistry:
+    """In-memory counters, gauges and histograms (reset on restart, no persistence)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple, float] = defaultdict(float)
+        self._gauges: Dict[Tuple, float] = {}
+        self._histograms: Dict[Tuple, Dict[str, Any]] = {}
+
+    def increment(self, name: str, value: float = 1, **labels):
+        """Increase a counter"""
+        with self._lock:
+            self._counters[_metric_key(name, labels)] += value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        """Set a gauge to its current value"""
+        with self._lock:
+            self._gauges[_metric_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        """Record a sample in a histogram"""
+        key = _metric_key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = {"count": 0, "sum": 0.0, "max": value, "samples": deque(maxlen=_RESERVOIR_SIZE)}
+                self._histograms[key] = histogram
+            histogram["count"] += 1
+            histogram["sum"] += value
+            histogram["max"] = max(histogram["max"], value)
+            histogram["samples"].append(value)
+
+    def mean(self, name: str, **labels) -> float:
+        """Average of a histogram, or 0 when nothing has been recorded"""
+        with self._lock:
+            histogram = self._histograms.get(_metric_key(name, labels))
+            if not histogram or not histogram["count"]:
+                return 0.0
+            return histogram["sum"] / histogram["count"]
+
+    @staticmethod
+    def _percentile(samples: Deque[float], fraction: float) -> float:
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+        return ordered[index]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Export all metrics as plain JSON-friendly data"""
+        def label_name(key: Tuple) -> str:
+            name, labels = key
+            if not labels:
+                return name
+            return name + "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+
+        with self._lock:
+            histograms = {}
+            for key, histogram in self._histograms.items():
+                samples = histogram["samples"]
+                histograms[label_name(key)] = {
+                    "count": histogram["count"],
+                    "sum": round(histogram["sum"], 6),
+                    "mean": round(histogram["sum"] / histogram["count"], 6),
+                    "p50": round(self._percentile(samples, 0.5), 6),
+                    "p95": round(self._percentile(samples, 0.95), 6),
+                    "max": round(histogram["max"], 6)
+                }
+
+            return {
+                "counters": {label_name(k): v for k, v in self._counters.items()},
+                "gauges": {label_name(k): v for k, v in self._gauges.items()},
+                "histograms": histograms
+            }
+
+# Global instance (in-memory only)
+metrics = MetricsRegistry()
@@ -1,11 +1,22 @@
 from cryptography.fernet import Fernet
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Callable, List, Set
 import secrets
+import hashlib
+import logging
 import os
 from datetime import datetime, timedelta
 import jwt
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
+
+def connection_fingerprint(connection_string: str) -> str:
+    """Stable, non-reversible identifier for a connection string (safe to use as a cache key)"""
+    return hashlib.sha256(connection_string.strip().encode()).hexdigest()
+
+# Sessions expire after this long without being accessed
+SESSION_TTL = timedelta(hours=1)
+
 class SecureContextManager:
     """Manages secure, encrypted context without local persistence"""
     
@@ -15,6 +26,12 @@ class SecureContextManager:
         self._cipher = Fernet(self._encryption_key)
         # In-memory session store (cleared on restart)
         self._sessions: Dict[str, Dict[str, Any]] = {}
+        # Callbacks invoked with (session_id, session) after a session is destroyed
+        self._destroy_listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+    
+    def add_destroy_listener(self, listener: Callable[[str, Dict[str, Any]], None]):
+        """Register a callback to release resources tied to a session"""
+        self._destroy_listeners.append(listener)
     
     def create_session(self, user_id: str, connection_data: Dict[str, Any]) -> str:
         """Create encrypted session with connection context"""
@@ -27,6 +44,7 @@ class SecureContextManager:
         session_data = {
             'user_id': user_id,
             'encrypted_connection': encrypted_connection,
+            'fingerprint': connection_fingerprint(connection_string),
             'provider': connection_data.get('provider', 'unknown'),
             'created_at': datetime.utcnow(),
             'last_accessed': datetime.utcnow()
@@ -43,7 +61,7 @@ class SecureContextManager:
             return None
         
         # Check session timeout (1 hour)
-        if datetime.utcnow() - session['last_accessed'] > timedelta(hours=1):
+        if datetime.utcnow() - session['last_accessed'] > SESSION_TTL:
             self.destroy_session(session_id)
             return None
         
@@ -74,21 +92,43 @@ class SecureContextManager:
     
     def destroy_session(self, session_id: str) -> bool:
         """Destroy session and clear sensitive data"""
-        if session_id in self._sessions:
-            del self._sessions[session_id]
-            return True
-        return False
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        
+        for listener in self._destroy_listeners:
+            try:
+                listener(session_id, session)
+            except Exception as e:
+                logger.error(f"Session destroy listener failed: {e}")
+        return True
+    
+    def is_fingerprint_active(self, fingerprint: str) -> bool:
+        """Check whether any live session uses the given connection fingerprint"""
+        return any(
+            session.get('fingerprint') == fingerprint
+            for session in list(self._sessions.values())
+        )
+    
+    def active_fingerprints(self) -> Set[str]:
+        """Connection fingerprints of sessions that have not yet expired"""
+        now = datetime.utcnow()
+        return {
+            session['fingerprint']
+            for session in list(self._sessions.values())
+            if session.get('fingerprint') and now - session['last_accessed'] <= SESSION_TTL
+        }
     
     def cleanup_expired_sessions(self):
         """Remove expired sessions (called periodically)"""
         now = datetime.utcnow()
         expired_sessions = [
             sid for sid, session in self._sessions.items()
-            if now - session['last_accessed'] > timedelta(hours=1)
+            if now - session['last_accessed'] > SESSION_TTL
         ]
         
         for sid in expired_sessions:
-            del self._sessions[sid]
+            self.destroy_session(sid)
         
         return len(expired_sessions)
 
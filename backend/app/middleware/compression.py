@@ -0,0 +1,192 @@
+from typing import Dict, List, Optional
+import time
+import zlib
+import logging
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.config import settings
+from app.core.metrics import metrics
+
+try:
+    import brotli
+except ImportError:  # optional: br is only offered when installed
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional: zstd is only offered when installed
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Content types that are already compressed (recompressing only costs CPU)
+_INCOMPRESSIBLE_PREFIXES = ("image/", "video/", "audio/", "application/zip", "application/gzip",
+                            "application/x-gzip", "application/zstd", "application/vnd.apache.parquet")
+
+def available_encodings() -> List[str]:
+    """Supported encodings in server preference order (best ratio per CPU first)"""
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return encodings
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick the encoding for an Accept-Encoding header: highest q-value, server preference on ties"""
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+
+    best, best_q = None, 0.0
+    for encoding in available_encodings():
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+class _Compressor:
+    """Incremental compressor; flush() emits everything written so far (for streamed responses)"""
+
+    def __init__(self, encoding: str, level: int):
+        self.encoding = encoding
+        if encoding == "zstd":
+            self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+        elif encoding == "br":
+            self._obj = brotli.Compressor(quality=level)
+        else:
+            self._obj = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, flush: bool) -> bytes:
+        if self.encoding == "zstd":
+            out = self._obj.compress(data)
+            return out + self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK) if flush else out
+        if self.encoding == "br":
+            out = self._obj.process(data)
+            return out + self._obj.flush() if flush else out
+        out = self._obj.compress(data)
+        return out + self._obj.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self) -> bytes:
+        if self.encoding == "zstd":
+            return self._obj.flush()
+        if self.encoding == "br":
+            return self._obj.finish()
+        return self._obj.flush()
+
+class CompressionMiddleware:
+    """Compress responses with gzip, brotli or zstd as negotiated from Accept-Encoding.
+
+    Complete bodies under COMPRESSION_MINIMUM_SIZE are sent as-is. Streamed
+    bodies (NDJSON results, SSE) are compressed chunk by chunk and flushed
+    after each one, so rows still reach the client as they are produced.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: Optional[int] = None):
+        self.app = app
+        self.minimum_size = minimum_size if minimum_size is not None else settings.COMPRESSION_MINIMUM_SIZE
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope.get("method") == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressingResponder(send, encoding, self.minimum_size)
+        await self.app(scope, receive, responder.send)
+
+class _CompressingResponder:
+    def __init__(self, send: Send, encoding: str, minimum_size: int):
+        self._send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self._start: Optional[Message] = None
+        self._compressor: Optional[_Compressor] = None
+        self._passthrough = False
+        self._elapsed = 0.0
+        self._raw_bytes = 0
+        self._compressed_bytes = 0
+
+    async def send(self, message: Message):
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "")
+            self._passthrough = (
+                "content-encoding" in headers
+                or message["status"] < 200 or message["status"] in (204, 304)
+                or content_type.startswith(_INCOMPRESSIBLE_PREFIXES)
+            )
+            if self._passthrough:
+                await self._send(message)
+            else:
+                # Wait for the first body chunk: its size and more_body decide how to encode
+                self._start = message
+            return
+
+        if message["type"] != "http.response.body" or self._passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self._start is not None:
+            start, self._start = self._start, None
+            if not more_body and len(body) < self.minimum_size:
+                # Small complete body: not worth the CPU
+                self._passthrough = True
+                await self._send(start)
+                await self._send(message)
+                return
+            levels = settings.COMPRESSION_STREAMING_LEVELS if more_body else settings.COMPRESSION_LEVELS
+            self._compressor = _Compressor(self.encoding, levels[self.encoding])
+            data = self._compress(body, more_body)
+
+            headers = MutableHeaders(raw=start["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(len(data))
+            await self._send(start)
+        else:
+            data = self._compress(body, more_body)
+
+        if data or not more_body:
+            await self._send({"type": "http.response.body", "body": data, "more_body": more_body})
+        if not more_body:
+            self._record()
+
+    def _compress(self, body: bytes, more_body: bool) -> bytes:
+        started = time.perf_counter()
+        data = self._compressor.compress(body, flush=more_body)
+        if not more_body:
+            data += self._compressor.finish()
+        self._elapsed += time.perf_counter() - started
+        self._raw_bytes += len(body)
+        self._compressed_bytes += len(data)
+        return data
+
+    def _record(self):
+        metrics.increment("response_compressed_total", encoding=self.encoding)
+        metrics.increment("response_bytes_uncompressed_total", self._raw_bytes, encoding=self.encoding)
+        metrics.increment("response_bytes_compressed_total", self._compressed_bytes, encoding=self.encoding)
+        metrics.observe("response_compression_seconds", self._elapsed, encoding=self.encoding)
+        if self._compressed_bytes:
+            metrics.observe("response_compression_ratio", self._raw_bytes / self._compressed_bytes, encoding=self.encoding)
@@ -22,6 +22,7 @@ class QueryPreview(BaseModel):
     sql_generated: str
     explanation: str
     estimated_rows: Optional[int] = None
+    estimated_cost: Optional[float] = None
     warnings: Optional[List[str]] = None
 
 class QueryHistory(BaseModel):
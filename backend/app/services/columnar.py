@@ -0,0 +1,190 @@
+from array import array
+from collections.abc import Sequence
+from typing import Dict, Any, List, Iterator, Optional
+import sys
+import logging
+from app.core.json_encoding import json_column
+
+try:
+    import numpy as np
+except ImportError:  # optional: typed columns fall back to the stdlib array module
+    np = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # optional: only needed for the Arrow IPC wire format
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+# Rows sampled when estimating the size of object (untyped) columns
+_SIZE_SAMPLE_ROWS = 100
+_INT64_MIN, _INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+def _column_type(values: List[Any]) -> str:
+    """Infer a packed storage type for a column, or 'object' if values are mixed or nullable"""
+    if not values:
+        return 'object'
+    first = type(values[0])
+    if first not in (int, float, bool) or any(type(v) is not first for v in values):
+        return 'object'
+    if first is int and not all(_INT64_MIN <= v <= _INT64_MAX for v in values):
+        return 'object'
+    return {int: 'int64', float: 'float64', bool: 'bool'}[first]
+
+def _pack_column(values: List[Any], column_type: str) -> Sequence:
+    """Store a typed column compactly (NumPy when installed, else array.array)"""
+    if column_type == 'object':
+        return values
+    if np is not None:
+        return np.array(values, dtype={'int64': np.int64, 'float64': np.float64, 'bool': np.bool_}[column_type])
+    if column_type == 'bool':
+        return values
+    return array('q' if column_type == 'int64' else 'd', values)
+
+def _to_list(column: Sequence) -> List[Any]:
+    """Plain Python values for a column (NumPy scalars are not JSON serializable)"""
+    return column.tolist() if hasattr(column, 'tolist') else list(column)
+
+class ColumnarResult:
+    """Query result stored column-wise: names once, one (typed where possible) array per column"""
+    __slots__ = ('columns', 'arrays', 'types', 'row_count')
+
+    def __init__(self, columns: List[str], arrays: List[Sequence], types: List[str], row_count: int):
+        self.columns = columns
+        self.arrays = arrays
+        self.types = types
+        self.row_count = row_count
+
+    @classmethod
+    def from_rows(cls, columns: List[str], rows: List[Any]) -> "ColumnarResult":
+        """Transpose fetched row tuples into columns"""
+        if not rows:
+            return cls(columns, [[] for _ in columns], ['object'] * len(columns), 0)
+
+        arrays, types = [], []
+        for values in zip(*rows):
+            values = list(values)
+            column_type = _column_type(values)
+            arrays.append(_pack_column(values, column_type))
+            types.append(column_type)
+        return cls(columns, arrays, types, len(rows))
+
+    def __len__(self) -> int:
+        return self.row_count
+
+    def slice(self, start: int, stop: Optional[int] = None) -> "ColumnarResult":
+        """Rows [start:stop] as a new result (NumPy columns are sliced without copying)"""
+        start, stop, _ = slice(start, stop).indices(self.row_count)
+        stop = max(start, stop)
+        return ColumnarResult(self.columns, [a[start:stop] for a in self.arrays], self.types, stop - start)
+
+    def iter_rows(self) -> Iterator[tuple]:
+        """Rows as tuples of plain Python values"""
+        return zip(*(_to_list(a) for a in self.arrays)) if self.arrays else iter(())
+
+    def row(self, index: int) -> Dict[str, Any]:
+        values = (a[index] for a in self.arrays)
+        return {c: (v.item() if hasattr(v, 'item') else v) for c, v in zip(self.columns, values)}
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """Legacy row-dict representation ([{column: value}, ...])"""
+        columns = self.columns
+        return [dict(zip(columns, row)) for row in self.iter_rows()]
+
+    def to_json_records(self) -> List[Dict[str, Any]]:
+        """Row dicts holding JSON-native values, converted column by column"""
+        columns = self.columns
+        return [dict(zip(columns, row)) for row in zip(*(json_column(_to_list(a)) for a in self.arrays))]
+
+    def records(self) -> "RowView":
+        return RowView(self)
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the column data"""
+        total = 0
+        for column in self.arrays:
+            if np is not None and isinstance(column, np.ndarray):
+                total += column.nbytes
+            elif isinstance(column, array):
+                total += column.itemsize * len(column)
+            elif column:
+                sample = column[:_SIZE_SAMPLE_ROWS]
+                sample_bytes = sum(sys.getsizeof(v) for v in sample) + 8 * len(sample)
+                total += int(sample_bytes * len(column) / len(sample))
+        return total + sum(sys.getsizeof(c) for c in self.columns)
+
+    def to_columnar_json(self) -> Dict[str, Any]:
+        """Columnar JSON body: column names and types once, then one value array per column"""
+        return {
+            "columns": self.columns,
+            "types": self.types,
+            "data": [_to_list(a) for a in self.arrays],
+            "row_count": self.row_count
+        }
+
+    def to_arrow_table(self, metadata: Optional[Dict[str, str]] = None) -> "pa.Table":
+        """Convert to a pyarrow Table (requires pyarrow)"""
+        if pa is None:
+            raise ValueError("Arrow format is not available: pyarrow is not installed")
+
+        arrays = []
+        for column, column_type in zip(self.arrays, self.types):
+            if column_type == 'object':
+                arrays.append(_arrow_object_column(column))
+            else:
+                arrays.append(pa.array(column))
+        table = pa.Table.from_arrays(arrays, names=self.columns) if self.columns else pa.table({})
+        if metadata:
+            table = table.replace_schema_metadata(metadata)
+        return table
+
+    def to_arrow_ipc(self, metadata: Optional[Dict[str, str]] = None) -> bytes:
+        """Serialize as an Arrow IPC stream (requires pyarrow)"""
+        table = self.to_arrow_table(metadata)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+def _arrow_object_column(values: Sequence) -> "pa.Array":
+    """Arrow array for an untyped column; values Arrow can't infer are sent as text"""
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([None if v is None else str(v) for v in values], type=pa.string())
+
+class RowView(Sequence):
+    """Read-only list-of-dicts view over a ColumnarResult.
+
+    Lets code written against the row-dict payload (`result["data"]`) keep
+    working without materializing a dict per row up front.
+    """
+    __slots__ = ('result',)
+
+    def __init__(self, result: ColumnarResult):
+        self.result = result
+
+    def __len__(self) -> int:
+        return self.result.row_count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if index.step not in (None, 1):
+                return self.result.to_records()[index]
+            return RowView(self.result.slice(index.start or 0, index.stop))
+        if index < 0:
+            index += self.result.row_count
+        if not 0 <= index < self.result.row_count:
+            raise IndexError("row index out of range")
+        return self.result.row(index)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        columns = self.result.columns
+        return (dict(zip(columns, row)) for row in self.result.iter_rows())
+
+    def __eq__(self, other) -> bool:
+        return list(self) == list(other) if isinstance(other, (list, RowView)) else NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(list(self))
@@ -0,0 +1,380 @@
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+from contextlib import AsyncExitStack
+from datetime import date, datetime, time
+import asyncio
+import csv
+import io
+import logging
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.columnar import ColumnarResult
+from app.services.database_cloud import CloudDatabaseService, RowBatch
+from app.services.query_scheduler import query_scheduler, QueryPriority, QueueFullError
+from app.services.running_queries import running_queries
+from app.services.sql_rewriter import partition_target, partition_query, sql_dialect
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: only needed for Parquet exports
+    pa = pq = None
+
+logger = logging.getLogger(__name__)
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+def _pg_temporal(value: Any) -> str:
+    """A date, time or timestamp as PostgreSQL prints it: `2024-05-01 12:30:00.25+05:30`, `... 08:00:00+00`"""
+    offset = value.utcoffset() if isinstance(value, (datetime, time)) else None
+    if offset is not None:
+        value = value.replace(tzinfo=None)
+    text = value.isoformat(sep=" ") if isinstance(value, datetime) else value.isoformat()
+    if "." in text:
+        text = text.rstrip("0")  # microseconds are printed only when non-zero
+    if offset is None:
+        return text
+    seconds = int(offset.total_seconds())
+    sign = "-" if seconds < 0 else "+"
+    hours, rest = divmod(abs(seconds), 3600)
+    minutes, seconds = divmod(rest, 60)
+    text += f"{sign}{hours:02d}"
+    if minutes or seconds:
+        text += f":{minutes:02d}"
+    if seconds:
+        text += f":{seconds:02d}"
+    return text
+
+def _csv_value(value: Any) -> Any:
+    """Text for one CSV cell.
+
+    bytea, boolean and date/time values are written exactly as PostgreSQL's
+    COPY CSV writes them (`\\x0102`, `t`/`f`, `2024-05-01 08:00:00+00`);
+    everything else is written as the csv module formats it.
+    """
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return "\\x" + bytes(value).hex()
+    if isinstance(value, (date, time)):
+        return _pg_temporal(value)
+    return value
+
+async def csv_chunks(batches: AsyncIterator[RowBatch]) -> AsyncIterator[bytes]:
+    """Encode (columns, rows) batches as CSV with a header row, one chunk per batch"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    header = False
+    try:
+        async for columns, rows in batches:
+            if not header:
+                writer.writerow(columns)
+                header = True
+            writer.writerows([_csv_value(v) for v in row] for row in rows)
+            if buffer.tell():
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+    finally:
+        await batches.aclose()
+
+def export_csv(connection_string: str, sql_query: str, query_id: Optional[str] = None,
+               statement_timeout: Optional[float] = None) -> AsyncIterator[bytes]:
+    """Stream a query as CSV with a header row.
+
+    PostgreSQL encodes the CSV itself via COPY; other databases are read
+    through a server-side cursor. Memory use is bounded by one batch.
+    """
+    copied = CloudDatabaseService.copy_csv_async(connection_string, sql_query, query_id, statement_timeout)
+    if copied is not None:
+        return copied
+    return csv_chunks(CloudDatabaseService.stream_read_only_query_async(
+        connection_string, sql_query, query_id=query_id, statement_timeout=statement_timeout
+    ))
+
+class _ChunkSink:
+    """Write-only file object collecting what the Parquet writer produces, drained after each row group"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self.closed = False
+        self._position = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def _conform(table: "pa.Table", schema: "pa.Schema") -> "pa.Table":
+    """Cast a row group to the file schema fixed by the first one"""
+    if table.schema.equals(schema):
+        return table
+    try:
+        return table.cast(schema)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+        raise ValueError(f"Column types changed during export: {str(e)}")
+
+async def parquet_chunks(batches: AsyncIterator[RowBatch]) -> AsyncIterator[bytes]:
+    """Encode (columns, rows) batches as a Parquet file, one row group per EXPORT_PARQUET_ROW_GROUP_ROWS rows.
+
+    The schema is taken from the first row group (columns that are all NULL
+    there become strings). Each row group is sent as soon as it is written,
+    so memory use is bounded by one row group.
+    """
+    try:
+        if pq is None:
+            raise ValueError("Parquet export is not available: pyarrow is not installed")
+
+        sink = _ChunkSink()
+        writer = None
+        columns: List[str] = []
+        pending: List[Any] = []
+
+        def write_row_group(rows: List[Any]):
+            nonlocal writer
+            table = ColumnarResult.from_rows(columns, rows).to_arrow_table()
+            if writer is None:
+                schema = pa.schema([
+                    field.with_type(pa.string()) if pa.types.is_null(field.type) else field for field in table.schema
+                ])
+                writer = pq.ParquetWriter(sink, schema)
+            writer.write_table(_conform(table, writer.schema), row_group_size=max(len(rows), 1))
+
+        async for columns, rows in batches:
+            pending.extend(rows)
+            group_rows = settings.EXPORT_PARQUET_ROW_GROUP_ROWS
+            if len(pending) >= group_rows:
+                while len(pending) >= group_rows:
+                    write_row_group(pending[:group_rows])
+                    del pending[:group_rows]
+                yield sink.drain()
+        if pending or writer is None:
+            write_row_group(pending)
+        writer.close()
+        yield sink.drain()
+    finally:
+        await batches.aclose()
+
+def export_parquet(connection_string: str, sql_query: str, query_id: Optional[str] = None,
+                   statement_timeout: Optional[float] = None) -> AsyncIterator[bytes]:
+    """Stream a query as a Parquet file read through a server-side cursor"""
+    return parquet_chunks(CloudDatabaseService.stream_read_only_query_async(
+        connection_string, sql_query, query_id=query_id, statement_timeout=statement_timeout
+    ))
+
+EXPORTERS = {
+    "csv": export_csv,
+    "parquet": export_parquet,
+}
+
+# Encoders used for partitioned exports, whose rows come from several cursors
+ENCODERS = {
+    "csv": csv_chunks,
+    "parquet": parquet_chunks,
+}
+
+async def plan_partitions(connection_string: str, sql_query: str, partitions: int) -> Dict[str, Any]:
+    """Split an export query into key ranges using catalog statistics.
+
+    Returns `{"queries", "column", "method"}` with one query per range, or
+    `{"queries": [sql_query], "reason"}` when the query can't be split.
+    Ranges come from the primary key histogram (PostgreSQL), primary key
+    MIN/MAX (all databases) or heap page ranges on ctid (PostgreSQL 14+
+    tables without an integer key).
+    """
+    def unsplit(reason: str) -> Dict[str, Any]:
+        return {"queries": [sql_query], "reason": f"Partitioning skipped: {reason}"}
+
+    dialect = sql_dialect(connection_string)
+    target = partition_target(sql_query, dialect)
+    if "reason" in target:
+        return unsplit(target["reason"])
+
+    bounds = await CloudDatabaseService.partition_bounds_async(
+        connection_string, target["table"], target["schema"], partitions
+    )
+    if not bounds["success"]:
+        return unsplit(bounds["message"])
+    if not bounds["cuts"]:
+        return unsplit("no integer primary key or table statistics to split on")
+    if target["order_by"] and target["order_by"] != bounds["column"]:
+        return unsplit(f"query is ordered by {target['order_by']}, not the partition key")
+
+    return {
+        "queries": partition_query(sql_query, dialect, target, bounds["column"], bounds["cuts"]),
+        "column": bounds["column"],
+        "method": bounds["method"],
+        "ordered_by_key": target["order_by"] is not None
+    }
+
+class _PartitionFailure:
+    """Wraps an exception raised while reading one partition"""
+    def __init__(self, error: BaseException):
+        self.error = error
+
+_PARTITION_DONE = object()
+
+async def partitioned_batches(connection_string: str, queries: List[str], ordered: bool,
+                              query_id: str, user_id: str, session_id: Optional[str],
+                              weight: float = 1.0,
+                              statement_timeout: Optional[float] = None,
+                              read: Optional[Callable[[str, str], AsyncIterator[Any]]] = None) -> AsyncIterator[Any]:
+    """Read range queries concurrently, each on its own pooled connection and scheduler slot.
+
+    Ranges are read as (columns, rows) batches from a cursor, or with
+    `read(sql, partition_id)` when given.
+
+    Ordered output drains the ranges one after another (later ranges read
+    ahead into bounded queues); unordered output interleaves batches as
+    they arrive. Every range is tracked as a child of query_id, so
+    cancelling the export cancels them all. Slots are requested in range
+    order so that an ordered export always holds the range it is draining.
+    Only the first range can fail on the scheduler's queue timeout (before
+    any data is produced); later ranges wait as long as it takes.
+    """
+    per_partition = settings.EXPORT_PARTITION_QUEUE_BATCHES
+    if ordered:
+        queues = [asyncio.Queue(maxsize=per_partition) for _ in queries]
+    else:
+        queues = [asyncio.Queue(maxsize=per_partition * len(queries))] * len(queries)
+    admission = asyncio.Lock()
+    closed = False
+
+    async def put(queue: asyncio.Queue, item: Any):
+        # Once the consumer is gone nobody drains the queues: stop instead of blocking forever
+        if closed:
+            raise asyncio.CancelledError()
+        await queue.put(item)
+
+    async def acquire(index: int, stack: AsyncExitStack):
+        # Later ranges wait like query jobs do: failing them would truncate a download already under way
+        while True:
+            try:
+                return await stack.enter_async_context(query_scheduler.slot(
+                    user_id, session_id, priority=QueryPriority.EXPORT, weight=weight
+                ))
+            except QueueFullError as e:
+                if index == 0:
+                    raise
+                await asyncio.sleep(e.retry_after)
+
+    async def produce(index: int, sql: str, queue: asyncio.Queue):
+        partition_id = f"{query_id}:{index}"
+        try:
+            with running_queries.track(partition_id, user_id, parent_id=query_id):
+                async with AsyncExitStack() as stack:
+                    async with admission:
+                        await acquire(index, stack)
+                    if read is not None:
+                        batches = read(sql, partition_id)
+                    else:
+                        batches = CloudDatabaseService.stream_read_only_query_async(
+                            connection_string, sql, query_id=partition_id, statement_timeout=statement_timeout
+                        )
+                    try:
+                        async for batch in batches:
+                            await put(queue, batch)
+                    finally:
+                        await batches.aclose()
+            await put(queue, _PARTITION_DONE)
+        except Exception as e:
+            await put(queue, _PartitionFailure(e))
+
+    producers = [asyncio.create_task(produce(i, sql, queue)) for i, (sql, queue) in enumerate(zip(queries, queues))]
+    metrics.observe("export_partitions", len(queries))
+    try:
+        remaining = len(queries)
+        for queue in (queues if ordered else queues[:1]):
+            while remaining:
+                item = await queue.get()
+                if isinstance(item, _PartitionFailure):
+                    raise item.error
+                if item is _PARTITION_DONE:
+                    remaining -= 1
+                    if ordered:
+                        break
+                    continue
+                yield item
+    finally:
+        closed = True
+        for producer in producers:
+            producer.cancel()
+        # Wake producers blocked on a full queue; their next put stops them
+        for queue in set(queues):
+            while not queue.empty():
+                queue.get_nowait()
+        await asyncio.gather(*producers, return_exceptions=True)
+
+def _csv_record_end(chunk: bytes) -> int:
+    """Offset just past the first CSV record in chunk (newlines inside quotes don't end it)"""
+    position = chunk.find(b"\n")
+    while position != -1 and chunk.count(b'"', 0, position) % 2:
+        position = chunk.find(b"\n", position + 1)
+    return len(chunk) if position == -1 else position + 1
+
+async def _copied_ranges(connection_string: str, queries: List[str], ordered: bool,
+                         query_id: str, user_id: str, session_id: Optional[str],
+                         weight: float, statement_timeout: Optional[float]) -> AsyncIterator[bytes]:
+    """CSV of range queries, each encoded by the server via COPY, with a single header row"""
+    async def read(sql: str, partition_id: str) -> AsyncIterator[Tuple[bytes, bytes]]:
+        # (header, rows) pairs. PostgreSQL sends every CSV row, the header included, as its own
+        # CopyData message and asyncpg hands over whole messages, so a range's first chunk
+        # starts with the complete header
+        chunks = CloudDatabaseService.copy_csv_async(connection_string, sql, partition_id, statement_timeout)
+        first = True
+        try:
+            async for chunk in chunks:
+                end = _csv_record_end(chunk) if first else 0
+                first = False
+                yield chunk[:end], chunk[end:]
+        finally:
+            await chunks.aclose()
+
+    batches = partitioned_batches(
+        connection_string, queries, ordered, query_id, user_id, session_id,
+        weight=weight, statement_timeout=statement_timeout, read=read
+    )
+    header_sent = False
+    try:
+        async for header, rows in batches:
+            if header and not header_sent:
+                rows = header + rows
+                header_sent = True
+            if rows:
+                yield rows
+    finally:
+        await batches.aclose()
+
+def export_partitioned(format: str, connection_string: str, queries: List[str], ordered: bool,
+                       query_id: str, user_id: str, session_id: Optional[str],
+                       weight: float = 1.0,
+                       statement_timeout: Optional[float] = None) -> AsyncIterator[bytes]:
+    """Stream range queries (see partitioned_batches) as one CSV or Parquet file.
+
+    PostgreSQL CSV ranges are each encoded by COPY, like single-stream
+    exports, so the file is byte-identical to an unsplit export of the
+    same rows; other exports encode the ranges' rows here.
+    """
+    if format == "csv" and CloudDatabaseService.can_copy_csv(connection_string):
+        return _copied_ranges(connection_string, queries, ordered, query_id, user_id, session_id, weight, statement_timeout)
+    return ENCODERS[format](partitioned_batches(
+        connection_string, queries, ordered, query_id, user_id, session_id,
+        weight=weight, statement_timeout=statement_timeout
+    ))
@@ -5,6 +5,8 @@ import asyncio
 from openai import AsyncOpenAI
 from anthropic import AsyncAnthropic
 from app.core.config import settings
+from app.services.schema_introspection import render_schema
+from app.services.schema_retrieval import prune_schema
 import logging
 
 logger = logging.getLogger(__name__)
@@ -45,7 +47,7 @@ class LLMService:
     
     async def _openai_generate_sql(self, prompt: str, schema_info: Dict[str, Any] = None) -> Dict[str, Any]:
         """Generate SQL using OpenAI GPT"""
-        system_prompt = self._build_system_prompt(schema_info)
+        system_prompt = self._build_system_prompt(schema_info, prompt)
         user_prompt = self._build_user_prompt(prompt)
         
         try:
@@ -68,7 +70,7 @@ class LLMService:
     
     async def _anthropic_generate_sql(self, prompt: str, schema_info: Dict[str, Any] = None) -> Dict[str, Any]:
         """Generate SQL using Anthropic Claude"""
-        system_prompt = self._build_system_prompt(schema_info)
+        system_prompt = self._build_system_prompt(schema_info, prompt)
         user_prompt = self._build_user_prompt(prompt)
         
         try:
@@ -89,8 +91,8 @@ class LLMService:
             logger.error(f"Anthropic API error: {str(e)}")
             raise
     
-    def _build_system_prompt(self, schema_info: Dict[str, Any] = None) -> str:
-        """Build system prompt for SQL generation"""
+    def _build_system_prompt(self, schema_info: Dict[str, Any] = None, prompt: str = "") -> str:
+        """Build system prompt for SQL generation (large schemas are narrowed to the tables relevant to the prompt)"""
         base_prompt = """You are an expert SQL query generator. Your task is to convert natural language requests into safe, efficient SQL queries.
 
 CRITICAL SAFETY RULES:
@@ -111,10 +113,8 @@ Return a JSON object with exactly these fields:
 """
         
         if schema_info and schema_info.get('tables'):
-            schema_text = "\n\nAVAILABLE TABLES AND COLUMNS:\n"
-            for table in schema_info['tables']:
-                schema_text += f"- {table}\n"
-            base_prompt += schema_text
+            # One line per table: column types, primary keys (PK) and foreign keys (-> table.column)
+            base_prompt += "\n\nAVAILABLE TABLES AND COLUMNS:\n" + render_schema(prune_schema(schema_info, prompt)) + "\n"
         
         return base_prompt
     
@@ -0,0 +1,315 @@
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+from datetime import datetime, timedelta
+import re
+import secrets
+import logging
+from sqlalchemy.engine import make_url
+from app.core.config import settings
+from app.core.security import secure_context
+from app.services.database_cloud import CloudDatabaseService
+from app.services.columnar import RowView
+from app.services.result_spill import ResultCollector, spill_store
+
+logger = logging.getLogger(__name__)
+
+# ORDER BY item that keyset pagination can use: optional qualifier, plain column, direction
+_ORDER_ITEM = re.compile(
+    r'^\s*(?:(?:"[^"]+"|`[^`]+`|\w+)\.)?(?P<column>"[^"]+"|`[^`]+`|\w+)'
+    r'(?:\s+(?P<direction>ASC|DESC))?\s*$',
+    re.IGNORECASE
+)
+_ORDER_BY = re.compile(r'\bORDER\s+BY\b', re.IGNORECASE)
+_TAIL = re.compile(r'^(?P<items>.+?)(?:\s+LIMIT\s+(?P<limit>\d+))?\s*;?\s*$', re.IGNORECASE | re.DOTALL)
+
+def _mask_nested(sql: str) -> str:
+    """Blank out quoted literals and parenthesized text so only top-level keywords remain"""
+    masked = []
+    depth = 0
+    quote = None
+    for ch in sql:
+        if quote:
+            masked.append('_')
+            if ch == quote:
+                quote = None
+        elif ch in ("'", '"', '`'):
+            quote = ch
+            masked.append('_')
+        elif ch == '(':
+            depth += 1
+            masked.append(ch)
+        elif ch == ')':
+            depth = max(0, depth - 1)
+            masked.append(ch)
+        else:
+            masked.append('_' if depth else ch)
+    return ''.join(masked)
+
+class KeysetPlan:
+    """A query split into its base and a trailing ORDER BY usable for keyset pagination"""
+    def __init__(self, base_sql: str, order_clause: str, order_keys: List[Tuple[str, bool]], limit: Optional[int]):
+        self.base_sql = base_sql
+        self.order_clause = order_clause
+        self.order_keys = order_keys  # (column name as written, descending)
+        self.limit = limit
+
+def plan_keyset(sql: str) -> Optional[KeysetPlan]:
+    """Detect a trailing `ORDER BY col [ASC|DESC], ... [LIMIT n]` on plain columns"""
+    sql = sql.strip()
+    masked = _mask_nested(sql)
+
+    matches = list(_ORDER_BY.finditer(masked))
+    if not matches:
+        return None
+    order_by = matches[-1]
+
+    tail = _TAIL.match(masked[order_by.end():])
+    if not tail or re.search(r'\b(OFFSET|FETCH|FOR)\b', tail.group('items'), re.IGNORECASE):
+        return None
+
+    offset = order_by.end()
+    items_start, items_end = tail.span('items')
+    items_masked = tail.group('items')
+    items_text = sql[offset + items_start:offset + items_end]
+
+    order_keys = []
+    position = 0
+    for part in items_masked.split(','):
+        item = items_text[position:position + len(part)]
+        position += len(part) + 1
+        match = _ORDER_ITEM.match(item)
+        if not match:
+            return None
+        column = match.group('column')
+        if column[0] in ('"', '`'):
+            column = column[1:-1]
+        order_keys.append((column, (match.group('direction') or '').upper() == 'DESC'))
+
+    limit = int(tail.group('limit')) if tail.group('limit') else None
+    return KeysetPlan(sql[:order_by.start()].rstrip(), items_text.strip(), order_keys, limit)
+
+def _resolve_columns(plan: KeysetPlan, columns: List[str]) -> Optional[List[str]]:
+    """Map ORDER BY keys to result column names, or None if any key isn't in the output"""
+    resolved = []
+    lowered = {c.lower(): c for c in columns}
+    for column, _ in plan.order_keys:
+        if column in columns:
+            resolved.append(column)
+        elif column.lower() in lowered:
+            resolved.append(lowered[column.lower()])
+        else:
+            return None
+    return resolved
+
+def _nulls_sort_high(connection_string: str) -> bool:
+    """Whether the database orders NULLs above all values (PostgreSQL) rather than below (MySQL, SQLite)"""
+    return make_url(connection_string).get_backend_name() == "postgresql"
+
+def _keyset_predicate(connection_string: str, keys: List[str], descending: List[bool]) -> str:
+    """WHERE clause selecting rows strictly after the (NULL-free) bound row in the given ordering.
+
+    Keys whose NULLs sort after every value in their direction also admit
+    NULLs, which a plain comparison would silently drop. The leading key is
+    also bounded on its own so the database can use it as an index range
+    condition.
+    """
+    quoted = [CloudDatabaseService.quote_identifier(connection_string, k) for k in keys]
+    nulls_high = _nulls_sort_high(connection_string)
+    # NULLs come after the bound when they sort high in an ascending key or low in a descending one
+    nulls_after = [desc != nulls_high for desc in descending]
+
+    def after(i: int, op: str) -> str:
+        comparison = f"{quoted[i]} {op} :_k{i}"
+        return f"({comparison} OR {quoted[i]} IS NULL)" if nulls_after[i] else comparison
+
+    branches = []
+    for i in range(len(keys)):
+        terms = [f"{quoted[j]} = :_k{j}" for j in range(i)]
+        terms.append(after(i, '<' if descending[i] else '>'))
+        branches.append("(" + " AND ".join(terms) + ")")
+
+    leading = after(0, '<=' if descending[0] else '>=')
+    return f"{leading} AND ({' OR '.join(branches)})"
+
+class PageStore:
+    """In-memory continuation state for paginated results (no persistence)"""
+
+    def __init__(self):
+        self._pages: Dict[str, Dict[str, Any]] = {}
+
+    def put(self, state: Dict[str, Any]) -> str:
+        """Store continuation state and return its opaque token"""
+        token = secrets.token_urlsafe(24)
+        state['expires_at'] = datetime.utcnow() + timedelta(seconds=settings.PAGE_TOKEN_TTL_SECONDS)
+        spill_store.keep_until(state.get('result'), state['expires_at'])
+        self._pages[token] = state
+        return token
+
+    def take(self, token: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """Consume continuation state if it exists, is unexpired and belongs to the user"""
+        state = self._pages.get(token)
+        if not state or state['user_id'] != user_id:
+            return None
+        del self._pages[token]
+        if datetime.utcnow() > state['expires_at']:
+            spill_store.release(state.get('result'))
+            return None
+        return state
+
+    def invalidate_session(self, session_id: str, session: Dict[str, Any] = None) -> int:
+        """Drop all continuation state for a session (session destroy listener)"""
+        tokens = [t for t, state in self._pages.items() if state['session_id'] == session_id]
+        for token in tokens:
+            spill_store.release(self._pages.pop(token).get('result'))
+        return len(tokens)
+
+    def cleanup_expired(self) -> int:
+        """Remove expired continuation state (called periodically)"""
+        now = datetime.utcnow()
+        expired = [t for t, state in self._pages.items() if now > state['expires_at']]
+        for token in expired:
+            spill_store.release(self._pages.pop(token).get('result'))
+        return len(expired)
+
+# Global instance (in-memory only)
+page_store = PageStore()
+secure_context.add_destroy_listener(page_store.invalidate_session)
+
+def _page_payload(result: Dict[str, Any], rows: Sequence[Dict[str, Any]], next_token: Optional[str],
+                  truncation: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    payload = {
+        "success": True,
+        "data": rows,
+        "columns": result["columns"],
+        "row_count": len(rows),
+        "next_token": next_token,
+        "has_more": next_token is not None,
+        "truncated": truncation is not None,
+        "truncation": truncation
+    }
+    if isinstance(rows, RowView):
+        payload["result"] = rows.result
+    return payload
+
+async def _cache_remaining(state: Dict[str, Any], connection_string: str, page_size: int) -> Dict[str, Any]:
+    """Fallback: run the full query once and serve later pages from the collected result.
+
+    Results past RESULT_SPILL_THRESHOLD_BYTES are spilled to a memory-mapped
+    temp file, which is deleted once the last page is served or the token expires.
+    """
+    collector = ResultCollector(state['session_id'])
+    try:
+        batches = CloudDatabaseService.stream_read_only_query_async(
+            connection_string, state['sql'],
+            query_id=state.get('query_id'), statement_timeout=state.get('statement_timeout')
+        )
+        try:
+            async for columns, rows in batches:
+                if not collector.add(columns, rows):
+                    break
+        finally:
+            await batches.aclose()
+    except Exception as e:
+        collector.discard()
+        return CloudDatabaseService._query_failure(e)
+
+    return _serve_cached(dict(state, strategy='cached', result=collector.finish(), offset=state.get('delivered', 0),
+                              truncation=collector.budget.truncation), page_size)
+
+def _serve_cached(state: Dict[str, Any], page_size: int) -> Dict[str, Any]:
+    """Return the next page from the collected result"""
+    result = state['result']
+    offset = state['offset']
+    page = result.slice(offset, offset + page_size)
+    state['offset'] = offset + page.row_count
+    state['delivered'] = state.get('delivered', 0) + page.row_count
+
+    if state['offset'] < result.row_count:
+        next_token = page_store.put(state)
+    else:
+        next_token = None
+        spill_store.release(result)
+    return _page_payload({"columns": result.columns}, page.records(), next_token, state.get('truncation'))
+
+async def _serve_keyset(state: Dict[str, Any], connection_string: str, page_size: int,
+                        params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Fetch one page (+1 lookahead row) and record the boundary for the next page"""
+    plan: KeysetPlan = state['plan']
+    remaining = None if plan.limit is None else plan.limit - state['delivered']
+    fetch = page_size if remaining is None else min(page_size, remaining)
+
+    if params is None:
+        page_sql = f"{plan.base_sql} ORDER BY {plan.order_clause} LIMIT {fetch + 1}"
+    else:
+        keys = state['keys']
+        quoted = [CloudDatabaseService.quote_identifier(connection_string, k) for k in keys]
+        order = ", ".join(f"{q}{' DESC' if desc else ''}" for q, (_, desc) in zip(quoted, plan.order_keys))
+        predicate = _keyset_predicate(connection_string, keys, [desc for _, desc in plan.order_keys])
+        page_sql = f"SELECT * FROM ({plan.base_sql}) AS _dv_page WHERE {predicate} ORDER BY {order} LIMIT {fetch + 1}"
+
+    result = await CloudDatabaseService.execute_read_only_query_async(
+        connection_string, page_sql, params, columnar=True,
+        query_id=state.get('query_id'), statement_timeout=state.get('statement_timeout')
+    )
+    if not result["success"]:
+        return result
+
+    rows = result["data"]
+    page, lookahead = rows[:fetch], rows[fetch:]
+    has_more = bool(lookahead) and (remaining is None or remaining > fetch)
+
+    keys = state.get('keys') or _resolve_columns(plan, result["columns"])
+    if has_more and keys is not None:
+        bound = [page[-1][k] for k in keys]
+        following = [lookahead[0][k] for k in keys]
+        # Strict keyset comparison would skip rows tied with the boundary, and NULLs never compare
+        if bound == following or any(v is None for v in bound):
+            keys = None
+
+    if has_more and keys is None:
+        # Keyset not usable from here on: serve the rest of the query from a cached result
+        state['delivered'] += len(page)
+        cached = await _cache_remaining(state, connection_string, 0)
+        if not cached["success"]:
+            return cached
+        return _page_payload(result, page, cached["next_token"], cached["truncation"])
+
+    state['delivered'] += len(page)
+    next_token = None
+    if has_more:
+        state['keys'] = keys
+        state['params'] = {f"_k{i}": page[-1][k] for i, k in enumerate(keys)}
+        next_token = page_store.put(state)
+    return _page_payload(result, page, next_token)
+
+async def fetch_first_page(connection_string: str, sql: str, page_size: int,
+                           user_id: str, session_id: str, query_id: Optional[str] = None,
+                           statement_timeout: Optional[float] = None) -> Dict[str, Any]:
+    """Execute a query and return its first page plus a continuation token.
+
+    Queries ending in a plain-column ORDER BY page with keyset predicates, so
+    each later page is a single range scan. Anything else is run once and
+    the remainder served from memory.
+    """
+    state = {
+        'user_id': user_id,
+        'session_id': session_id,
+        'sql': sql,
+        'page_size': page_size,
+        'delivered': 0,
+        'query_id': query_id,
+        'statement_timeout': statement_timeout
+    }
+
+    plan = plan_keyset(sql)
+    if plan is None:
+        return await _cache_remaining(dict(state, strategy='cached'), connection_string, page_size)
+
+    state.update(strategy='keyset', plan=plan)
+    return await _serve_keyset(state, connection_string, page_size, None)
+
+async def fetch_next_page(state: Dict[str, Any], connection_string: str) -> Dict[str, Any]:
+    """Continue a paginated result from its stored state"""
+    page_size = state['page_size']
+    if state['strategy'] == 'cached':
+        return _serve_cached(state, page_size)
+    return await _serve_keyset(state, connection_string, page_size, state['params'])
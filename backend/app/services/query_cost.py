@@ -0,0 +1,73 @@
+from typing import Dict, Any, List, Iterator, Optional
+from app.core.config import settings
+
+def _walk_postgres(node: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield node
+    for child in node.get("Plans", []):
+        yield from _walk_postgres(child)
+
+def postgres_seq_scan_relations(plan: List[Dict[str, Any]]) -> List[str]:
+    """Relations read with a sequential scan in an `EXPLAIN (FORMAT JSON)` plan"""
+    relations = []
+    for node in _walk_postgres(plan[0]["Plan"]):
+        if node.get("Node Type") == "Seq Scan" and node.get("Relation Name") not in relations:
+            relations.append(node["Relation Name"])
+    return relations
+
+def summarize_postgres_plan(plan: List[Dict[str, Any]], table_rows: Dict[str, float]) -> Dict[str, Any]:
+    """Estimates from a Postgres JSON plan; table_rows holds pg_class.reltuples per relation"""
+    root = plan[0]["Plan"]
+    full_scans = []
+    for node in _walk_postgres(root):
+        if node.get("Node Type") == "Seq Scan":
+            relation = node.get("Relation Name")
+            # Unanalyzed tables have no reltuples; the node's own estimate is a lower bound
+            rows = table_rows.get(relation, node.get("Plan Rows", 0))
+            full_scans.append({"table": relation, "rows": int(rows)})
+
+    return _summary(int(root.get("Plan Rows", 0)), float(root.get("Total Cost", 0.0)), full_scans)
+
+def _walk_mysql_tables(node: Any) -> Iterator[Dict[str, Any]]:
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key == "table" and isinstance(value, dict):
+                yield value
+            yield from _walk_mysql_tables(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from _walk_mysql_tables(item)
+
+def summarize_mysql_plan(plan: Dict[str, Any]) -> Dict[str, Any]:
+    """Estimates from a MySQL `EXPLAIN FORMAT=JSON` plan"""
+    query_block = plan.get("query_block", {})
+    tables = list(_walk_mysql_tables(query_block))
+
+    full_scans = [
+        {"table": table.get("table_name"), "rows": int(table.get("rows_examined_per_scan", 0))}
+        for table in tables if table.get("access_type") == "ALL"
+    ]
+    # The last table in join order produces the final row estimate
+    rows = int(tables[-1].get("rows_produced_per_join", 0)) if tables else 0
+    cost = float(query_block.get("cost_info", {}).get("query_cost", 0.0))
+    return _summary(rows, cost, full_scans)
+
+def cost_limit_exceeded(cost: Optional[float]) -> bool:
+    limit = settings.QUERY_MAX_ESTIMATED_COST
+    return bool(limit) and cost is not None and cost > limit
+
+def _summary(rows: int, cost: float, full_scans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    warnings = [
+        f"Full table scan on {scan['table']} (~{scan['rows']:,} rows)"
+        for scan in full_scans if scan["rows"] >= settings.EXPLAIN_SEQ_SCAN_ROW_THRESHOLD
+    ]
+    if cost_limit_exceeded(cost):
+        warnings.append(
+            f"Estimated cost {cost:,.0f} exceeds the limit of {settings.QUERY_MAX_ESTIMATED_COST:,.0f}; "
+            "execution will be refused"
+        )
+    return {
+        "estimated_rows": rows,
+        "estimated_cost": cost,
+        "full_scans": full_scans,
+        "warnings": warnings
+    }
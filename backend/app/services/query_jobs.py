@@ -0,0 +1,220 @@
+from typing import Dict, Any, Optional
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import uuid
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.security import secure_context
+from app.services.database_cloud import CloudDatabaseService
+from app.services.result_spill import ResultCollector, spill_store
+from app.services.query_scheduler import query_scheduler, QueryPriority, QueueFullError
+from app.services.running_queries import running_queries
+
+logger = logging.getLogger(__name__)
+
+# Job states; the last three are final
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+_FINAL_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+class QueryJobManager:
+    """Long-running queries executed in the background and fetched once done (no persistence).
+
+    Jobs run through the query scheduler at BATCH priority, so they share
+    the remote databases fairly with interactive queries. Progress is
+    published to subscribers as rows arrive; large results spill to
+    memory-mapped temp files, and finished results expire
+    QUERY_JOB_RESULT_TTL_SECONDS after completion.
+    """
+
+    def __init__(self):
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+
+    def submit(self, user_id: str, session_id: str, connection_string: str, sql_query: str,
+               role: Optional[str] = None) -> Dict[str, Any]:
+        """Start a job and return it immediately; must be called on the event loop"""
+        active = sum(1 for job in self._jobs.values() if job['user_id'] == user_id and job['status'] not in _FINAL_STATES)
+        if active >= settings.QUERY_JOB_MAX_ACTIVE_PER_USER:
+            metrics.increment("query_jobs_rejected_total")
+            raise QueueFullError("Too many active query jobs for this user, please retry later", query_scheduler.retry_after())
+
+        job_id = str(uuid.uuid4())
+        job = {
+            'job_id': job_id,
+            'user_id': user_id,
+            'session_id': session_id,
+            'sql': sql_query,
+            'status': QUEUED,
+            'rows_fetched': 0,
+            'columns': [],
+            'result': None,
+            'truncation': None,
+            'error': None,
+            'created_at': datetime.utcnow(),
+            'started_at': None,
+            'finished_at': None,
+            'expires_at': None,
+            'changed': asyncio.Event()
+        }
+        self._jobs[job_id] = job
+        job['task'] = asyncio.create_task(self._run(job, connection_string, role))
+        metrics.increment("query_jobs_submitted_total")
+        return job
+
+    def get(self, job_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """A job owned by user_id, or None (expired jobs are treated as gone)"""
+        job = self._jobs.get(job_id)
+        if not job or job['user_id'] != user_id:
+            return None
+        if job['expires_at'] and datetime.utcnow() > job['expires_at']:
+            return None
+        return job
+
+    async def _run(self, job: Dict[str, Any], connection_string: str, role: Optional[str]):
+        cancelled = False
+        try:
+            with running_queries.track(job['job_id'], job['user_id']):
+                try:
+                    await self._execute(job, connection_string, role)
+                finally:
+                    cancelled = running_queries.is_cancelled(job['job_id'])
+            self._finish(job, CANCELLED if cancelled else SUCCEEDED, error="Query was cancelled" if cancelled else None)
+        except asyncio.CancelledError:
+            self._finish(job, CANCELLED, error="Query was cancelled")
+        except Exception as e:
+            if cancelled:
+                # The server-side cancel surfaces as a driver error
+                self._finish(job, CANCELLED, error="Query was cancelled")
+                return
+            logger.info(f"Query job {job['job_id']} failed: {str(e)}")
+            self._finish(job, FAILED, error=str(e))
+
+    async def _execute(self, job: Dict[str, Any], connection_string: str, role: Optional[str]):
+        # Jobs wait as long as it takes for a slot instead of failing on the queue timeout
+        while True:
+            try:
+                async with query_scheduler.slot(
+                    job['user_id'],
+                    job['session_id'],
+                    priority=QueryPriority.BATCH,
+                    weight=query_scheduler.weight_for_role(role)
+                ):
+                    self._update(job, status=RUNNING, started_at=datetime.utcnow())
+                    await self._fetch(job, connection_string)
+                return
+            except QueueFullError as e:
+                await asyncio.sleep(e.retry_after)
+
+    async def _fetch(self, job: Dict[str, Any], connection_string: str):
+        """Stream the query, publishing progress per batch (large results spill to disk)"""
+        collector = ResultCollector(job['session_id'])
+        batches = CloudDatabaseService.stream_read_only_query_async(
+            connection_string,
+            job['sql'],
+            query_id=job['job_id'],
+            statement_timeout=settings.QUERY_JOB_STATEMENT_TIMEOUT_SECONDS
+        )
+        try:
+            async for columns, batch in batches:
+                more = collector.add(columns, batch)
+                self._update(job, columns=columns, rows_fetched=collector.row_count)
+                if not more:
+                    break
+        except BaseException:
+            collector.discard()
+            raise
+        finally:
+            await batches.aclose()
+
+        job['result'] = collector.finish()
+        job['truncation'] = collector.budget.truncation
+
+    def _update(self, job: Dict[str, Any], **changes):
+        """Apply changes and wake everyone waiting on this job"""
+        job.update(changes)
+        changed, job['changed'] = job['changed'], asyncio.Event()
+        changed.set()
+
+    def _finish(self, job: Dict[str, Any], status: str, error: Optional[str] = None):
+        now = datetime.utcnow()
+        self._update(
+            job,
+            status=status,
+            error=error,
+            finished_at=now,
+            expires_at=now + timedelta(seconds=settings.QUERY_JOB_RESULT_TTL_SECONDS)
+        )
+        spill_store.keep_until(job['result'], job['expires_at'])
+        metrics.increment("query_jobs_finished_total", status=status)
+        if job['started_at']:
+            metrics.observe("query_job_seconds", (now - job['started_at']).total_seconds())
+
+    async def wait_for_change(self, job: Dict[str, Any], timeout: float) -> bool:
+        """Wait until the job changes; False on timeout"""
+        if job['status'] in _FINAL_STATES:
+            return False
+        try:
+            await asyncio.wait_for(job['changed'].wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def cancel(self, job_id: str, user_id: str) -> bool:
+        """Cancel a queued or running job. Blocking (server-side cancel): call from a worker thread"""
+        job = self.get(job_id, user_id)
+        if job is None:
+            return False
+        if job['status'] in _FINAL_STATES:
+            return True
+        # Interrupts the query on the database if it is already running
+        running_queries.cancel(job_id, user_id)
+        if job['status'] == QUEUED:
+            job['task'].get_loop().call_soon_threadsafe(job['task'].cancel)
+        return True
+
+    @staticmethod
+    def status(job: Dict[str, Any]) -> Dict[str, Any]:
+        """Public view of a job (no SQL results)"""
+        result = job['result']
+        return {
+            "job_id": job['job_id'],
+            "status": job['status'],
+            "rows_fetched": job['rows_fetched'],
+            "columns": job['columns'],
+            "row_count": result.row_count if result is not None else None,
+            "truncated": job['truncation'] is not None,
+            "truncation": job['truncation'],
+            "error": job['error'],
+            "created_at": job['created_at'].isoformat(),
+            "started_at": job['started_at'].isoformat() if job['started_at'] else None,
+            "finished_at": job['finished_at'].isoformat() if job['finished_at'] else None,
+            "expires_at": job['expires_at'].isoformat() if job['expires_at'] else None
+        }
+
+    def invalidate_session(self, session_id: str, session: Dict[str, Any] = None) -> int:
+        """Cancel and drop all jobs of a session (session destroy listener)"""
+        job_ids = [job_id for job_id, job in self._jobs.items() if job['session_id'] == session_id]
+        for job_id in job_ids:
+            job = self._jobs.pop(job_id)
+            if job['status'] not in _FINAL_STATES:
+                job['task'].get_loop().call_soon_threadsafe(job['task'].cancel)
+            spill_store.release(job['result'])
+        return len(job_ids)
+
+    def cleanup_expired(self) -> int:
+        """Remove finished jobs past their TTL (called periodically)"""
+        now = datetime.utcnow()
+        expired = [job_id for job_id, job in self._jobs.items() if job['expires_at'] and now > job['expires_at']]
+        for job_id in expired:
+            spill_store.release(self._jobs.pop(job_id)['result'])
+        return len(expired)
+
+    def stats(self) -> Dict[str, Any]:
+        counts = {state: 0 for state in (QUEUED, RUNNING) + _FINAL_STATES}
+        for job in self._jobs.values():
+            counts[job['status']] += 1
+        return counts
+
+# Global instance (in-memory only)
+query_jobs = QueryJobManager()
+secure_context.add_destroy_listener(query_jobs.invalidate_session)
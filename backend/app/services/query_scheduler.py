@@ -0,0 +1,207 @@
+from typing import Dict, Any, List, Optional
+from collections import Counter
+from contextlib import asynccontextmanager
+from enum import IntEnum
+import asyncio
+import itertools
+import math
+import time
+import logging
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+class QueryPriority(IntEnum):
+    """Scheduling classes - lower values are dispatched first"""
+    INTERACTIVE = 0
+    BATCH = 1
+    EXPORT = 2
+
+class QueueFullError(Exception):
+    """Raised when a query cannot be queued; carries a Retry-After hint in seconds"""
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class _Waiter:
+    """A queued request for an execution slot"""
+    def __init__(self, seq: int, user_id: str, session_id: Optional[str],
+                 priority: QueryPriority, start_tag: float, finish_tag: float):
+        self.seq = seq
+        self.user_id = user_id
+        self.session_id = session_id
+        self.priority = priority
+        self.start_tag = start_tag
+        self.finish_tag = finish_tag
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.enqueued_at = time.monotonic()
+
+    def sort_key(self):
+        return (self.priority, self.finish_tag, self.seq)
+
+class QueryScheduler:
+    """Admission control for remote queries with per-user and per-session limits.
+
+    Waiting requests are ordered by priority class, then by weighted fair
+    queuing finish tags so that one busy user cannot starve the others.
+    """
+
+    def __init__(self, max_concurrent: Optional[int] = None, max_per_user: Optional[int] = None,
+                 max_per_session: Optional[int] = None, max_queue_depth: Optional[int] = None,
+                 max_queued_per_user: Optional[int] = None, queue_timeout: Optional[float] = None):
+        self.max_concurrent = max_concurrent or settings.QUERY_MAX_CONCURRENT
+        self.max_per_user = max_per_user or settings.QUERY_MAX_PER_USER
+        self.max_per_session = max_per_session or settings.QUERY_MAX_PER_SESSION
+        self.max_queue_depth = max_queue_depth or settings.QUERY_MAX_QUEUE_DEPTH
+        self.max_queued_per_user = max_queued_per_user or settings.QUERY_MAX_QUEUED_PER_USER
+        self.queue_timeout = queue_timeout or settings.QUERY_QUEUE_TIMEOUT_SECONDS
+
+        self._running = 0
+        self._running_by_user: Counter = Counter()
+        self._running_by_session: Counter = Counter()
+        self._queued_by_user: Counter = Counter()
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        # Weighted fair queuing state
+        self._virtual_time = 0.0
+        self._last_finish: Dict[str, float] = {}
+
+    @staticmethod
+    def weight_for_role(role: Optional[str]) -> float:
+        """Fair-share weight for a user role (unknown roles get 1.0)"""
+        return settings.QUERY_ROLE_WEIGHTS.get(role or '', 1.0)
+
+    def _fits(self, user_id: str, session_id: Optional[str]) -> bool:
+        if self._running >= self.max_concurrent:
+            return False
+        if self._running_by_user[user_id] >= self.max_per_user:
+            return False
+        if session_id and self._running_by_session[session_id] >= self.max_per_session:
+            return False
+        return True
+
+    def _grant(self, user_id: str, session_id: Optional[str]):
+        self._running += 1
+        self._running_by_user[user_id] += 1
+        if session_id:
+            self._running_by_session[session_id] += 1
+
+    def _release(self, user_id: str, session_id: Optional[str]):
+        self._running -= 1
+        self._running_by_user[user_id] -= 1
+        if self._running_by_user[user_id] <= 0:
+            del self._running_by_user[user_id]
+        if session_id:
+            self._running_by_session[session_id] -= 1
+            if self._running_by_session[session_id] <= 0:
+                del self._running_by_session[session_id]
+        if self._running == 0 and not self._waiters:
+            # Idle: restart fair-share accounting so it doesn't grow without bound
+            self._virtual_time = 0.0
+            self._last_finish.clear()
+        self._dispatch()
+
+    def _dispatch(self):
+        """Hand free slots to the best eligible waiters"""
+        if not self._waiters:
+            return
+
+        self._waiters.sort(key=_Waiter.sort_key)
+        for waiter in list(self._waiters):
+            if self._running >= self.max_concurrent:
+                break
+            if waiter.future.done() or not self._fits(waiter.user_id, waiter.session_id):
+                continue
+
+            self._remove_waiter(waiter)
+            self._grant(waiter.user_id, waiter.session_id)
+            self._virtual_time = max(self._virtual_time, waiter.start_tag)
+            waiter.future.set_result(True)
+
+        metrics.set_gauge("query_queue_depth", len(self._waiters))
+
+    def _remove_waiter(self, waiter: _Waiter):
+        self._waiters.remove(waiter)
+        self._queued_by_user[waiter.user_id] -= 1
+        if self._queued_by_user[waiter.user_id] <= 0:
+            del self._queued_by_user[waiter.user_id]
+
+    def retry_after(self) -> int:
+        """Estimate seconds until a queued query would start"""
+        avg_runtime = metrics.mean("query_execution_seconds") or 1.0
+        backlog = len(self._waiters) + 1
+        return max(1, math.ceil(avg_runtime * backlog / self.max_concurrent))
+
+    async def _acquire(self, user_id: str, session_id: Optional[str],
+                       priority: QueryPriority, weight: float) -> float:
+        """Wait for an execution slot; returns seconds spent queued"""
+        if not self._waiters and self._fits(user_id, session_id):
+            self._grant(user_id, session_id)
+            return 0.0
+
+        if len(self._waiters) >= self.max_queue_depth:
+            metrics.increment("query_rejected_total", reason="queue_full")
+            raise QueueFullError("Query queue is full, please retry shortly", self.retry_after())
+        if self._queued_by_user[user_id] >= self.max_queued_per_user:
+            metrics.increment("query_rejected_total", reason="user_queue_full")
+            raise QueueFullError("Too many queued queries for this user, please retry shortly", self.retry_after())
+
+        start_tag = max(self._virtual_time, self._last_finish.get(user_id, 0.0))
+        finish_tag = start_tag + 1.0 / max(weight, 0.01)
+        self._last_finish[user_id] = finish_tag
+
+        waiter = _Waiter(next(self._seq), user_id, session_id, priority, start_tag, finish_tag)
+        self._waiters.append(waiter)
+        self._queued_by_user[user_id] += 1
+        # Other waiters may be blocked by their own limits while this one can start now
+        self._dispatch()
+
+        task = asyncio.current_task()
+        cancelling = task.cancelling() if task else 0
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.future.done():
+                # Granted while we were giving up - hand the slot back
+                self._release(user_id, session_id)
+            else:
+                waiter.future.cancel()
+                self._remove_waiter(waiter)
+                metrics.set_gauge("query_queue_depth", len(self._waiters))
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            metrics.increment("query_rejected_total", reason="queue_timeout")
+            raise QueueFullError("Timed out waiting for a query slot, please retry shortly", self.retry_after())
+
+        if task and task.cancelling() > cancelling:
+            # wait_for returns normally when the cancel lands in the same tick as the grant
+            self._release(user_id, session_id)
+            raise asyncio.CancelledError()
+
+        return time.monotonic() - waiter.enqueued_at
+
+    @asynccontextmanager
+    async def slot(self, user_id: str, session_id: Optional[str] = None,
+                   priority: QueryPriority = QueryPriority.INTERACTIVE, weight: float = 1.0):
+        """Hold an execution slot for the duration of a remote query"""
+        waited = await self._acquire(user_id, session_id, priority, weight)
+        metrics.observe("query_queue_wait_seconds", waited, priority=priority.name.lower())
+
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            metrics.observe("query_execution_seconds", time.monotonic() - started)
+            self._release(user_id, session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """Current scheduler occupancy (no user identifiers)"""
+        return {
+            "running": self._running,
+            "queued": len(self._waiters),
+            "max_concurrent": self.max_concurrent
+        }
+
+# Global instance
+query_scheduler = QueryScheduler()
@@ -0,0 +1,145 @@
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+import re
+import sys
+import threading
+import time
+import logging
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.security import secure_context
+
+logger = logging.getLogger(__name__)
+
+# Rows sampled when estimating the in-memory size of a result
+_SIZE_SAMPLE_ROWS = 100
+_QUOTED_OR_SPACE = re.compile(r"('(?:[^']|'')*'|\"[^\"]*\"|`[^`]*`)|\s+")
+
+def normalize_sql(sql: str) -> str:
+    """Canonical SQL text for cache keys: collapse whitespace outside literals, drop trailing ';'"""
+    normalized = _QUOTED_OR_SPACE.sub(lambda m: m.group(1) or ' ', sql.strip())
+    return normalized.rstrip('; ')
+
+def estimate_result_bytes(result: Dict[str, Any]) -> int:
+    """Approximate memory held by a result, extrapolated from a sample of rows for row-dict data"""
+    if result.get("result") is not None:
+        return result["result"].nbytes() + 256
+
+    rows = result.get("data") or []
+    if not rows:
+        return 256
+
+    sample = rows[:_SIZE_SAMPLE_ROWS]
+    sample_bytes = sum(
+        sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row.values())
+        for row in sample
+    )
+    return int(sample_bytes * len(rows) / len(sample)) + 256
+
+class ResultCache:
+    """LRU cache of query results bounded by a byte budget, with TTL and per-session invalidation"""
+
+    def __init__(self, max_bytes: Optional[int] = None, ttl_seconds: Optional[int] = None):
+        self.max_bytes = max_bytes or settings.RESULT_CACHE_MAX_BYTES
+        self.ttl_seconds = ttl_seconds or settings.RESULT_CACHE_TTL_SECONDS
+        # key -> {'result', 'size', 'stored_at', 'sessions'}
+        self._entries: "OrderedDict[Tuple[str, str, str], Dict[str, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(fingerprint: str, sql: str, role: Optional[str]) -> Tuple[str, str, str]:
+        return fingerprint, normalize_sql(sql), role or ''
+
+    def get(self, fingerprint: str, sql: str, role: Optional[str],
+            session_id: Optional[str] = None) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Return (result, age_seconds) for a fresh entry, or None"""
+        key = self.make_key(fingerprint, sql, role)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry['stored_at'] > self.ttl_seconds:
+                self._remove(key)
+                entry = None
+
+            if entry is None:
+                metrics.increment("result_cache_requests_total", outcome="miss")
+                return None
+
+            self._entries.move_to_end(key)
+            if session_id:
+                entry['sessions'].add(session_id)
+
+        metrics.increment("result_cache_requests_total", outcome="hit")
+        metrics.increment("result_cache_bytes_served_total", entry['size'])
+        return entry['result'], time.monotonic() - entry['stored_at']
+
+    def put(self, fingerprint: str, sql: str, role: Optional[str], result: Dict[str, Any],
+            session_id: Optional[str] = None) -> bool:
+        """Cache a successful result if it fits the per-entry budget"""
+        size = estimate_result_bytes(result)
+        if size > settings.RESULT_CACHE_MAX_ENTRY_BYTES or size > self.max_bytes:
+            return False
+
+        key = self.make_key(fingerprint, sql, role)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = {
+                'result': result,
+                'size': size,
+                'stored_at': time.monotonic(),
+                'sessions': {session_id} if session_id else set()
+            }
+            self._bytes += size
+
+            # Evict least recently used entries until we're back under budget
+            while self._bytes > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+
+            metrics.set_gauge("result_cache_bytes", self._bytes)
+        return True
+
+    def _remove(self, key: Tuple[str, str, str]):
+        entry = self._entries.pop(key)
+        self._bytes -= entry['size']
+
+    def invalidate_session(self, session_id: str, session: Dict[str, Any] = None) -> int:
+        """Forget a session; entries no other session has used are dropped (session destroy listener)"""
+        removed = 0
+        with self._lock:
+            for key in list(self._entries.keys()):
+                sessions = self._entries[key]['sessions']
+                if session_id in sessions:
+                    sessions.discard(session_id)
+                    if not sessions:
+                        self._remove(key)
+                        removed += 1
+            metrics.set_gauge("result_cache_bytes", self._bytes)
+        return removed
+
+    def invalidate_fingerprint(self, fingerprint: str) -> int:
+        """Drop every cached result for one database (e.g. after a schema change)"""
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == fingerprint]
+            for key in keys:
+                self._remove(key)
+            metrics.set_gauge("result_cache_bytes", self._bytes)
+        return len(keys)
+
+    def cleanup_expired(self) -> int:
+        """Remove expired entries (called periodically)"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, entry in self._entries.items() if now - entry['stored_at'] > self.ttl_seconds]
+            for key in expired:
+                self._remove(key)
+            metrics.set_gauge("result_cache_bytes", self._bytes)
+        return len(expired)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+# Global instance (in-memory only)
+result_cache = ResultCache()
+secure_context.add_destroy_listener(result_cache.invalidate_session)
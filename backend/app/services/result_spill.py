@@ -0,0 +1,237 @@
+from array import array
+from typing import Dict, Any, List, Iterator, Optional, Union
+from datetime import datetime, timedelta
+import mmap
+import os
+import pickle
+import struct
+import tempfile
+import threading
+import logging
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.security import secure_context
+from app.services.columnar import ColumnarResult
+from app.services.database_cloud import ResultBudget
+
+logger = logging.getLogger(__name__)
+
+# Each row on disk: 4-byte little-endian length, then the pickled row tuple
+_LENGTH = struct.Struct('<I')
+
+class SpillExpiredError(Exception):
+    """Raised when reading a spilled result whose file was already deleted"""
+
+class SpilledResult:
+    """Query result written row by row to an unlinked temp file and read back through mmap.
+
+    Only the row offset index (8 bytes per row) stays in memory; slices are
+    decoded on demand, so paging through a large result never loads all
+    of it. Offers the read side of ColumnarResult: columns, row_count,
+    slice(), iter_rows() and nbytes().
+    """
+
+    def __init__(self, columns: List[str], directory: str):
+        fd, path = tempfile.mkstemp(prefix="result-", suffix=".rows", dir=directory)
+        self._file = os.fdopen(fd, 'w+b')
+        # Unlinked right away: the data disappears with the descriptor, even after a crash
+        try:
+            os.unlink(path)
+            self._path = None
+        except OSError:
+            self._path = path
+        self._offsets = array('Q', [0])
+        self._map: Optional[mmap.mmap] = None
+        self.columns = columns
+
+    @property
+    def row_count(self) -> int:
+        return len(self._offsets) - 1
+
+    def __len__(self) -> int:
+        return self.row_count
+
+    @property
+    def closed(self) -> bool:
+        return self._file is None
+
+    def append(self, rows: List[Any]):
+        """Write a batch of rows (only before seal())"""
+        chunks = []
+        position = self._offsets[-1]
+        for row in rows:
+            payload = pickle.dumps(tuple(row), protocol=pickle.HIGHEST_PROTOCOL)
+            chunks.append(_LENGTH.pack(len(payload)))
+            chunks.append(payload)
+            position += _LENGTH.size + len(payload)
+            self._offsets.append(position)
+        self._file.write(b''.join(chunks))
+
+    def seal(self) -> "SpilledResult":
+        """Finish writing and map the file for reading"""
+        self._file.flush()
+        if self._offsets[-1]:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self
+
+    def _rows(self, start: int, stop: int) -> Iterator[tuple]:
+        if self.closed:
+            raise SpillExpiredError("Result is no longer available, please run the query again")
+        view = self._map
+        for i in range(start, stop):
+            offset = self._offsets[i] + _LENGTH.size
+            yield pickle.loads(view[offset:self._offsets[i + 1]])
+
+    def slice(self, start: int, stop: Optional[int] = None) -> ColumnarResult:
+        """Rows [start:stop] decoded into an in-memory ColumnarResult"""
+        start, stop, _ = slice(start, stop).indices(self.row_count)
+        return ColumnarResult.from_rows(self.columns, list(self._rows(start, max(start, stop))))
+
+    def iter_rows(self) -> Iterator[tuple]:
+        return self._rows(0, self.row_count)
+
+    def nbytes(self) -> int:
+        """Memory held (the offset index); the rows themselves live in the page cache"""
+        return self._offsets.itemsize * len(self._offsets)
+
+    def disk_bytes(self) -> int:
+        return self._offsets[-1]
+
+    def close(self):
+        """Unmap and delete the file (idempotent)"""
+        if self._file is None:
+            return
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+        self._file = None
+        if self._path:
+            try:
+                os.unlink(self._path)
+            except OSError as e:
+                logger.warning(f"Failed to delete spill file: {e}")
+
+class SpillStore:
+    """Tracks spilled results per session so their files are removed on release, TTL or logout"""
+
+    def __init__(self):
+        # id(result) -> {'result': SpilledResult, 'session_id': str, 'expires_at': datetime}
+        self._spills: Dict[int, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._directory: Optional[str] = None
+
+    def _spill_directory(self) -> str:
+        if self._directory is None:
+            self._directory = tempfile.mkdtemp(prefix="datavibe-spill-", dir=settings.RESULT_SPILL_DIR)
+        return self._directory
+
+    def create(self, session_id: str, columns: List[str]) -> SpilledResult:
+        """Open a new spill file owned by a session"""
+        result = SpilledResult(columns, self._spill_directory())
+        with self._lock:
+            self._spills[id(result)] = {
+                'result': result,
+                'session_id': session_id,
+                'expires_at': datetime.utcnow() + timedelta(seconds=settings.RESULT_SPILL_TTL_SECONDS)
+            }
+        metrics.increment("result_spills_total")
+        return result
+
+    def keep_until(self, result: Any, expires_at: datetime):
+        """Extend a spill's backstop expiry to its owner's (no-op for in-memory results).
+
+        Owners (page tokens, finished jobs) release their spill when they
+        expire; the TTL only catches spills nobody released.
+        """
+        if not isinstance(result, SpilledResult):
+            return
+        with self._lock:
+            entry = self._spills.get(id(result))
+            if entry is not None and expires_at > entry['expires_at']:
+                entry['expires_at'] = expires_at
+
+    def release(self, result: Any):
+        """Delete a spilled result once its owner is done with it (no-op for in-memory results)"""
+        if not isinstance(result, SpilledResult):
+            return
+        with self._lock:
+            self._spills.pop(id(result), None)
+        result.close()
+
+    def invalidate_session(self, session_id: str, session: Dict[str, Any] = None) -> int:
+        """Delete all spill files of a session (session destroy listener)"""
+        with self._lock:
+            released = [k for k, entry in self._spills.items() if entry['session_id'] == session_id]
+            results = [self._spills.pop(k)['result'] for k in released]
+        for result in results:
+            result.close()
+        return len(results)
+
+    def cleanup_expired(self) -> int:
+        """Delete spill files past their expiry (called periodically)"""
+        now = datetime.utcnow()
+        with self._lock:
+            expired = [k for k, entry in self._spills.items() if now > entry['expires_at']]
+            results = [self._spills.pop(k)['result'] for k in expired]
+        for result in results:
+            result.close()
+        return len(results)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            spills = [entry['result'] for entry in self._spills.values()]
+        return {"files": len(spills), "disk_bytes": sum(r.disk_bytes() for r in spills if not r.closed)}
+
+# Global instance (in-memory only)
+spill_store = SpillStore()
+secure_context.add_destroy_listener(spill_store.invalidate_session)
+
+class ResultCollector:
+    """Accumulates fetched batches within a budget, spilling to disk past RESULT_SPILL_THRESHOLD_BYTES.
+
+    With spilling enabled the budget grows to RESULT_SPILL_MAX_ROWS /
+    RESULT_SPILL_MAX_BYTES, since rows past the threshold no longer cost memory.
+    """
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.spill_enabled = settings.RESULT_SPILL_THRESHOLD_BYTES is not None
+        self.budget = (ResultBudget(settings.RESULT_SPILL_MAX_ROWS, settings.RESULT_SPILL_MAX_BYTES)
+                       if self.spill_enabled else ResultBudget())
+        self.columns: List[str] = []
+        self._rows: List[Any] = []
+        self._spill: Optional[SpilledResult] = None
+
+    @property
+    def row_count(self) -> int:
+        return self.budget.rows
+
+    def add(self, columns: List[str], rows: List[Any]) -> bool:
+        """Take a batch; returns False once the budget is exhausted"""
+        self.columns = columns
+        rows = self.budget.accept(list(rows))
+
+        if self._spill is None and self.spill_enabled and self.budget.bytes > settings.RESULT_SPILL_THRESHOLD_BYTES:
+            self._spill = spill_store.create(self.session_id, columns)
+            self._spill.append(self._rows)
+            self._rows = []
+            logger.info(f"Spilling result past {settings.RESULT_SPILL_THRESHOLD_BYTES} bytes to disk")
+
+        if self._spill is not None:
+            self._spill.append(rows)
+        else:
+            self._rows.extend(rows)
+        return not self.budget.exhausted
+
+    def finish(self) -> Union[ColumnarResult, SpilledResult]:
+        if self._spill is not None:
+            return self._spill.seal()
+        return ColumnarResult.from_rows(self.columns, self._rows)
+
+    def discard(self):
+        """Drop anything collected so far (fetch failed or was cancelled)"""
+        if self._spill is not None:
+            spill_store.release(self._spill)
+            self._spill = None
+        self._rows = []
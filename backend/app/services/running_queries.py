@@ -0,0 +1,101 @@
+from typing import Dict, Any, Callable, Iterator, Optional
+from contextlib import contextmanager
+import threading
+import time
+import logging
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+class QueryCancelledError(Exception):
+    """Raised when a query is cancelled before it reached the database"""
+
+class RunningQueryRegistry:
+    """Queries currently executing, by query_id, with a handle to cancel them server-side.
+
+    The API registers a query (and its owner) before it is scheduled; the
+    database layer attaches the cancel handle once it knows the backend
+    process serving the query.
+    """
+
+    def __init__(self):
+        self._queries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def timeout_for_role(role: Optional[str]) -> float:
+        """Statement timeout in seconds for a user role (0 disables)"""
+        return settings.QUERY_ROLE_STATEMENT_TIMEOUTS.get(role or '', settings.QUERY_STATEMENT_TIMEOUT_SECONDS)
+
+    @contextmanager
+    def track(self, query_id: str, user_id: str, parent_id: Optional[str] = None) -> Iterator[None]:
+        """Register a query for the duration of its execution.
+        
+        A query with a parent_id (one partition of a parallel export) is
+        cancelled together with its parent.
+        """
+        with self._lock:
+            if query_id in self._queries:
+                raise ValueError("Query is already running")
+            self._queries[query_id] = {
+                'user_id': user_id,
+                'parent_id': parent_id,
+                'cancel': None,
+                'cancelled': parent_id is not None and self._cancelled(parent_id),
+                'started_at': time.monotonic()
+            }
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._queries.pop(query_id, None)
+
+    def attach(self, query_id: Optional[str], cancel: Optional[Callable[[], None]]):
+        """Record how to cancel a tracked query; raises if it was cancelled while queued"""
+        if not query_id:
+            return
+        with self._lock:
+            entry = self._queries.get(query_id)
+            if entry is None:
+                return
+            if entry['cancelled']:
+                raise QueryCancelledError("Query was cancelled")
+            entry['cancel'] = cancel
+
+    def _cancelled(self, query_id: str) -> bool:
+        entry = self._queries.get(query_id)
+        return bool(entry and entry['cancelled'])
+
+    def is_cancelled(self, query_id: str) -> bool:
+        with self._lock:
+            return self._cancelled(query_id)
+
+    def cancel(self, query_id: str, user_id: str) -> bool:
+        """Cancel a running query owned by user_id. Blocking: call from a worker thread.
+
+        Returns False if no such query is running for this user.
+        """
+        with self._lock:
+            entry = self._queries.get(query_id)
+            if entry is None or entry['user_id'] != user_id:
+                return False
+            entries = [entry] + [e for e in self._queries.values() if e['parent_id'] == query_id]
+            for e in entries:
+                e['cancelled'] = True
+            cancels = [e['cancel'] for e in entries if e['cancel'] is not None]
+
+        metrics.increment("query_cancellations_total")
+        for cancel in cancels:
+            try:
+                cancel()
+            except Exception as e:
+                # The query may have finished between lookup and cancel
+                logger.warning(f"Server-side cancel of query {query_id} failed: {str(e)}")
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {"running": len(self._queries)}
+
+# Global instance (in-memory only)
+running_queries = RunningQueryRegistry()
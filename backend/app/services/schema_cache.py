@@ -0,0 +1,138 @@
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Set
+import asyncio
+import threading
+import time
+import logging
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.security import secure_context, connection_fingerprint
+from app.services.database_cloud import CloudDatabaseService
+from app.services.single_flight import schema_flights
+
+logger = logging.getLogger(__name__)
+
+class SchemaCache:
+    """Schema info per connection fingerprint, revalidated against a cheap version fingerprint.
+
+    Entries younger than SCHEMA_CACHE_FRESH_SECONDS are served without
+    touching the database. Older ones are served stale while a background
+    task compares the schema version and reloads only if it changed;
+    past SCHEMA_CACHE_MAX_STALE_SECONDS the check runs before serving.
+    Refreshes for one database are coalesced.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries or settings.SCHEMA_CACHE_MAX_ENTRIES
+        # fingerprint -> {'info', 'version', 'checked_at', 'generation'}
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # Bumped on invalidation so refreshes that started earlier don't store outdated schemas
+        self._generations: Dict[str, int] = {}
+        self._refreshing: Set[asyncio.Task] = set()
+        self._lock = threading.Lock()
+
+    def lookup(self, connection_string: str) -> Optional[Dict[str, Any]]:
+        """Cached schema info if it can be served without a round trip (None otherwise).
+
+        Stale entries are returned as well, after scheduling a background
+        revalidation.
+        """
+        fingerprint = connection_fingerprint(connection_string)
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is None:
+                return None
+            age = time.monotonic() - entry['checked_at']
+            if age > settings.SCHEMA_CACHE_MAX_STALE_SECONDS:
+                return None
+            self._entries.move_to_end(fingerprint)
+
+        if age <= settings.SCHEMA_CACHE_FRESH_SECONDS:
+            metrics.increment("schema_cache_requests_total", outcome="hit")
+        else:
+            metrics.increment("schema_cache_requests_total", outcome="stale")
+            self._revalidate_in_background(connection_string)
+        return entry['info']
+
+    async def get(self, connection_string: str) -> Dict[str, Any]:
+        """Schema info from the cache, revalidating or loading it when it can't be served as-is"""
+        info = self.lookup(connection_string)
+        if info is not None:
+            return info
+
+        fingerprint = connection_fingerprint(connection_string)
+        with self._lock:
+            outcome = "expired" if fingerprint in self._entries else "miss"
+        metrics.increment("schema_cache_requests_total", outcome=outcome)
+        return await self._refresh(connection_string)
+
+    def _revalidate_in_background(self, connection_string: str):
+        task = asyncio.create_task(self._refresh(connection_string))
+        self._refreshing.add(task)
+        task.add_done_callback(self._refreshing.discard)
+
+    async def _refresh(self, connection_string: str) -> Dict[str, Any]:
+        """Revalidate (or load) one database's schema; concurrent refreshes share one run"""
+        fingerprint = connection_fingerprint(connection_string)
+        return await schema_flights.do(
+            (fingerprint, "refresh"),
+            lambda: self._revalidate(connection_string, fingerprint)
+        )
+
+    async def _revalidate(self, connection_string: str, fingerprint: str) -> Dict[str, Any]:
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            generation = self._generations.get(fingerprint, 0)
+
+        version = await CloudDatabaseService.get_schema_version_async(connection_string)
+        current = version.get("version") if version["success"] else None
+
+        if entry is not None and current is not None and current == entry['version']:
+            with self._lock:
+                entry['checked_at'] = time.monotonic()
+            metrics.increment("schema_cache_revalidations_total", result="unchanged")
+            return entry['info']
+
+        info = await CloudDatabaseService.get_schema_info_async(connection_string)
+        if not info["success"]:
+            metrics.increment("schema_cache_revalidations_total", result="failed")
+            # Keep serving the last good schema rather than none at all
+            return entry['info'] if entry is not None else info
+
+        metrics.increment("schema_cache_revalidations_total", result="changed" if entry is not None else "loaded")
+        with self._lock:
+            if self._generations.get(fingerprint, 0) == generation:
+                self._entries[fingerprint] = {
+                    'info': info,
+                    'version': current,
+                    'checked_at': time.monotonic()
+                }
+                self._entries.move_to_end(fingerprint)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return info
+
+    def invalidate(self, connection_string: str) -> bool:
+        """Drop a database's cached schema (e.g. after a migration ran against it)"""
+        return self.invalidate_fingerprint(connection_fingerprint(connection_string))
+
+    def invalidate_fingerprint(self, fingerprint: str) -> bool:
+        with self._lock:
+            self._generations[fingerprint] = self._generations.get(fingerprint, 0) + 1
+            return self._entries.pop(fingerprint, None) is not None
+
+    def release_session(self, session_id: str, session: Dict[str, Any]):
+        """Session destroy listener: forget the schema once no live session uses the database"""
+        fingerprint = session.get('fingerprint')
+        if fingerprint and not secure_context.is_fingerprint_active(fingerprint):
+            with self._lock:
+                self._entries.pop(fingerprint, None)
+                self._generations.pop(fingerprint, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "refreshing": len(self._refreshing)}
+
+# Global instance (in-memory only)
+schema_cache = SchemaCache()
+secure_context.add_destroy_listener(schema_cache.release_session)
@@ -0,0 +1,286 @@
+from typing import Dict, Any, List, Optional
+import json
+import logging
+import sqlalchemy
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# PostgreSQL: tables, columns, primary/foreign keys and indexes of the schemas on the
+# search path as one JSON document, straight from pg_catalog in a single round trip
+# (information_schema views re-check privileges per row and are slow on large schemas).
+# Relations are identified by (schema, name): those outside the first schema on the
+# search path are named `schema.table`, so same-named tables in different schemas
+# don't overwrite each other
+_POSTGRES_CATALOG_SQL = """
+    WITH rels AS (
+        SELECT c.oid, c.relkind,
+               CASE WHEN n.nspname = (current_schemas(false))[1] THEN c.relname
+                    ELSE n.nspname || '.' || c.relname END AS name
+        FROM pg_catalog.pg_class c
+        JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = ANY(current_schemas(false))
+          AND c.relkind IN ('r', 'p', 'v', 'm', 'f')
+          AND NOT c.relispartition
+    )
+    SELECT json_build_object(
+        'tables', (
+            SELECT json_agg(json_build_array(r.name, r.relkind IN ('v', 'm'), obj_description(r.oid, 'pg_class')))
+            FROM rels r
+        ),
+        'columns', (
+            SELECT json_agg(json_build_array(
+                r.name, a.attname, format_type(a.atttypid, a.atttypmod), NOT a.attnotnull, a.attnum,
+                col_description(r.oid, a.attnum)
+            ))
+            FROM rels r
+            JOIN pg_catalog.pg_attribute a ON a.attrelid = r.oid
+            WHERE a.attnum > 0 AND NOT a.attisdropped
+        ),
+        'keys', (
+            SELECT json_agg(json_build_array(
+                r.name, con.conname, con.contype::text, a.attname, k.ord,
+                CASE WHEN refns.nspname = (current_schemas(false))[1] THEN ref.relname
+                     ELSE refns.nspname || '.' || ref.relname END,
+                ra.attname
+            ))
+            FROM rels r
+            JOIN pg_catalog.pg_constraint con ON con.conrelid = r.oid AND con.contype IN ('p', 'f')
+            CROSS JOIN LATERAL unnest(con.conkey, con.confkey) WITH ORDINALITY AS k(attnum, refnum, ord)
+            JOIN pg_catalog.pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+            LEFT JOIN pg_catalog.pg_class ref ON ref.oid = con.confrelid
+            LEFT JOIN pg_catalog.pg_namespace refns ON refns.oid = ref.relnamespace
+            LEFT JOIN pg_catalog.pg_attribute ra ON ra.attrelid = con.confrelid AND ra.attnum = k.refnum
+        ),
+        'indexes', (
+            SELECT json_agg(json_build_array(r.name, ic.relname, i.indisunique, a.attname, k.ord))
+            FROM rels r
+            JOIN pg_catalog.pg_index i ON i.indrelid = r.oid AND NOT i.indisprimary
+            JOIN pg_catalog.pg_class ic ON ic.oid = i.indexrelid
+            CROSS JOIN LATERAL unnest(i.indkey::int2[]) WITH ORDINALITY AS k(attnum, ord)
+            JOIN pg_catalog.pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+        )
+    )::text
+"""
+
+# MySQL 5.7.22+ / 8.0: the same document for the current database (its information_schema
+# is backed by the data dictionary, so there is no faster native catalog to read)
+_MYSQL_CATALOG_SQL = """
+    SELECT JSON_OBJECT(
+        'tables', (
+            SELECT JSON_ARRAYAGG(JSON_ARRAY(
+                TABLE_NAME, TABLE_TYPE = 'VIEW', IF(TABLE_TYPE = 'VIEW' OR TABLE_COMMENT = '', NULL, TABLE_COMMENT)
+            ))
+            FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE()
+        ),
+        'columns', (
+            SELECT JSON_ARRAYAGG(JSON_ARRAY(
+                TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE = 'YES', ORDINAL_POSITION, NULLIF(COLUMN_COMMENT, '')
+            ))
+            FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE()
+        ),
+        'keys', (
+            SELECT JSON_ARRAYAGG(JSON_ARRAY(
+                TABLE_NAME, CONSTRAINT_NAME, IF(CONSTRAINT_NAME = 'PRIMARY', 'p', 'f'), COLUMN_NAME,
+                ORDINAL_POSITION, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME
+            ))
+            FROM information_schema.KEY_COLUMN_USAGE
+            WHERE TABLE_SCHEMA = DATABASE()
+              AND (CONSTRAINT_NAME = 'PRIMARY' OR REFERENCED_TABLE_NAME IS NOT NULL)
+        ),
+        'indexes', (
+            SELECT JSON_ARRAYAGG(JSON_ARRAY(TABLE_NAME, INDEX_NAME, NON_UNIQUE = 0, COLUMN_NAME, SEQ_IN_INDEX))
+            FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND INDEX_NAME <> 'PRIMARY' AND COLUMN_NAME IS NOT NULL
+        )
+    )
+"""
+
+# Cheap schema version fingerprints: they change whenever a table, column, index or
+# constraint does, without reading the catalog contents themselves
+_POSTGRES_VERSION_SQL = """
+    WITH ns AS (
+        SELECT oid FROM pg_catalog.pg_namespace WHERE nspname = ANY(current_schemas(false))
+    ), rels AS (
+        SELECT c.oid, c.xmin FROM pg_catalog.pg_class c
+        WHERE c.relnamespace IN (SELECT oid FROM ns) AND c.relkind IN ('r', 'p', 'v', 'm', 'f', 'i')
+    )
+    SELECT concat_ws('/',
+        (SELECT count(*) || ':' || coalesce(md5(string_agg(oid::text || '.' || xmin::text, ',' ORDER BY oid)), '')
+         FROM rels),
+        (SELECT count(*) || ':' || coalesce(sum(a.xmin::text::bigint), 0)
+         FROM pg_catalog.pg_attribute a WHERE a.attrelid IN (SELECT oid FROM rels) AND a.attnum > 0),
+        (SELECT count(*) || ':' || coalesce(sum(con.xmin::text::bigint), 0)
+         FROM pg_catalog.pg_constraint con WHERE con.connamespace IN (SELECT oid FROM ns))
+    )
+"""
+
+# UPDATE_TIME tracks data changes rather than DDL, so MySQL sums checksums of the definitions instead
+_MYSQL_VERSION_SQL = """
+    SELECT CONCAT_WS('/',
+        (SELECT CONCAT(COUNT(*), ':', COALESCE(SUM(CRC32(CONCAT_WS(':', TABLE_NAME, TABLE_TYPE, CREATE_TIME))), 0))
+         FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE()),
+        (SELECT CONCAT(COUNT(*), ':', COALESCE(SUM(CRC32(CONCAT_WS(':', TABLE_NAME, COLUMN_NAME, COLUMN_TYPE,
+                                                                   IS_NULLABLE, ORDINAL_POSITION))), 0))
+         FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE()),
+        (SELECT CONCAT(COUNT(*), ':', COALESCE(SUM(CRC32(CONCAT_WS(':', TABLE_NAME, INDEX_NAME, COLUMN_NAME,
+                                                                   SEQ_IN_INDEX))), 0))
+         FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = DATABASE())
+    )
+"""
+
+_VERSION_SQL = {
+    'postgresql': _POSTGRES_VERSION_SQL,
+    'mysql': _MYSQL_VERSION_SQL,
+    'sqlite': "PRAGMA schema_version",
+}
+
+_CATALOG_SQL = {
+    'postgresql': _POSTGRES_CATALOG_SQL,
+    'mysql': _MYSQL_CATALOG_SQL,
+}
+
+def _empty_table(is_view: bool, comment: Optional[str] = None) -> Dict[str, Any]:
+    table = {"kind": "view" if is_view else "table", "columns": [], "primary_key": [], "foreign_keys": [], "indexes": []}
+    if comment:
+        table["comment"] = comment
+    return table
+
+def _column(name: str, type_name: str, nullable: Any, comment: Optional[str] = None) -> Dict[str, Any]:
+    column = {"name": name, "type": type_name, "nullable": bool(nullable)}
+    if comment:
+        column["comment"] = comment
+    return column
+
+def _assemble(document: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Build the schema model from the flat catalog rows of one introspection query"""
+    # Table rows: (name, is_view[, comment]); column rows: (table, name, type, nullable, position[, comment])
+    tables = {row[0]: _empty_table(bool(row[1]), *row[2:3]) for row in sorted(document.get("tables") or [])}
+
+    for table, name, type_name, nullable, _, *comment in sorted(document.get("columns") or [], key=lambda c: (c[0], c[4])):
+        if table in tables:
+            tables[table]["columns"].append(_column(name, type_name, nullable, *comment))
+
+    foreign_keys: Dict[Any, Dict[str, Any]] = {}
+    for table, constraint, kind, column, _, ref_table, ref_column in sorted(
+            document.get("keys") or [], key=lambda k: (k[0], k[1], k[4])):
+        if table not in tables:
+            continue
+        if kind == 'p':
+            tables[table]["primary_key"].append(column)
+            continue
+        fk = foreign_keys.get((table, constraint))
+        if fk is None:
+            fk = foreign_keys[(table, constraint)] = {
+                "name": constraint, "columns": [], "references": ref_table, "referenced_columns": []
+            }
+            tables[table]["foreign_keys"].append(fk)
+        fk["columns"].append(column)
+        fk["referenced_columns"].append(ref_column)
+
+    indexes: Dict[Any, Dict[str, Any]] = {}
+    for table, index, unique, column, _ in sorted(document.get("indexes") or [], key=lambda i: (i[0], i[1], i[4])):
+        if table not in tables:
+            continue
+        entry = indexes.get((table, index))
+        if entry is None:
+            entry = indexes[(table, index)] = {"name": index, "columns": [], "unique": bool(unique)}
+            tables[table]["indexes"].append(entry)
+        entry["columns"].append(column)
+
+    return tables
+
+def _inspect(conn: sqlalchemy.engine.Connection) -> Dict[str, Dict[str, Any]]:
+    """Schema model via SQLAlchemy's inspector (one query per table - for SQLite and other dialects)"""
+    inspector = sqlalchemy.inspect(conn)
+    names = [(name, False) for name in inspector.get_table_names()] + [(name, True) for name in inspector.get_view_names()]
+    tables = {}
+    for name, is_view in sorted(names):
+        try:
+            comment = inspector.get_table_comment(name).get("text")
+        except NotImplementedError:
+            comment = None
+        table = tables[name] = _empty_table(is_view, comment)
+        table["columns"] = [
+            _column(c["name"], str(c["type"]).lower(), c.get("nullable", True), c.get("comment"))
+            for c in inspector.get_columns(name)
+        ]
+        if is_view:
+            continue
+        table["primary_key"] = inspector.get_pk_constraint(name).get("constrained_columns") or []
+        table["foreign_keys"] = [
+            {
+                "name": fk.get("name"),
+                "columns": fk["constrained_columns"],
+                "references": fk["referred_table"],
+                "referenced_columns": fk["referred_columns"]
+            }
+            for fk in inspector.get_foreign_keys(name)
+        ]
+        table["indexes"] = [
+            {"name": index["name"], "columns": [c for c in index["column_names"] if c], "unique": bool(index.get("unique"))}
+            for index in inspector.get_indexes(name)
+        ]
+    return tables
+
+def introspect_schema(conn: sqlalchemy.engine.Connection) -> Dict[str, Dict[str, Any]]:
+    """Tables with their columns (name, type, nullable, comment), primary key, foreign keys and indexes.
+
+    PostgreSQL and MySQL are read with a single catalog query; other
+    dialects go through SQLAlchemy's inspector.
+    """
+    sql = _CATALOG_SQL.get(conn.dialect.name)
+    if sql is None:
+        return _inspect(conn)
+    document = conn.execute(text(sql)).scalar()
+    return _assemble(json.loads(document) if isinstance(document, (str, bytes)) else document or {})
+
+def schema_version(conn: sqlalchemy.engine.Connection) -> Optional[str]:
+    """Fingerprint of the schema's definition, or None when the dialect has no cheap one"""
+    sql = _VERSION_SQL.get(conn.dialect.name)
+    if sql is None:
+        return None
+    return str(conn.execute(text(sql)).scalar())
+
+def schema_summary(tables: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """The schema info payload: table names, {table: [column, ...]} and the full model"""
+    return {
+        "success": True,
+        "tables": list(tables),
+        "columns": {name: [c["name"] for c in table["columns"]] for name, table in tables.items()},
+        "schema": tables,
+        "message": f"Found {len(tables)} tables"
+    }
+
+def describe_table(name: str, table: Dict[str, Any]) -> str:
+    """One compact prompt line: `orders(id integer PK, customer_id integer -> customers.id, ...)`"""
+    references = {}
+    for fk in table.get("foreign_keys", []):
+        for column, ref_column in zip(fk["columns"], fk["referenced_columns"]):
+            references[column] = f"{fk['references']}.{ref_column}"
+
+    columns = []
+    for column in table.get("columns", []):
+        part = f"{column['name']} {column['type']}"
+        if column["name"] in table.get("primary_key", []):
+            part += " PK"
+        if column["name"] in references:
+            part += f" -> {references[column['name']]}"
+        columns.append(part)
+
+    kind = " [view]" if table.get("kind") == "view" else ""
+    comment = f" -- {table['comment']}" if table.get("comment") else ""
+    return f"{name}({', '.join(columns)}){kind}{comment}"
+
+def render_schema(schema_info: Optional[Dict[str, Any]]) -> str:
+    """Schema info as prompt text, one table per line (table names only for bare payloads)"""
+    if not schema_info:
+        return ""
+    model = schema_info.get("schema") or {}
+    lines: List[str] = []
+    for name in schema_info.get("tables", []):
+        lines.append(f"- {describe_table(name, model[name])}" if name in model else f"- {name}")
+    total = schema_info.get("total_tables")
+    if total and total > len(lines):
+        lines.append(f"({len(lines)} of {total} tables shown: those most relevant to the request)")
+    return "\n".join(lines)
@@ -0,0 +1,146 @@
+from collections import Counter, OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+import math
+import re
+import threading
+import logging
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# BM25 parameters (the usual defaults)
+_K1 = 1.2
+_B = 0.75
+# Table-name terms count this many times as column or comment terms
+_TABLE_NAME_WEIGHT = 3
+# Schemas whose index is kept around (the schema cache hands out the same dict until it refreshes)
+_MAX_CACHED_INDEXES = 32
+
+_WORD = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from give how in is it list me of on or show the their them to "
+    "was what which who with all each per many much find get".split()
+)
+
+def _stem(word: str) -> str:
+    """Crude plural folding so `customers` matches `customer_id`"""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("ses", "xes", "ches", "shes")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+def tokenize(text: str) -> List[str]:
+    """Terms of an identifier or sentence: split on snake_case, camelCase and digits, lowercased and stemmed"""
+    return [
+        _stem(word.lower()) for word in _WORD.findall(text or "")
+        if word.lower() not in _STOPWORDS
+    ]
+
+class SchemaIndex:
+    """BM25 index with one document per table (its name, columns and comments)"""
+
+    def __init__(self, schema_info: Dict[str, Any]):
+        model = schema_info.get("schema") or {}
+        columns = schema_info.get("columns") or {}
+        self.tables: List[str] = list(schema_info.get("tables") or [])
+        self._terms: Dict[str, Counter] = {}
+        self._neighbours: Dict[str, List[str]] = {name: [] for name in self.tables}
+
+        for name in self.tables:
+            table = model.get(name, {})
+            terms = tokenize(name) * _TABLE_NAME_WEIGHT + tokenize(table.get("comment", ""))
+            for column in table.get("columns") or [{"name": c} for c in columns.get(name, [])]:
+                terms += tokenize(column["name"]) + tokenize(column.get("comment", ""))
+            self._terms[name] = Counter(terms)
+
+            for fk in table.get("foreign_keys", []):
+                referenced = fk["references"]
+                if referenced in self._neighbours and referenced != name:
+                    self._neighbours[name].append(referenced)
+                    self._neighbours[referenced].append(name)
+
+        lengths = [sum(terms.values()) for terms in self._terms.values()]
+        self._average_length = (sum(lengths) / len(lengths)) if lengths else 0.0
+        document_frequency = Counter(term for terms in self._terms.values() for term in terms)
+        count = len(self.tables)
+        self._idf = {
+            term: math.log(1 + (count - df + 0.5) / (df + 0.5))
+            for term, df in document_frequency.items()
+        }
+
+    def score(self, query: str) -> List[Tuple[str, float]]:
+        """Tables matching any query term, best first"""
+        query_terms = set(tokenize(query))
+        scores = []
+        for name in self.tables:
+            terms = self._terms[name]
+            length = sum(terms.values())
+            score = 0.0
+            for term in query_terms & terms.keys():
+                tf = terms[term]
+                norm = _K1 * (1 - _B + _B * length / self._average_length)
+                score += self._idf[term] * tf * (_K1 + 1) / (tf + norm)
+            if score > 0:
+                scores.append((name, score))
+        scores.sort(key=lambda item: (-item[1], item[0]))
+        return scores
+
+    def select(self, query: str, top_k: int, max_tables: int) -> List[str]:
+        """The top_k best matches, then their foreign key neighbours, up to max_tables (schema order)"""
+        ranked = [name for name, _ in self.score(query)[:top_k]]
+        selected = list(ranked)
+        for name in ranked:
+            for neighbour in self._neighbours[name]:
+                if len(selected) >= max_tables:
+                    break
+                if neighbour not in selected:
+                    selected.append(neighbour)
+        chosen = set(selected[:max_tables])
+        return [name for name in self.tables if name in chosen]
+
+_indexes: "OrderedDict[int, Tuple[Dict[str, Any], SchemaIndex]]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+def schema_index(schema_info: Dict[str, Any]) -> SchemaIndex:
+    """The index for a schema info payload, built once per payload"""
+    key = id(schema_info)
+    with _indexes_lock:
+        cached = _indexes.get(key)
+        if cached is not None and cached[0] is schema_info:
+            _indexes.move_to_end(key)
+            return cached[1]
+
+    index = SchemaIndex(schema_info)
+    with _indexes_lock:
+        # Holding the payload keeps its id from being reused while it is cached
+        _indexes[key] = (schema_info, index)
+        while len(_indexes) > _MAX_CACHED_INDEXES:
+            _indexes.popitem(last=False)
+    return index
+
+def prune_schema(schema_info: Optional[Dict[str, Any]], prompt: str) -> Optional[Dict[str, Any]]:
+    """Schema info narrowed to the tables relevant to a prompt, so prompt size stays bounded.
+
+    Schemas with at most SCHEMA_PROMPT_MAX_TABLES tables are returned
+    unchanged. Larger ones keep the SCHEMA_PROMPT_TOP_K best BM25 matches
+    plus the tables they reference or are referenced by; `total_tables`
+    records how many there were. With no match at all the first tables
+    are kept so the model still sees the schema's shape.
+    """
+    if not schema_info or len(schema_info.get("tables") or []) <= settings.SCHEMA_PROMPT_MAX_TABLES:
+        return schema_info
+
+    index = schema_index(schema_info)
+    selected = index.select(prompt, settings.SCHEMA_PROMPT_TOP_K, settings.SCHEMA_PROMPT_MAX_TABLES)
+    if not selected:
+        selected = index.tables[:settings.SCHEMA_PROMPT_TOP_K]
+        metrics.increment("schema_prompt_pruning_total", outcome="no_match")
+    else:
+        metrics.increment("schema_prompt_pruning_total", outcome="ranked")
+    metrics.observe("schema_prompt_tables", len(selected))
+
+    return {**schema_info, "tables": selected, "total_tables": len(index.tables)}
@@ -1,9 +1,15 @@
 from typing import Dict, Any, List, Optional
 from datetime import datetime
+import asyncio
 import uuid
 import logging
 from app.services.llm_service import llm_service
 from app.services.database_cloud import CloudDatabaseService
+from app.services.schema_introspection import render_schema
+from app.services.schema_retrieval import prune_schema
+from app.services.schema_cache import schema_cache
+from app.services.result_cache import result_cache
+from app.core.security import connection_fingerprint
 
 logger = logging.getLogger(__name__)
 
@@ -39,7 +45,7 @@ class SchemaService:
         """Create a schema change proposal with LLM-generated migration SQL"""
         try:
             # Get current schema info for context
-            schema_result = CloudDatabaseService.get_schema_info(connection_string)
+            schema_result = await schema_cache.get(connection_string)
             schema_info = schema_result if schema_result["success"] else None
             
             # Generate migration SQL using LLM
@@ -115,7 +121,7 @@ Return a JSON object with exactly these fields:
 }}
 
 AVAILABLE SCHEMA:
-{schema_info if schema_info else "No schema information available"}
+{render_schema(prune_schema(schema_info, natural_language)) if schema_info else "No schema information available"}
 """
         
         user_prompt = f"""Generate a safe database migration for this request:
@@ -302,11 +308,17 @@ Return as valid JSON with the required fields."""
                     }
             
             # Execute DDL using database service
-            result = CloudDatabaseService.execute_ddl_query(
+            result = await asyncio.to_thread(
+                CloudDatabaseService.execute_ddl_query,
                 connection_string,
                 proposal.migration_sql
             )
             
+            # The schema changed: cached schemas and results for this database are outdated
+            if result["success"]:
+                schema_cache.invalidate(connection_string)
+                result_cache.invalidate_fingerprint(connection_fingerprint(connection_string))
+            
             return result
             
         except Exception as e:
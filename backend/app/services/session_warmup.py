@@ -0,0 +1,53 @@
+from typing import Dict, Any, Optional
+import asyncio
+import time
+import logging
+from app.core.engine_registry import engine_registry
+from app.core.metrics import metrics
+from app.core.security import secure_context
+from app.services.schema_cache import schema_cache
+
+logger = logging.getLogger(__name__)
+
+class SessionWarmer:
+    """Background warm-up of a new session's pool so its first query hits a hot connection"""
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._status: Dict[str, str] = {}
+
+    def schedule(self, session_id: str, connection_string: str):
+        """Start warming a session without delaying the response that created it"""
+        self._status[session_id] = 'warming'
+        task = asyncio.create_task(self._warm(session_id, connection_string))
+        self._tasks[session_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(session_id, None))
+
+    async def _warm(self, session_id: str, connection_string: str):
+        started = time.monotonic()
+        try:
+            await engine_registry.warm(connection_string)
+            # Also loads the schema cache so the first preview skips the catalog round trip
+            await schema_cache.get(connection_string)
+            self._status[session_id] = 'ready'
+            metrics.increment("session_warmups_total", outcome="ready")
+            metrics.observe("session_warmup_seconds", time.monotonic() - started)
+        except Exception as e:
+            self._status[session_id] = 'failed'
+            metrics.increment("session_warmups_total", outcome="failed")
+            logger.warning(f"Session warm-up failed: {str(e)}")
+
+    def status(self, session_id: str) -> Optional[str]:
+        """'warming', 'ready' or 'failed' (None for unknown sessions)"""
+        return self._status.get(session_id)
+
+    def cancel_session(self, session_id: str, session: Dict[str, Any] = None):
+        """Stop a pending warm-up (session destroy listener)"""
+        self._status.pop(session_id, None)
+        task = self._tasks.pop(session_id, None)
+        if task is not None:
+            task.cancel()
+
+# Global instance (in-memory only)
+session_warmer = SessionWarmer()
+secure_context.add_destroy_listener(session_warmer.cancel_session)
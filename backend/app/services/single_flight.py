@@ -0,0 +1,57 @@
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+from collections import Counter
+import asyncio
+import logging
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one in-flight execution.
+
+    The first caller (leader) starts the work; callers arriving while it
+    runs (followers) await the same result or exception. Authorization
+    must be checked before calling `do`, since the result is shared.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        # Callers currently awaiting each key's execution
+        self._waiters: Counter = Counter()
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            metrics.increment("single_flight_calls_total", flight=self.name, role="leader")
+        else:
+            metrics.increment("single_flight_calls_total", flight=self.name, role="follower")
+
+        # Shielded so one caller disconnecting doesn't cancel the work for the others
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[key] -= 1
+            if self._waiters[key] <= 0:
+                del self._waiters[key]
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+    def waiters(self, key: Hashable) -> int:
+        """Callers still waiting on the execution for a key"""
+        return self._waiters[key]
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+# Global instances (in-memory only)
+query_flights = SingleFlight("query")
+schema_flights = SingleFlight("schema")
@@ -0,0 +1,240 @@
+from typing import Dict, Any, Collection, List, Optional
+from sqlalchemy.engine import make_url
+import sqlglot
+from sqlglot import exp
+import logging
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# SQLAlchemy backend name -> sqlglot dialect
+_DIALECTS = {'postgresql': 'postgres', 'mysql': 'mysql', 'sqlite': 'sqlite'}
+
+def sql_dialect(connection_string: str) -> Optional[str]:
+    """sqlglot dialect for a connection string (None lets sqlglot use its generic dialect)"""
+    try:
+        return _DIALECTS.get(make_url(connection_string).get_backend_name())
+    except Exception:
+        return None
+
+def _limit_value(node: Optional[exp.Expression]) -> Optional[int]:
+    """Integer row count of a LIMIT / FETCH clause, or None if it isn't a literal"""
+    if node is None:
+        return None
+    count = node.args.get('count') if isinstance(node, exp.Fetch) else node.expression
+    if isinstance(count, exp.Literal) and not count.is_string:
+        try:
+            return int(count.this)
+        except ValueError:
+            return None
+    return None
+
+def _bound_limit(tree: exp.Expression, max_limit: int, changes: List[str]):
+    """Add a LIMIT to the outermost query, or clamp an existing one to max_limit"""
+    current = tree.args.get('limit')
+    value = _limit_value(current)
+    if current is not None and value is not None and value <= max_limit:
+        return
+
+    tree.set('limit', exp.Limit(expression=exp.Literal.number(max_limit)))
+    if current is None:
+        changes.append(f"Added LIMIT {max_limit}")
+    elif value is None:
+        changes.append(f"Replaced non-constant row limit with LIMIT {max_limit}")
+    else:
+        changes.append(f"Reduced LIMIT {value} to {max_limit}")
+
+def _table_key(table: exp.Table) -> str:
+    """Name of a table in the schema model: `schema.table` when the query qualifies it"""
+    return f"{table.db}.{table.name}" if table.db else table.name
+
+def _expand_star(select: exp.Select, schema_columns: Dict[str, List[str]], max_columns: int, changes: List[str]):
+    """Replace `SELECT *` / `SELECT t.*` over known tables with an explicit, bounded column list"""
+    stars = [e for e in select.expressions if isinstance(e, exp.Star) or (isinstance(e, exp.Column) and isinstance(e.this, exp.Star))]
+    if not stars:
+        return
+
+    ctes = {cte.alias_or_name for cte in (select.args.get('with') or exp.With()).expressions}
+    sources = []
+    from_clause = select.args.get('from')
+    for source in ([from_clause.this] if from_clause else []) + [join.this for join in select.args.get('joins') or []]:
+        if not isinstance(source, exp.Table) or source.name in ctes:
+            return  # subqueries, functions and CTEs: column lists unknown
+        key = _table_key(source)
+        columns = schema_columns.get(key) or schema_columns.get(key.lower())
+        if not columns:
+            return
+        sources.append((source.alias_or_name, columns))
+    if not sources:
+        return
+
+    qualify = len(sources) > 1
+    projections = []
+    for projection in select.expressions:
+        if projection not in stars:
+            projections.append(projection)
+            continue
+
+        table_ref = projection.table if isinstance(projection, exp.Column) else None
+        for reference, columns in sources:
+            if table_ref and table_ref != reference:
+                continue
+            kept = columns[:max_columns]
+            if len(columns) > max_columns:
+                changes.append(f"Limited SELECT * on {reference} to the first {max_columns} of {len(columns)} columns")
+            for column in kept:
+                projections.append(exp.column(column, table=reference if qualify or table_ref else None, quoted=True))
+
+    select.set('expressions', projections)
+    changes.append("Expanded SELECT * to an explicit column list")
+
+def rewrite_query(sql: str, dialect: Optional[str] = None, max_limit: Optional[int] = None,
+                  schema_columns: Optional[Dict[str, List[str]]] = None) -> Dict[str, Any]:
+    """Bound a read-only query before it runs.
+
+    The outer query always gets a LIMIT no larger than max_limit, and
+    `SELECT *` is expanded from schema_columns ({table: [column, ...]})
+    when every source table is known. Unchanged queries are returned
+    verbatim; SQL the parser can't handle is wrapped in a limited subquery.
+    """
+    max_limit = max_limit or settings.SQL_REWRITE_MAX_LIMIT
+    changes: List[str] = []
+
+    try:
+        tree = sqlglot.parse_one(sql.strip().rstrip(';'), read=dialect)
+    except sqlglot.errors.ParseError as e:
+        logger.info(f"SQL rewrite falling back to subquery wrap: {str(e)}")
+        return {
+            "sql": f"SELECT * FROM ({sql.strip().rstrip(';')}) AS _dv_limited LIMIT {max_limit}",
+            "changes": [f"Wrapped query to apply LIMIT {max_limit}"]
+        }
+
+    if not isinstance(tree, (exp.Select, exp.Union)):
+        return {"sql": sql, "changes": []}
+
+    if isinstance(tree, exp.Select) and schema_columns:
+        _expand_star(tree, schema_columns, settings.SQL_REWRITE_MAX_STAR_COLUMNS, changes)
+    _bound_limit(tree, max_limit, changes)
+
+    if not changes:
+        return {"sql": sql, "changes": []}
+    return {"sql": tree.sql(dialect=dialect), "changes": changes}
+
+# Per-row sampling predicate for engines without TABLESAMPLE ({fraction} in 0..1)
+_RANDOM_PREDICATES = {
+    'mysql': "RAND() < {fraction}",
+    'sqlite': "ABS(RANDOM()) % 1000000 < {fraction} * 1000000",
+}
+
+def sample_query(sql: str, dialect: Optional[str], percent: float,
+                 views: Optional[Collection[str]] = None) -> Dict[str, Any]:
+    """Rewrite a single-table scan to read a random sample of roughly `percent` of the rows.
+
+    PostgreSQL uses `TABLESAMPLE SYSTEM (p)` (block sampling, so the full
+    table is never read), which it rejects for views: those named in
+    `views` are left unsampled. MySQL and SQLite filter on a random
+    predicate in a subquery capped at SQL_SAMPLE_MAX_ROWS. Returns
+    `{"sql", "sampled", "changes"}`; ineligible queries come back
+    unchanged with the reason.
+    """
+    def skipped(reason: str) -> Dict[str, Any]:
+        return {"sql": sql, "sampled": False, "changes": [f"Sampling skipped: {reason}"]}
+
+    if dialect != 'postgres' and dialect not in _RANDOM_PREDICATES:
+        return skipped("not supported for this database")
+
+    try:
+        tree = sqlglot.parse_one(sql.strip().rstrip(';'), read=dialect)
+    except sqlglot.errors.ParseError:
+        return skipped("query could not be parsed")
+
+    if not isinstance(tree, exp.Select) or tree.args.get('joins'):
+        return skipped("only single-table queries can be sampled")
+    from_clause = tree.args.get('from')
+    table = from_clause.this if from_clause else None
+    ctes = {cte.alias_or_name for cte in (tree.args.get('with') or exp.With()).expressions}
+    if not isinstance(table, exp.Table) or table.name in ctes:
+        return skipped("only single-table queries can be sampled")
+
+    percent_literal = f"{percent:g}"
+    if dialect == 'postgres':
+        name = _table_key(table)
+        if views and (name in views or name.lower() in views):
+            return skipped("views can't be sampled on this database")
+        # sqlglot's Postgres generator drops TABLESAMPLE, so render the sampled table directly
+        table.replace(exp.var(f"{table.sql(dialect=dialect)} TABLESAMPLE SYSTEM ({percent_literal})"))
+        method = "TABLESAMPLE SYSTEM"
+    else:
+        if table.args.get('db'):
+            return skipped("schema-qualified tables can't be sampled on this database")
+        reference = table.alias_or_name
+        source = table.copy()
+        source.set('alias', None)
+        predicate = sqlglot.parse_one(_RANDOM_PREDICATES[dialect].format(fraction=percent / 100), read=dialect)
+        sample = (
+            exp.select("*").from_(source).where(predicate)
+            .limit(settings.SQL_SAMPLE_MAX_ROWS)
+            .subquery(reference)
+        )
+        table.replace(sample)
+        method = f"random sample of at most {settings.SQL_SAMPLE_MAX_ROWS:,} rows"
+
+    return {
+        "sql": tree.sql(dialect=dialect),
+        "sampled": True,
+        "changes": [f"Sampled about {percent_literal}% of {table.name} ({method}); results are approximate"]
+    }
+
+def partition_target(sql: str, dialect: Optional[str]) -> Dict[str, Any]:
+    """Check whether a query can be split into key ranges and find the table to split.
+
+    Eligible queries read one table with no grouping, aggregates, window
+    functions, DISTINCT or LIMIT, so concatenating the per-range results
+    gives the full result. Returns `{"table", "schema", "alias",
+    "order_by"}` (order_by is the single ascending ORDER BY column, if
+    any) or `{"reason"}` when the query must run unsplit.
+    """
+    if dialect not in _DIALECTS.values():
+        return {"reason": "not supported for this database"}
+    try:
+        tree = sqlglot.parse_one(sql.strip().rstrip(';'), read=dialect)
+    except sqlglot.errors.ParseError:
+        return {"reason": "query could not be parsed"}
+
+    if not isinstance(tree, exp.Select) or tree.args.get('joins') or tree.args.get('with'):
+        return {"reason": "only single-table queries can be partitioned"}
+    table = tree.args['from'].this if tree.args.get('from') else None
+    if not isinstance(table, exp.Table):
+        return {"reason": "only single-table queries can be partitioned"}
+    if any(tree.args.get(arg) for arg in ('group', 'having', 'distinct', 'limit', 'offset')) \
+            or tree.find(exp.AggFunc, exp.Window, exp.Subquery):
+        return {"reason": "grouped, limited or nested queries can't be partitioned"}
+
+    order_by = None
+    order = tree.args.get('order')
+    if order:
+        keys = order.expressions
+        if len(keys) != 1 or keys[0].args.get('desc') or not isinstance(keys[0].this, exp.Column):
+            return {"reason": "only queries ordered by a single ascending column can be partitioned"}
+        order_by = keys[0].this.name
+
+    return {"table": table.name, "schema": table.db or None, "alias": table.alias_or_name, "order_by": order_by}
+
+def partition_query(sql: str, dialect: str, target: Dict[str, Any], column: str, cuts: List[str]) -> List[str]:
+    """Split an eligible query into len(cuts) + 1 range queries on `column`.
+
+    `cuts` are ascending SQL literals; the first range is open below and
+    the last open above, so rows outside the sampled bounds are not lost.
+    """
+    tree = sqlglot.parse_one(sql.strip().rstrip(';'), read=dialect)
+    key = exp.column(column, table=target["alias"], quoted=column != 'ctid')
+
+    queries = []
+    for lower, upper in zip([None] + cuts, cuts + [None]):
+        conditions = []
+        if lower is not None:
+            conditions.append(exp.GTE(this=key.copy(), expression=sqlglot.parse_one(lower, read=dialect)))
+        if upper is not None:
+            conditions.append(exp.LT(this=key.copy(), expression=sqlglot.parse_one(upper, read=dialect)))
+        queries.append(tree.copy().where(exp.and_(*conditions)).sql(dialect=dialect) if conditions else sql)
+    return queries
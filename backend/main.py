@@ -2,21 +2,34 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from app.core.config import settings
+from app.middleware.compression import CompressionMiddleware
 from app.api.database import router as database_router
 from app.api.query import router as query_router
+from app.api.query_jobs import router as query_jobs_router
+from app.api.query_export import router as query_export_router
 from app.api.sessions import router as sessions_router
 from app.api.auth import router as auth_router
 from app.api.audit import router as audit_router
 from app.api.schema import router as schema_router
 from app.core.background_tasks import background_tasks
+from app.core.engine_registry import engine_registry
+from app.core.metrics import metrics
+from app.services.query_scheduler import query_scheduler
+from app.services.result_cache import result_cache
+from app.services.running_queries import running_queries
+from app.services.single_flight import query_flights, schema_flights
+from app.services.query_jobs import query_jobs
+from app.services.result_spill import spill_store
+from app.services.schema_cache import schema_cache
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup: Start background tasks
     await background_tasks.start_cleanup_scheduler()
     yield
-    # Shutdown: Stop background tasks
+    # Shutdown: Stop background tasks and close pooled remote connections
     await background_tasks.stop_cleanup_scheduler()
+    engine_registry.dispose_all()
 
 app = FastAPI(
     title="DataVibe API",
@@ -33,10 +46,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Cache", "Age", "Retry-After"],
 )
 
+app.add_middleware(CompressionMiddleware)
+
 app.include_router(auth_router, prefix="/auth", tags=["authentication"])
 app.include_router(database_router, prefix="/database", tags=["database"])
+app.include_router(query_jobs_router, prefix="/query/jobs", tags=["query"])
+app.include_router(query_export_router, prefix="/query/export", tags=["query"])
 app.include_router(query_router, prefix="/query", tags=["query"])
 app.include_router(sessions_router, prefix="/sessions", tags=["sessions"])
 app.include_router(audit_router, prefix="/audit", tags=["audit"])
@@ -69,6 +87,20 @@ async def health_check():
         "environment": settings.ENVIRONMENT
     }
 
+@app.get("/metrics")
+async def get_metrics():
+    return {
+        "metrics": metrics.snapshot(),
+        "scheduler": query_scheduler.stats(),
+        "pools": engine_registry.stats(),
+        "result_cache": result_cache.stats(),
+        "running_queries": running_queries.stats(),
+        "in_flight": {"queries": query_flights.in_flight(), "schemas": schema_flights.in_flight()},
+        "query_jobs": query_jobs.stats(),
+        "result_spill": spill_store.stats(),
+        "schema_cache": schema_cache.stats()
+    }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -58,6 +58,200 @@ def test_sql_safety_validation():
     assert not result["success"]
     assert "prohibited keyword" in result["message"]
 
+@pytest.mark.asyncio
+async def test_async_query_matches_sync_result(tmp_path):
+    """Test that the async execution path returns the same payload as the sync one"""
+    import sqlite3
+    db_path = tmp_path / "sample.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE customers (id INTEGER PRIMARY KEY, name TEXT)")
+        conn.executemany("INSERT INTO customers (name) VALUES (?)", [("Ada",), ("Grace",)])
+
+    connection_string = f"sqlite:///{db_path}"
+    sql = "SELECT id, name FROM customers ORDER BY id"
+
+    sync_result = CloudDatabaseService.execute_read_only_query(connection_string, sql)
+    async_result = await CloudDatabaseService.execute_read_only_query_async(connection_string, sql)
+
+    assert async_result == sync_result
+    assert async_result["data"] == [{"id": 1, "name": "Ada"}, {"id": 2, "name": "Grace"}]
+
+@pytest.mark.parametrize("limits, expected_rows, reason", [
+    ({"max_rows": 10}, 10, "max_rows"),
+    ({"max_rows": 100}, 100, None),  # exactly at the limit is not truncated
+    ({"max_bytes": 2000}, None, "max_bytes"),
+])
+def test_query_stops_fetching_at_result_budget(tmp_path, limits, expected_rows, reason):
+    """Test that row and byte budgets cut the fetch short and are reported"""
+    import sqlite3
+    db_path = tmp_path / "big.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE events (id INTEGER PRIMARY KEY, payload TEXT)")
+        conn.executemany("INSERT INTO events (payload) VALUES (?)", [("x" * 50,)] * 100)
+
+    result = CloudDatabaseService.execute_read_only_query(f"sqlite:///{db_path}", "SELECT * FROM events", **limits)
+
+    assert result["success"]
+    assert result["truncated"] is (reason is not None)
+    if reason:
+        assert result["truncation"] == {"reason": reason, "limit": next(iter(limits.values()))}
+    if expected_rows is not None:
+        assert result["row_count"] == expected_rows
+    else:
+        assert 0 < result["row_count"] < 100
+
+@pytest.mark.asyncio
+async def test_running_query_can_be_cancelled(tmp_path):
+    """Test that cancelling a tracked query interrupts it on the database"""
+    import asyncio
+    import sqlite3
+    import time
+    from app.services.running_queries import running_queries
+    db_path = tmp_path / "slow.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE n (x INTEGER)")
+        conn.executemany("INSERT INTO n VALUES (?)", [(i,) for i in range(300)])
+
+    slow_sql = "SELECT count(*) FROM n a, n b, n c, n d"
+    with running_queries.track("q-slow", "user-1"):
+        task = asyncio.create_task(CloudDatabaseService.execute_read_only_query_async(
+            f"sqlite:///{db_path}", slow_sql, query_id="q-slow"
+        ))
+        await asyncio.sleep(0.3)
+
+        assert not running_queries.cancel("q-slow", "someone-else")
+        started = time.monotonic()
+        assert await asyncio.to_thread(running_queries.cancel, "q-slow", "user-1")
+        result = await task
+
+    assert not result["success"]
+    assert "interrupted" in result["message"]
+    assert time.monotonic() - started < 2
+    assert running_queries.stats()["running"] == 0
+
+def test_query_cancelled_before_start_never_runs():
+    """Test that a query cancelled while queued fails without executing"""
+    from app.services.running_queries import running_queries
+    with running_queries.track("q-queued", "user-1"):
+        assert running_queries.cancel("q-queued", "user-1")
+        result = CloudDatabaseService.execute_read_only_query("sqlite://", "SELECT 1", query_id="q-queued")
+
+    assert not result["success"]
+    assert "cancelled" in result["message"]
+
+def test_cancelling_a_query_cancels_its_partitions():
+    """Test that partitions tracked under a parent are cancelled with it"""
+    from app.services.running_queries import running_queries, QueryCancelledError
+    cancelled = []
+    with running_queries.track("q-export", "user-1"):
+        with running_queries.track("q-export:0", "user-1", parent_id="q-export"):
+            running_queries.attach("q-export:0", lambda: cancelled.append(0))
+            assert running_queries.cancel("q-export", "user-1")
+            assert running_queries.is_cancelled("q-export:0")
+        # A partition starting after the cancel never runs
+        with running_queries.track("q-export:1", "user-1", parent_id="q-export"):
+            with pytest.raises(QueryCancelledError):
+                running_queries.attach("q-export:1", lambda: None)
+
+    assert cancelled == [0]
+
+@pytest.mark.asyncio
+async def test_abandoned_thread_stream_frees_its_executor_thread():
+    """Test that cancelling a consumer of the sync streaming fallback doesn't strand a worker thread"""
+    import asyncio
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from app.services.database_cloud import _iterate_in_thread
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=1))
+
+    def slow_rows():
+        time.sleep(0.2)
+        yield 1
+
+    rows = _iterate_in_thread(slow_rows)
+    waiting = asyncio.create_task(rows.__anext__())
+    await asyncio.sleep(0.05)
+    waiting.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiting
+    await asyncio.sleep(0.3)
+
+    # The only executor thread must be free again once the producer has given up
+    assert await asyncio.wait_for(loop.run_in_executor(None, lambda: "free"), timeout=1) == "free"
+
+SUPABASE_URL = "postgresql://postgres:pw@db.abcdefgh.supabase.co:5432/postgres"
+
+def _fake_probes(monkeypatch, direct_delay, direct_ok, rest_delay, rest_ok, forget=True):
+    """Replace both Supabase probes with timed fakes and record which ones ran"""
+    import asyncio
+    import time
+    from app.services import database_cloud
+    from app.services.supabase_rest_service import SupabaseRestService
+    calls = []
+
+    async def direct(connection_string, connect_timeout):
+        calls.append("direct")
+        await asyncio.sleep(direct_delay)
+        if not direct_ok:
+            raise ConnectionError("network unreachable")
+        return True
+
+    def rest(connection_string):
+        calls.append("rest")
+        time.sleep(rest_delay)
+        return {"success": rest_ok, "message": "rest ok" if rest_ok else "rest down", "connection_method": "REST"}
+
+    monkeypatch.setattr(CloudDatabaseService, "_probe_async", direct)
+    monkeypatch.setattr(SupabaseRestService, "test_connection", rest)
+    if forget:
+        database_cloud.connect_method_memory.forget("db.abcdefgh.supabase.co")
+    return calls
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("direct_delay, direct_ok, rest_delay, rest_ok, expected", [
+    (0.05, True, 0.01, True, "Direct PostgreSQL"),  # direct within the grace window is preferred
+    (2.0, True, 0.01, True, "REST"),                # slow direct path loses to REST
+    (0.01, False, 0.1, True, "REST"),               # direct failure falls through to REST
+    (0.1, True, 0.01, False, "Direct PostgreSQL"),  # REST failure waits for direct
+])
+async def test_supabase_connect_races_direct_and_rest(monkeypatch, direct_delay, direct_ok, rest_delay, rest_ok, expected):
+    """Test that both paths are probed concurrently and the right winner is chosen"""
+    import time
+    _fake_probes(monkeypatch, direct_delay, direct_ok, rest_delay, rest_ok)
+
+    started = time.monotonic()
+    result = await CloudDatabaseService.test_connection_async(SUPABASE_URL)
+
+    assert result["success"]
+    assert result["connection_method"] == expected
+    assert time.monotonic() - started < 1.0
+
+@pytest.mark.asyncio
+async def test_supabase_connect_remembers_winning_method(monkeypatch):
+    """Test that later connections to the same host skip the losing path"""
+    from app.services import database_cloud
+    _fake_probes(monkeypatch, 2.0, True, 0.01, True)
+    await CloudDatabaseService.test_connection_async(SUPABASE_URL)
+    assert database_cloud.connect_method_memory.get("db.abcdefgh.supabase.co") == "rest"
+
+    calls = _fake_probes(monkeypatch, 2.0, True, 0.01, True, forget=False)
+    result = await CloudDatabaseService.test_connection_async(SUPABASE_URL)
+
+    assert result["connection_method"] == "REST"
+    assert calls == ["rest"]
+
+@pytest.mark.asyncio
+async def test_supabase_connect_reports_both_failures(monkeypatch):
+    """Test the combined error when neither path works"""
+    _fake_probes(monkeypatch, 0.01, False, 0.02, False)
+
+    result = await CloudDatabaseService.test_connection_async(SUPABASE_URL)
+
+    assert not result["success"]
+    assert result["postgresql_error"] == "network unreachable"
+    assert result["rest_api_error"] == "rest down"
+
 def test_no_local_persistence():
     """Test that no data is persisted locally"""
     
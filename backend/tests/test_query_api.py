@@ -0,0 +1,640 @@
+import pytest
+import json
+import sqlite3
+from fastapi.testclient import TestClient
+from main import app
+from app.api import query as query_api
+from app.services.pagination import plan_keyset
+from app.core.security import secure_context
+from app.middleware.auth import get_current_user
+
+TEST_USER = {"user_id": "user-1", "email": "user@example.com", "role": "authenticated"}
+
+@pytest.fixture
+def client():
+    app.dependency_overrides[get_current_user] = lambda: TEST_USER
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+@pytest.fixture
+def session_id(tmp_path):
+    """Session bound to a small sqlite database standing in for a remote one"""
+    db_path = tmp_path / "remote.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE orders (id INTEGER PRIMARY KEY, total REAL, region TEXT)")
+        conn.executemany(
+            "INSERT INTO orders (total, region) VALUES (?, ?)",
+            [(i * 1.5, "eu" if i % 2 else "us") for i in range(1, 251)]
+        )
+
+    sid = secure_context.create_session(TEST_USER["user_id"], {"connection_string": f"sqlite:///{db_path}"})
+    yield sid
+    secure_context.destroy_session(sid)
+
+def _preview(session_id: str, sql: str) -> str:
+    """Register a previewed query the way /query/preview does"""
+    query_id = f"q-{len(query_api._query_cache)}-{abs(hash(sql))}"
+    query_api._query_cache[query_id] = {
+        "sql": sql,
+        "prompt": "test prompt",
+        "session_id": session_id,
+        "user_id": TEST_USER["user_id"]
+    }
+    return query_id
+
+def test_execute_streams_ndjson(client, session_id):
+    """Test that stream mode returns meta, one line per row and a trailer"""
+    sql = "SELECT id, total FROM orders ORDER BY id"
+    query_id = _preview(session_id, sql)
+
+    response = client.post("/query/execute", json={
+        "query_id": query_id, "sql_query": sql, "confirm_execution": True, "stream": True
+    })
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[0] == {"type": "meta", "query_id": query_id, "columns": ["id", "total"]}
+    assert lines[1] == [1, 1.5]
+    assert len(lines) == 252
+    assert lines[-1] == {"type": "end", "row_count": 250}
+
+def test_stream_rejects_other_users_query(client, session_id):
+    """Test that a query id cannot be executed by another user"""
+    sql = "SELECT id FROM orders"
+    query_id = _preview(session_id, sql)
+    query_api._query_cache[query_id]["user_id"] = "someone-else"
+
+    response = client.post("/query/execute", json={
+        "query_id": query_id, "sql_query": sql, "confirm_execution": True, "stream": True
+    })
+
+    assert response.status_code == 403
+
+def test_repeated_execution_is_served_from_cache(client, session_id):
+    """Test X-Cache headers for a miss, a hit and an explicit bypass"""
+    sql = "SELECT id, total FROM orders WHERE id < 5 ORDER BY id"
+
+    def execute(**extra):
+        return client.post("/query/execute", json=dict(
+            query_id=_preview(session_id, sql), sql_query=sql, confirm_execution=True, **extra
+        ))
+
+    first, second, bypass = execute(), execute(), execute(bypass_cache=True)
+
+    assert first.headers["X-Cache"] == "MISS"
+    assert second.headers["X-Cache"] == "HIT"
+    assert "Age" in second.headers
+    assert bypass.headers["X-Cache"] == "BYPASS"
+    assert first.json()["data"] == second.json()["data"] == bypass.json()["data"]
+
+@pytest.mark.parametrize("page_size", [None, 3])
+def test_execute_returns_columnar_json(client, session_id, page_size):
+    """Test the columnar wire format for plain and paginated execution"""
+    sql = "SELECT id, region FROM orders WHERE id <= 5 ORDER BY id"
+    response = client.post("/query/execute", json={
+        "query_id": _preview(session_id, sql), "sql_query": sql, "confirm_execution": True,
+        "format": "columnar", "page_size": page_size
+    })
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["columns"] == ["id", "region"]
+    assert body["data"][0] == [1, 2, 3, 4, 5][:page_size]
+    assert body["row_count"] == (page_size or 5)
+    assert body["has_more"] == bool(page_size)
+
+    if page_size:
+        rest = client.post("/query/page", json={"continuation_token": body["next_token"], "format": "columnar"}).json()
+        assert rest["data"][0] == [4, 5]
+
+def test_execute_returns_arrow_stream(client, session_id):
+    """Test the Arrow IPC wire format"""
+    pa = pytest.importorskip("pyarrow")
+    sql = "SELECT id, total FROM orders WHERE id <= 3 ORDER BY id"
+    response = client.post("/query/execute", json={
+        "query_id": _preview(session_id, sql), "sql_query": sql, "confirm_execution": True, "format": "arrow"
+    })
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.apache.arrow.stream"
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.to_pydict() == {"id": [1, 2, 3], "total": [1.5, 3.0, 4.5]}
+    assert json.loads(table.schema.metadata[b"row_count"]) == 3
+
+def test_execute_reports_truncation(client, session_id, monkeypatch):
+    """Test that /query/execute stops at the row budget and says so"""
+    from app.core.config import settings
+    monkeypatch.setattr(settings, "MAX_RESULT_ROWS", 25)
+    sql = "SELECT id FROM orders"
+
+    body = client.post("/query/execute", json={
+        "query_id": _preview(session_id, sql), "sql_query": sql, "confirm_execution": True
+    }).json()
+
+    assert body["row_count"] == 25
+    assert body["truncated"] is True
+    assert body["truncation"] == {"reason": "max_rows", "limit": 25}
+    assert body["rewrites"] == [f"Added LIMIT {settings.SQL_REWRITE_MAX_LIMIT}"]
+
+def test_execute_sampled_quick_look(client, session_id):
+    """Test that a sampled run is marked approximate and the full query can still run afterwards"""
+    sql = "SELECT region, count(*) AS n FROM orders GROUP BY region"
+    query_id = _preview(session_id, sql)
+
+    sampled = client.post("/query/execute", json={
+        "query_id": query_id, "sql_query": sql, "confirm_execution": True, "sample_percent": 20
+    }).json()
+    assert sampled["approximate"] is True
+    assert sampled["sample_percent"] == 20
+    assert sum(row["n"] for row in sampled["data"]) < 250
+    assert any(change.startswith("Sampled about 20% of orders") for change in sampled["rewrites"])
+
+    full = client.post("/query/execute", json={
+        "query_id": query_id, "sql_query": sql, "confirm_execution": True
+    }).json()
+    assert full["approximate"] is False
+    assert sum(row["n"] for row in full["data"]) == 250
+
+def test_execute_refuses_queries_over_cost_limit(client, session_id, monkeypatch):
+    """Test that the optional cost threshold blocks execution"""
+    from app.core.config import settings
+    from app.services.database_cloud import CloudDatabaseService
+
+    async def expensive(connection_string, sql_query):
+        return {"success": True, "estimated_rows": 10 ** 7, "estimated_cost": 5e6, "full_scans": [], "warnings": []}
+
+    monkeypatch.setattr(settings, "QUERY_MAX_ESTIMATED_COST", 1e6)
+    monkeypatch.setattr(CloudDatabaseService, "explain_query_async", expensive)
+    sql = "SELECT id FROM orders"
+
+    response = client.post("/query/execute", json={
+        "query_id": _preview(session_id, sql), "sql_query": sql, "confirm_execution": True
+    })
+
+    assert response.status_code == 400
+    assert "exceeds the limit" in response.json()["detail"]
+
+def test_batch_runs_queries_and_reports_errors_in_place(client, session_id):
+    """Test that one batch returns every widget's result, with failures per query"""
+    queries = [
+        ("SELECT count(*) AS n FROM orders", [{"n": 250}]),
+        ("SELECT region, count(*) AS n FROM orders GROUP BY region ORDER BY region", [{"region": "eu", "n": 125}, {"region": "us", "n": 125}]),
+        ("SELECT missing_column FROM orders", None),
+    ]
+    items = [{"query_id": _preview(session_id, sql), "sql_query": sql} for sql, _ in queries]
+
+    response = client.post("/query/batch", json={"queries": items, "confirm_execution": True})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["success"] is False
+    assert [r["query_id"] for r in body["results"]] == [item["query_id"] for item in items]
+    for result, (_, expected) in zip(body["results"], queries):
+        if expected is None:
+            assert result["success"] is False
+            assert result["status_code"] == 400
+            assert "missing_column" in result["error"]
+        else:
+            assert result["success"] is True
+            assert result["data"] == expected
+            assert result["cache"] == "MISS"
+
+def test_batch_requires_owned_queries_of_one_session(client, session_id):
+    """Test that a batch is refused as a whole for foreign queries or mixed sessions"""
+    sql = "SELECT id FROM orders"
+    own = _preview(session_id, sql)
+    foreign = _preview(session_id, sql + " ")
+    query_api._query_cache[foreign]["user_id"] = "someone-else"
+    response = client.post("/query/batch", json={"queries": [
+        {"query_id": own, "sql_query": sql}, {"query_id": foreign, "sql_query": sql}
+    ], "confirm_execution": True})
+    assert response.status_code == 403
+
+    other_session = secure_context.create_session(TEST_USER["user_id"], {"connection_string": "sqlite://"})
+    elsewhere = _preview(other_session, sql + "  ")
+    response = client.post("/query/batch", json={"queries": [
+        {"query_id": own, "sql_query": sql}, {"query_id": elsewhere, "sql_query": sql}
+    ], "confirm_execution": True})
+    secure_context.destroy_session(other_session)
+    assert response.status_code == 400
+
+def test_export_streams_csv_without_row_cap(client, session_id):
+    """Test that CSV exports return every row with a header and an attachment name"""
+    sql = "SELECT id, total, region FROM orders ORDER BY id"
+    query_id = _preview(session_id, sql)
+
+    response = client.post("/query/export", json={"query_id": query_id, "sql_query": sql, "confirm_execution": True})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.headers["content-disposition"] == f'attachment; filename="{query_id}.csv"'
+    lines = response.text.splitlines()
+    assert lines[0] == "id,total,region"
+    assert lines[1] == "1,1.5,eu"
+    assert len(lines) == 251
+    assert query_id not in query_api._query_cache
+
+def test_csv_encoding_matches_postgres_copy():
+    """Test that bytea, boolean and date/time cells are written the way COPY CSV writes them"""
+    import asyncio
+    from datetime import date, datetime, time, timedelta, timezone
+    from app.services.export import csv_chunks
+
+    async def batches():
+        yield ["b", "flag", "at", "local", "day", "clock"], [
+            (b"\x01\x02", True, datetime(2024, 5, 1, 8, tzinfo=timezone.utc), datetime(2024, 5, 1, 8, 0, 0, 250000),
+             date(2024, 5, 1), time(9, 30)),
+            (b"", False, datetime(2024, 5, 1, 8, 0, 0, 5, tzinfo=timezone(timedelta(hours=5, minutes=30))),
+             None, None, time(9, 30, 1, 120000, tzinfo=timezone(-timedelta(hours=3))))
+        ]
+
+    async def collect():
+        return b"".join([chunk async for chunk in csv_chunks(batches())]).decode()
+
+    assert asyncio.run(collect()).splitlines() == [
+        "b,flag,at,local,day,clock",
+        "\\x0102,t,2024-05-01 08:00:00+00,2024-05-01 08:00:00.25,2024-05-01,09:30:00",
+        "\\x,f,2024-05-01 08:00:00.000005+05:30,,,09:30:01.12-03",
+    ]
+
+def test_export_writes_parquet_in_row_groups(client, session_id, monkeypatch):
+    """Test that Parquet exports are split into row groups as rows arrive"""
+    import io
+    import pyarrow.parquet as pq
+    from app.core.config import settings
+    monkeypatch.setattr(settings, "EXPORT_PARQUET_ROW_GROUP_ROWS", 100)
+    sql = "SELECT id, total, region, NULL AS note FROM orders ORDER BY id"
+    query_id = _preview(session_id, sql)
+
+    response = client.post("/query/export", json={
+        "query_id": query_id, "sql_query": sql, "confirm_execution": True, "format": "parquet"
+    })
+
+    assert response.status_code == 200
+    parquet = pq.ParquetFile(io.BytesIO(response.content))
+    assert parquet.metadata.num_row_groups == 3
+    table = parquet.read()
+    assert table.num_rows == 250
+    assert str(table.schema.field("note").type) == "string"
+    assert table.column("id").to_pylist()[-1] == 250
+
+def test_export_reports_query_errors_before_streaming(client, session_id):
+    """Test that a failing export query is a 400, not a broken download"""
+    sql = "SELECT missing_column FROM orders"
+    query_id = _preview(session_id, sql)
+
+    response = client.post("/query/export", json={"query_id": query_id, "sql_query": sql, "confirm_execution": True})
+
+    assert response.status_code == 400
+    assert "Export failed" in response.json()["detail"]
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_parallel_export_splits_on_primary_key(client, session_id, ordered):
+    """Test that a partitioned export returns the same rows, in key order when ordered"""
+    sql = "SELECT id, region FROM orders WHERE total > 3"
+    query_id = _preview(session_id, sql)
+
+    response = client.post("/query/export", json={
+        "query_id": query_id, "sql_query": sql, "confirm_execution": True, "parallelism": 3, "ordered": ordered
+    })
+
+    assert response.status_code == 200
+    # Capped at the per-session concurrency limit
+    assert response.headers["x-export-partitions"] == "2"
+    lines = response.text.splitlines()
+    assert lines[0] == "id,region"
+    ids = [int(line.split(",")[0]) for line in lines[1:]]
+    assert sorted(ids) == list(range(3, 251))
+    if ordered:
+        assert ids == sorted(ids)
+
+def _fake_ranges(monkeypatch, scheduler, ranges):
+    """Serve each range query from `ranges` ({sql: async generator function}) on a private scheduler"""
+    from app.services import export
+    monkeypatch.setattr(export, "query_scheduler", scheduler)
+    monkeypatch.setattr(export.CloudDatabaseService, "stream_read_only_query_async",
+                        staticmethod(lambda connection_string, sql, **kwargs: ranges[sql]()))
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_partitioned_export_outlasts_queue_timeout_with_more_ranges_than_slots(monkeypatch, ordered):
+    """Test that ranges beyond the per-session cap wait for a slot instead of failing mid-export"""
+    import asyncio
+    from app.services.export import partitioned_batches
+    from app.services.query_scheduler import QueryScheduler
+    scheduler = QueryScheduler(max_per_session=2, queue_timeout=0.05)
+
+    def rows(start):
+        async def stream():
+            for batch in range(3):
+                await asyncio.sleep(0.03)
+                yield ["id"], [(start + batch,)]
+        return stream
+
+    _fake_ranges(monkeypatch, scheduler, {f"r{i}": rows(i * 10) for i in range(4)})
+
+    async def run():
+        batches = partitioned_batches("sqlite://", [f"r{i}" for i in range(4)], ordered, "q-export", "user-1", "s-1")
+        return [row[0] async for _, rows in batches for row in rows]
+
+    ids = asyncio.run(run())
+    expected = [i * 10 + b for i in range(4) for b in range(3)]
+    assert ids == expected if ordered else sorted(ids) == expected
+    assert scheduler.stats()["running"] == 0
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_partitioned_csv_matches_single_stream_export(monkeypatch, ordered):
+    """Test that splitting a CSV export doesn't change bytea, boolean or timestamptz cells, or the header"""
+    import asyncio
+    from datetime import datetime, timedelta, timezone
+    from app.services import export
+    from app.services.query_scheduler import QueryScheduler
+    columns = ["id", "payload", "flag", 'at\n"utc"']
+    rows = [(i, bytes([i, 255]), i % 2 == 0, datetime(2024, 5, 1, i, tzinfo=timezone(timedelta(hours=i % 3))))
+            for i in range(6)]
+    ranges = {"all": rows, "r0": rows[:2], "r1": rows[2:3], "r2": [], "r3": rows[3:]}
+
+    def cursor(sql):
+        async def stream():
+            for row in ranges[sql]:
+                await asyncio.sleep(0.01)
+                yield columns, [row]
+            if not ranges[sql]:
+                yield columns, []
+        return stream
+
+    def copy(connection_string, sql, *args):
+        # COPY's wire format: the header and each row arrive as whole lines
+        async def stream():
+            yield b'id,payload,flag,"at\n""utc"""\n'
+            for row in ranges[sql]:
+                await asyncio.sleep(0.01)
+                yield "{},{},{},{}\n".format(*(export._csv_value(v) for v in row)).encode()
+        return stream()
+
+    async def run():
+        single = b"".join([chunk async for chunk in export.export_csv("postgresql://db/app", "all")])
+        split = export.export_partitioned("csv", "postgresql://db/app", ["r0", "r1", "r2", "r3"], ordered,
+                                          "q-export", "user-1", "s-1")
+        return single, b"".join([chunk async for chunk in split])
+
+    _fake_ranges(monkeypatch, QueryScheduler(max_per_session=4), {sql: cursor(sql) for sql in ranges})
+    for can_copy in (False, True):
+        monkeypatch.setattr(export.CloudDatabaseService, "can_copy_csv", staticmethod(lambda connection_string: can_copy))
+        monkeypatch.setattr(export.CloudDatabaseService, "copy_csv_async",
+                            staticmethod(lambda *args: copy(*args) if can_copy else None))
+        single, split = asyncio.run(run())
+        assert single.startswith(b'id,payload,flag,"at\n""utc"""\n0,\\x00ff,t,2024-05-01 00:00:00+00\n')
+        assert split == single if ordered else sorted(split.split(b"\n")) == sorted(single.split(b"\n"))
+        assert split.startswith(b'id,payload,flag,"at\n""utc"""\n')
+
+def test_partitioned_export_shutdown_stops_producers_that_missed_the_cancel(monkeypatch):
+    """Test that a failed export returns and frees every slot even if a producer swallowed its cancel"""
+    import asyncio
+    from app.services.export import partitioned_batches
+    from app.services.query_scheduler import QueryScheduler
+    scheduler = QueryScheduler(max_per_session=3)
+
+    async def first():
+        for i in range(5):
+            yield ["id"], [(i,)]
+
+    async def failing():
+        raise RuntimeError("range failed")
+        yield
+
+    async def stubborn():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            pass  # e.g. a cancel lost inside a driver or wait_for
+        for i in range(5):
+            yield ["id"], [(i,)]
+
+    _fake_ranges(monkeypatch, scheduler, {"r0": first, "r1": failing, "r2": stubborn})
+
+    async def run():
+        batches = partitioned_batches("sqlite://", ["r0", "r1", "r2"], True, "q-export", "user-1", "s-1")
+        with pytest.raises(RuntimeError, match="range failed"):
+            async for _ in batches:
+                pass
+        await batches.aclose()
+
+    asyncio.run(asyncio.wait_for(run(), timeout=2))
+    assert scheduler.stats()["running"] == 0
+
+def test_parallel_export_runs_unsplittable_queries_on_one_connection(client, session_id):
+    """Test that grouped queries fall back to a single cursor"""
+    sql = "SELECT region, COUNT(*) AS n FROM orders GROUP BY region ORDER BY region"
+    query_id = _preview(session_id, sql)
+
+    response = client.post("/query/export", json={
+        "query_id": query_id, "sql_query": sql, "confirm_execution": True, "parallelism": 4
+    })
+
+    assert response.status_code == 200
+    assert response.headers["x-export-partitions"] == "1"
+    assert response.text.splitlines() == ["region,n", "eu,125", "us,125"]
+
+def test_stream_released_when_client_disconnects_before_body(session_id):
+    """Test that the scheduler slot and running query entry are freed if the body never runs"""
+    import asyncio
+    from app.services.query_scheduler import query_scheduler
+    from app.services.running_queries import running_queries
+
+    async def run():
+        response = await query_api._stream_query_results(
+            "q-gone", "SELECT * FROM orders", secure_context.get_connection_string(session_id, TEST_USER["user_id"]),
+            TEST_USER["user_id"], session_id, 1.0, 30.0
+        )
+        assert query_scheduler.stats()["running"] == 1
+
+        async def receive():
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            await asyncio.sleep(1)
+
+        await response({"type": "http"}, receive, send)
+
+    asyncio.run(run())
+    assert query_scheduler.stats()["running"] == 0
+    assert running_queries.stats()["running"] == 0
+
+def test_export_released_when_client_disconnects_before_body(session_id):
+    """Test that an export's scheduler slot is freed if the body never runs"""
+    import asyncio
+    from app.api.query_export import export_query, QueryExportRequest
+    from app.services.query_scheduler import query_scheduler
+    from app.services.running_queries import running_queries
+    sql = "SELECT id, total FROM orders"
+    query_id = _preview(session_id, sql)
+
+    async def run():
+        response = await export_query(
+            QueryExportRequest(query_id=query_id, sql_query=sql, confirm_execution=True, format="csv"),
+            current_user=TEST_USER
+        )
+        assert query_scheduler.stats()["running"] == 1
+
+        async def receive():
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            await asyncio.sleep(1)
+
+        await response({"type": "http"}, receive, send)
+
+    asyncio.run(run())
+    assert query_scheduler.stats()["running"] == 0
+    assert running_queries.stats()["running"] == 0
+
+def test_cancel_unknown_query_returns_404(client):
+    """Test that only running queries can be cancelled"""
+    assert client.delete("/query/not-running").status_code == 404
+
+def test_plan_keyset_detects_trailing_order_by():
+    """Test ORDER BY / LIMIT detection used for keyset pagination"""
+    plan = plan_keyset("SELECT o.id, o.total FROM orders o WHERE note = 'x ORDER BY y' ORDER BY o.total DESC, o.id LIMIT 50;")
+    assert plan.base_sql == "SELECT o.id, o.total FROM orders o WHERE note = 'x ORDER BY y'"
+    assert plan.order_keys == [("total", True), ("id", False)]
+    assert plan.limit == 50
+
+    # Expressions, offsets and nested ORDER BYs are not usable
+    assert plan_keyset("SELECT id FROM orders ORDER BY lower(region)") is None
+    assert plan_keyset("SELECT id FROM orders ORDER BY id LIMIT 10 OFFSET 5") is None
+    assert plan_keyset("SELECT * FROM (SELECT id FROM orders ORDER BY id) t") is None
+
+def _collect_pages(client, first_response):
+    body = first_response.json()
+    ids = [row["id"] for row in body["data"]]
+    while body["has_more"]:
+        response = client.post("/query/page", json={"continuation_token": body["next_token"]})
+        assert response.status_code == 200
+        body = response.json()
+        ids.extend(row["id"] for row in body["data"])
+    return ids
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT id, total FROM orders ORDER BY id", list(range(1, 251))),
+    ("SELECT id, total FROM orders ORDER BY total DESC LIMIT 120", list(range(250, 130, -1))),
+    ("SELECT id, region FROM orders ORDER BY region, id", [i for i in range(1, 251) if i % 2] + [i for i in range(1, 251) if not i % 2]),
+    ("SELECT id, region FROM orders ORDER BY region", None),  # ties at page boundaries
+    ("SELECT id FROM orders WHERE id <= 150", list(range(1, 151))),  # no ORDER BY
+])
+def test_execute_paginates_with_continuation_tokens(client, session_id, sql, expected):
+    """Test that pages concatenate to the full result for keyset and cached strategies"""
+    query_id = _preview(session_id, sql)
+
+    response = client.post("/query/execute", json={
+        "query_id": query_id, "sql_query": sql, "confirm_execution": True, "page_size": 40
+    })
+
+    assert response.status_code == 200
+    assert len(response.json()["data"]) == 40
+    ids = _collect_pages(client, response)
+    if expected is None:
+        assert sorted(ids) == list(range(1, 251))
+    else:
+        assert ids == expected
+
+@pytest.mark.parametrize("order", ["score DESC, id", "score, id DESC", "score DESC"])
+def test_keyset_pagination_keeps_null_sort_keys(client, session_id, order):
+    """Test that rows whose sort key is NULL are not dropped when they sort after a page boundary"""
+    connection_string = secure_context.get_connection_string(session_id, TEST_USER["user_id"])
+    with sqlite3.connect(connection_string[len("sqlite:///"):]) as conn:
+        conn.execute("CREATE TABLE scores (id INTEGER PRIMARY KEY, score INTEGER)")
+        conn.executemany("INSERT INTO scores (score) VALUES (?)", [(None if i % 3 == 0 else i,) for i in range(1, 11)])
+        sql = f"SELECT id, score FROM scores ORDER BY {order}"
+        expected = [row[0] for row in conn.execute(sql)]
+
+    response = client.post("/query/execute", json={
+        "query_id": _preview(session_id, sql), "sql_query": sql, "confirm_execution": True, "page_size": 3
+    })
+
+    assert response.status_code == 200
+    ids = _collect_pages(client, response)
+    if order == "score DESC":
+        # NULL ties have no defined order among themselves
+        assert sorted(ids) == sorted(expected) and ids[:7] == expected[:7]
+    else:
+        assert ids == expected
+
+def test_large_paginated_result_spills_to_disk(client, session_id, monkeypatch):
+    """Test that cached pagination serves a spilled result and deletes the file after the last page"""
+    from app.core.config import settings
+    from app.services.result_spill import spill_store
+    monkeypatch.setattr(settings, "RESULT_SPILL_THRESHOLD_BYTES", 2_000)
+    sql = "SELECT id, region FROM orders WHERE id <= 200"
+
+    response = client.post("/query/execute", json={
+        "query_id": _preview(session_id, sql), "sql_query": sql, "confirm_execution": True, "page_size": 64
+    })
+    assert spill_store.stats()["files"] == 1
+
+    assert _collect_pages(client, response) == list(range(1, 201))
+    assert spill_store.stats()["files"] == 0
+
+def test_continuation_token_is_single_use_and_user_bound(client, session_id):
+    """Test that tokens can't be replayed or used by someone else"""
+    sql = "SELECT id FROM orders ORDER BY id"
+    query_id = _preview(session_id, sql)
+    first = client.post("/query/execute", json={
+        "query_id": query_id, "sql_query": sql, "confirm_execution": True, "page_size": 10
+    }).json()
+
+    app.dependency_overrides[get_current_user] = lambda: dict(TEST_USER, user_id="intruder")
+    assert client.post("/query/page", json={"continuation_token": first["next_token"]}).status_code == 404
+
+    app.dependency_overrides[get_current_user] = lambda: TEST_USER
+    assert client.post("/query/page", json={"continuation_token": first["next_token"]}).status_code == 200
+    assert client.post("/query/page", json={"continuation_token": first["next_token"]}).status_code == 404
+
+if __name__ == "__main__":
+    pytest.main([__file__])
+
+def test_cancelled_leader_does_not_interrupt_coalesced_followers(monkeypatch):
+    """Test that a leader's cancel withdraws only the leader while another user still waits"""
+    import asyncio
+    from fastapi import HTTPException
+    from app.services.running_queries import running_queries
+    from app.services.database_cloud import CloudDatabaseService
+    interrupted = []
+
+    async def run():
+        release = asyncio.Event()
+
+        async def slow_query(connection_string, sql_query, columnar=False, query_id=None, statement_timeout=None):
+            running_queries.attach(query_id, lambda: interrupted.append(query_id))
+            await release.wait()
+            return {"success": True, "row_count": 1}
+
+        monkeypatch.setattr(CloudDatabaseService, "execute_read_only_query_async", slow_query)
+        args = ("sqlite:///shared.db", "SELECT count(*) FROM orders")
+        leader = asyncio.create_task(query_api._execute_shared(*args, "q-leader", "user-1", "s-1", None))
+        await asyncio.sleep(0.05)
+        follower = asyncio.create_task(query_api._execute_shared(*args, "q-follower", "user-2", "s-2", None))
+        await asyncio.sleep(0.05)
+
+        assert await asyncio.to_thread(running_queries.cancel, "q-leader", "user-1")
+        with pytest.raises(HTTPException) as leader_error:
+            await asyncio.wait_for(leader, 1)
+        assert leader_error.value.status_code == 409
+        assert interrupted == []
+
+        release.set()
+        assert (await asyncio.wait_for(follower, 1))["row_count"] == 1
+
+        # The last caller to withdraw does interrupt the statement, and hears back right away
+        release.clear()
+        alone = asyncio.create_task(query_api._execute_shared(*args, "q-alone", "user-2", "s-2", None))
+        await asyncio.sleep(0.05)
+        assert await asyncio.to_thread(running_queries.cancel, "q-alone", "user-2")
+        with pytest.raises(HTTPException) as alone_error:
+            await asyncio.wait_for(alone, 1)
+        assert alone_error.value.status_code == 409
+        assert interrupted == ["q-alone:shared"]
+        release.set()
+
+    asyncio.run(run())
+    assert running_queries.stats()["running"] == 0
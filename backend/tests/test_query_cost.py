@@ -0,0 +1,56 @@
+import pytest
+from app.core.config import settings
+from app.services.query_cost import postgres_seq_scan_relations, summarize_postgres_plan, summarize_mysql_plan
+
+POSTGRES_PLAN = [{
+    "Plan": {
+        "Node Type": "Hash Join", "Total Cost": 48210.5, "Plan Rows": 1200,
+        "Plans": [
+            {"Node Type": "Seq Scan", "Relation Name": "orders", "Total Cost": 41000.0, "Plan Rows": 1200},
+            {"Node Type": "Hash", "Plans": [
+                {"Node Type": "Index Scan", "Relation Name": "customers", "Plan Rows": 1}
+            ]}
+        ]
+    }
+}]
+
+MYSQL_PLAN = {
+    "query_block": {
+        "select_id": 1,
+        "cost_info": {"query_cost": "250713.40"},
+        "nested_loop": [
+            {"table": {"table_name": "orders", "access_type": "ALL", "rows_examined_per_scan": 2400000,
+                       "rows_produced_per_join": 240000}},
+            {"table": {"table_name": "customers", "access_type": "eq_ref", "rows_examined_per_scan": 1,
+                       "rows_produced_per_join": 240000}}
+        ]
+    }
+}
+
+def test_postgres_plan_summary_flags_large_seq_scans():
+    """Test row/cost estimates and that only large tables are flagged"""
+    assert postgres_seq_scan_relations(POSTGRES_PLAN) == ["orders"]
+
+    summary = summarize_postgres_plan(POSTGRES_PLAN, {"orders": 2_500_000.0})
+    assert summary["estimated_rows"] == 1200
+    assert summary["estimated_cost"] == 48210.5
+    assert summary["full_scans"] == [{"table": "orders", "rows": 2_500_000}]
+    assert summary["warnings"] == ["Full table scan on orders (~2,500,000 rows)"]
+
+    assert summarize_postgres_plan(POSTGRES_PLAN, {"orders": 5_000.0})["warnings"] == []
+
+def test_mysql_plan_summary():
+    """Test estimates from MySQL's nested loop JSON plan"""
+    summary = summarize_mysql_plan(MYSQL_PLAN)
+    assert summary["estimated_rows"] == 240000
+    assert summary["estimated_cost"] == pytest.approx(250713.4)
+    assert summary["full_scans"] == [{"table": "orders", "rows": 2400000}]
+
+def test_cost_limit_adds_refusal_warning(monkeypatch):
+    """Test that plans over the configured cost limit are called out"""
+    monkeypatch.setattr(settings, "QUERY_MAX_ESTIMATED_COST", 10_000.0)
+    summary = summarize_postgres_plan(POSTGRES_PLAN, {})
+    assert summary["warnings"][-1].startswith("Estimated cost 48,210 exceeds the limit of 10,000")
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,132 @@
+import pytest
+import json
+import sqlite3
+import time
+from fastapi.testclient import TestClient
+from main import app
+from app.api import query as query_api
+from app.core.security import secure_context
+from app.middleware.auth import get_current_user
+
+TEST_USER = {"user_id": "user-1", "email": "user@example.com", "role": "authenticated"}
+
+@pytest.fixture
+def client():
+    app.dependency_overrides[get_current_user] = lambda: TEST_USER
+    # One client for the whole test keeps background jobs on a single event loop
+    with TestClient(app) as test_client:
+        yield test_client
+    app.dependency_overrides.clear()
+
+@pytest.fixture
+def session_id(tmp_path):
+    """Session bound to a small sqlite database standing in for a remote one"""
+    db_path = tmp_path / "remote.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE n (x INTEGER)")
+        conn.executemany("INSERT INTO n VALUES (?)", [(i,) for i in range(300)])
+
+    sid = secure_context.create_session(TEST_USER["user_id"], {"connection_string": f"sqlite:///{db_path}"})
+    yield sid
+    secure_context.destroy_session(sid)
+
+def _submit(client, session_id: str, sql: str):
+    query_id = f"job-{len(query_api._query_cache)}-{abs(hash(sql))}"
+    query_api._query_cache[query_id] = {
+        "sql": sql, "prompt": "test prompt", "session_id": session_id, "user_id": TEST_USER["user_id"]
+    }
+    return client.post("/query/jobs", json={"query_id": query_id, "sql_query": sql, "confirm_execution": True})
+
+def _wait(client, job_id: str, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = client.get(f"/query/jobs/{job_id}").json()
+        if status["finished_at"]:
+            return status
+        time.sleep(0.05)
+    raise AssertionError("job did not finish")
+
+def test_job_runs_in_background_and_pages_results(client, session_id):
+    """Test submit, poll until done, then fetch the result page by page"""
+    response = _submit(client, session_id, "SELECT x FROM n ORDER BY x")
+    assert response.status_code == 202
+    assert response.json()["status"] in ("queued", "running")
+
+    status = _wait(client, response.json()["job_id"])
+    assert status["status"] == "succeeded"
+    assert status["rows_fetched"] == status["row_count"] == 300
+
+    rows, offset = [], 0
+    while offset is not None:
+        page = client.get(f"/query/jobs/{status['job_id']}/results", params={"offset": offset, "limit": 128}).json()
+        rows.extend(row["x"] for row in page["data"])
+        offset = page["next_offset"]
+    assert rows == list(range(300))
+
+def test_job_events_stream_until_done(client, session_id):
+    """Test that the SSE stream ends with a done event carrying the final status"""
+    job_id = _submit(client, session_id, "SELECT x FROM n").json()["job_id"]
+
+    response = client.get(f"/query/jobs/{job_id}/events")
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [block.split("\n") for block in response.text.strip().split("\n\n")]
+    event, data = events[-1]
+    assert event == "event: done"
+    assert json.loads(data[len("data: "):])["status"] == "succeeded"
+
+def test_job_can_be_cancelled(client, session_id):
+    """Test that deleting a running job interrupts it and results are refused"""
+    job_id = _submit(client, session_id, "SELECT count(*) FROM n a, n b, n c, n d").json()["job_id"]
+    time.sleep(0.3)
+
+    assert client.delete(f"/query/jobs/{job_id}").status_code == 200
+
+    status = _wait(client, job_id)
+    assert status["status"] == "cancelled"
+    assert client.get(f"/query/jobs/{job_id}/results").status_code == 409
+
+def test_jobs_are_private_to_their_owner(client, session_id):
+    """Test that another user can't see, fetch or cancel a job"""
+    job_id = _submit(client, session_id, "SELECT x FROM n").json()["job_id"]
+    _wait(client, job_id)
+
+    app.dependency_overrides[get_current_user] = lambda: {**TEST_USER, "user_id": "someone-else"}
+    assert client.get(f"/query/jobs/{job_id}").status_code == 404
+    assert client.get(f"/query/jobs/{job_id}/results").status_code == 404
+    assert client.delete(f"/query/jobs/{job_id}").status_code == 404
+
+def test_expired_jobs_are_cleaned_up(client, session_id, monkeypatch):
+    """Test that finished jobs are dropped once their TTL has passed"""
+    from app.core.config import settings
+    from app.services.query_jobs import query_jobs
+    monkeypatch.setattr(settings, "QUERY_JOB_RESULT_TTL_SECONDS", 0)
+    job_id = _submit(client, session_id, "SELECT x FROM n").json()["job_id"]
+    time.sleep(0.3)
+
+    assert query_jobs.cleanup_expired() >= 1
+    assert client.get(f"/query/jobs/{job_id}").status_code == 404
+
+def test_spilled_job_results_live_as_long_as_the_job(client, session_id, monkeypatch):
+    """Test that the spill TTL doesn't delete a finished job's file early, and a lost file answers 410"""
+    from app.core.config import settings
+    from app.services.query_jobs import query_jobs
+    from app.services.result_spill import spill_store
+    monkeypatch.setattr(settings, "RESULT_SPILL_THRESHOLD_BYTES", 500)
+    monkeypatch.setattr(settings, "RESULT_SPILL_TTL_SECONDS", 0)
+    job_id = _submit(client, session_id, "SELECT x FROM n").json()["job_id"]
+    _wait(client, job_id)
+    time.sleep(0.05)
+
+    assert spill_store.cleanup_expired() == 0
+    assert spill_store.stats()["files"] == 1
+    response = client.get(f"/query/jobs/{job_id}/results", params={"offset": 250, "limit": 10})
+    assert response.status_code == 200
+    assert [row["x"] for row in response.json()["data"]] == list(range(250, 260))
+
+    spill_store.release(query_jobs._jobs[job_id]['result'])
+    response = client.get(f"/query/jobs/{job_id}/results")
+    assert response.status_code == 410
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,114 @@
+import pytest
+import asyncio
+from app.services.query_scheduler import QueryScheduler, QueryPriority, QueueFullError
+
+async def _hold(scheduler, user_id, order, release, session_id=None, priority=QueryPriority.INTERACTIVE):
+    async with scheduler.slot(user_id, session_id, priority=priority):
+        order.append(user_id)
+        await release.wait()
+
+@pytest.mark.asyncio
+async def test_per_user_limit_queues_extra_queries():
+    """Test that a user cannot exceed their concurrency limit"""
+    scheduler = QueryScheduler(max_concurrent=10, max_per_user=1, max_per_session=5)
+    order, release = [], asyncio.Event()
+
+    tasks = [asyncio.create_task(_hold(scheduler, 'user1', order, release)) for _ in range(2)]
+    await asyncio.sleep(0.01)
+
+    assert scheduler.stats()["running"] == 1
+    assert scheduler.stats()["queued"] == 1
+
+    release.set()
+    await asyncio.gather(*tasks)
+    assert order == ['user1', 'user1']
+    assert scheduler.stats() == {"running": 0, "queued": 0, "max_concurrent": 10}
+
+@pytest.mark.asyncio
+async def test_other_users_are_not_starved():
+    """Test that a busy user doesn't block another user's queries"""
+    scheduler = QueryScheduler(max_concurrent=10, max_per_user=1, max_per_session=5)
+    order, release = [], asyncio.Event()
+
+    busy = [asyncio.create_task(_hold(scheduler, 'busy', order, release)) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    other = asyncio.create_task(_hold(scheduler, 'other', order, release))
+    await asyncio.sleep(0.01)
+
+    assert order == ['busy', 'other']
+
+    release.set()
+    await asyncio.gather(*busy, other)
+
+@pytest.mark.asyncio
+async def test_interactive_queries_run_before_exports():
+    """Test that interactive work is dispatched ahead of queued exports"""
+    scheduler = QueryScheduler(max_concurrent=1, max_per_user=5, max_per_session=5)
+    order, release = [], asyncio.Event()
+
+    first = asyncio.create_task(_hold(scheduler, 'a', order, release))
+    await asyncio.sleep(0.01)
+    export = asyncio.create_task(_hold(scheduler, 'export', order, release, priority=QueryPriority.EXPORT))
+    await asyncio.sleep(0.01)
+    preview = asyncio.create_task(_hold(scheduler, 'preview', order, release))
+    await asyncio.sleep(0.01)
+
+    release.set()
+    await asyncio.gather(first, export, preview)
+    assert order == ['a', 'preview', 'export']
+
+@pytest.mark.asyncio
+async def test_queue_depth_limit_raises_with_retry_after():
+    """Test that overflowing the queue is rejected with a retry hint"""
+    scheduler = QueryScheduler(max_concurrent=1, max_per_user=1, max_per_session=1, max_queue_depth=1)
+    order, release = [], asyncio.Event()
+
+    running = asyncio.create_task(_hold(scheduler, 'a', order, release))
+    queued = asyncio.create_task(_hold(scheduler, 'b', order, release))
+    await asyncio.sleep(0.01)
+
+    with pytest.raises(QueueFullError) as exc_info:
+        async with scheduler.slot('c'):
+            pass
+    assert exc_info.value.retry_after >= 1
+
+    release.set()
+    await asyncio.gather(running, queued)
+
+@pytest.mark.asyncio
+async def test_queue_timeout_frees_waiter():
+    """Test that a waiter that times out leaves the queue"""
+    scheduler = QueryScheduler(max_concurrent=1, max_per_user=1, max_per_session=1, queue_timeout=0.05)
+    order, release = [], asyncio.Event()
+
+    running = asyncio.create_task(_hold(scheduler, 'a', order, release))
+    await asyncio.sleep(0.01)
+
+    with pytest.raises(QueueFullError):
+        async with scheduler.slot('b'):
+            pass
+    assert scheduler.stats()["queued"] == 0
+
+    release.set()
+    await running
+
+@pytest.mark.asyncio
+async def test_cancel_racing_grant_releases_slot():
+    """Test that a waiter cancelled in the same tick its slot is granted hands the slot back"""
+    scheduler = QueryScheduler(max_concurrent=1, max_per_user=1, max_per_session=1)
+    order, release = [], asyncio.Event()
+
+    async with scheduler.slot('a'):
+        waiter = asyncio.create_task(_hold(scheduler, 'b', order, release))
+        await asyncio.sleep(0.01)
+    # Leaving the slot grants it to the waiter; cancel before the waiter resumes
+    waiter.cancel()
+    release.set()
+
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert order == []
+    assert scheduler.stats() == {"running": 0, "queued": 0, "max_concurrent": 1}
+
+if __name__ == "__main__":
+    pytest.main([__file__])
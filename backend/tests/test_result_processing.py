@@ -0,0 +1,162 @@
+import pytest
+from datetime import date
+from app.services.result_cache import ResultCache, normalize_sql
+from app.services.columnar import ColumnarResult
+
+def _result(rows):
+    return {"success": True, "data": rows, "columns": ["id"], "row_count": len(rows), "message": ""}
+
+def test_normalize_sql_preserves_literals():
+    """Test that whitespace is collapsed outside string literals only"""
+    assert normalize_sql("SELECT  id\n FROM t WHERE name = 'a  b' ;") == "SELECT id FROM t WHERE name = 'a  b'"
+    assert normalize_sql("select id from t") != normalize_sql("select id from T")
+
+def test_result_cache_hits_by_normalized_sql_and_role():
+    """Test that equivalent SQL hits and a different role misses"""
+    cache = ResultCache(max_bytes=1024 * 1024, ttl_seconds=60)
+    cache.put("fp", "SELECT id FROM t", "authenticated", _result([{"id": 1}]), "s1")
+
+    hit = cache.get("fp", "SELECT id\n  FROM t;", "authenticated")
+    assert hit is not None and hit[0]["data"] == [{"id": 1}]
+    assert cache.get("fp", "SELECT id FROM t", "admin") is None
+    assert cache.get("other-db", "SELECT id FROM t", "authenticated") is None
+
+def test_result_cache_evicts_by_byte_budget():
+    """Test LRU eviction once the byte budget is exceeded"""
+    rows = [{"id": i} for i in range(20)]
+    cache = ResultCache(max_bytes=10_000, ttl_seconds=60)
+
+    cache.put("fp", "SELECT 1", None, _result(rows))
+    cache.put("fp", "SELECT 2", None, _result(rows))
+    cache.get("fp", "SELECT 1", None)  # touch: SELECT 2 is now least recently used
+    cache.put("fp", "SELECT 3", None, _result(rows))
+
+    assert cache.stats()["bytes"] <= 10_000
+    assert cache.get("fp", "SELECT 2", None) is None
+    assert cache.get("fp", "SELECT 1", None) is not None
+
+def test_result_cache_ttl_and_session_invalidation():
+    """Test expiry and that entries are dropped when their last session ends"""
+    cache = ResultCache(max_bytes=1024 * 1024, ttl_seconds=60)
+    cache.put("fp", "SELECT 1", None, _result([{"id": 1}]), "s1")
+    cache.get("fp", "SELECT 1", None, session_id="s2")
+
+    cache.invalidate_session("s1")
+    assert cache.get("fp", "SELECT 1", None) is not None  # still used by s2
+    cache.invalidate_session("s2")
+    assert cache.get("fp", "SELECT 1", None) is None
+
+    expiring = ResultCache(max_bytes=1024 * 1024, ttl_seconds=1)
+    expiring.put("fp", "SELECT 1", None, _result([{"id": 1}]))
+    expiring._entries[next(iter(expiring._entries))]['stored_at'] -= 5
+    assert expiring.get("fp", "SELECT 1", None) is None
+
+def test_columnar_result_round_trips_rows():
+    """Test typed column inference and the legacy row-dict view"""
+    rows = [(1, 1.5, "eu", date(2024, 1, 1)), (2, 3.0, None, date(2024, 1, 2)), (2 ** 70, 4.5, "us", None)]
+    table = ColumnarResult.from_rows(["id", "total", "region", "day"], rows)
+
+    assert table.types == ["object", "float64", "object", "object"]  # id overflows int64
+    assert table.to_records()[1] == {"id": 2, "total": 3.0, "region": None, "day": date(2024, 1, 2)}
+
+    view = table.records()
+    assert len(view) == 3
+    assert view[-1]["id"] == 2 ** 70
+    assert list(view[1:]) == table.to_records()[1:]
+    assert table.to_columnar_json()["data"][1] == [1.5, 3.0, 4.5]
+
+def test_columnar_result_packs_numeric_columns():
+    """Test that numeric columns are stored packed and serialize as plain values"""
+    table = ColumnarResult.from_rows(["id", "flag"], [(i, i % 2 == 0) for i in range(1000)])
+
+    assert table.types == ["int64", "bool"]
+    assert table.nbytes() < 20_000
+    body = table.slice(10, 12).to_columnar_json()
+    assert body["data"] == [[10, 11], [True, False]]
+    assert type(body["data"][0][0]) is int
+
+def test_columnar_result_arrow_ipc():
+    """Test the Arrow IPC stream carries values and metadata"""
+    pa = pytest.importorskip("pyarrow")
+    table = ColumnarResult.from_rows(["id", "day"], [(1, date(2024, 1, 1)), (2, None)])
+
+    body = table.to_arrow_ipc({"row_count": "2"})
+    decoded = pa.ipc.open_stream(body).read_all()
+
+    assert decoded.column_names == ["id", "day"]
+    assert decoded.to_pydict() == {"id": [1, 2], "day": [date(2024, 1, 1), None]}
+    assert decoded.schema.metadata[b"row_count"] == b"2"
+
+def test_json_records_match_pydantic_serialization():
+    """Test that per-column conversion produces exactly what a response model would"""
+    import json
+    from decimal import Decimal
+    from datetime import datetime, time, timedelta, timezone
+    from uuid import UUID
+    from pydantic import BaseModel
+    from typing import Any, Dict, List
+    from app.core.json_encoding import dumps, dumps_bytes
+
+    class Rows(BaseModel):
+        data: List[Dict[str, Any]]
+
+    rows = [
+        (1, Decimal("1.50"), datetime(2024, 1, 2, 3, 4, 5), datetime(2024, 1, 2, tzinfo=timezone.utc),
+         date(2024, 1, 2), time(1, 2), timedelta(seconds=90), UUID(int=7), b"abc", "x", 1.5),
+        (2, None, None, None, None, None, None, None, None, None, None),
+        (3, Decimal("3"), datetime(2024, 2, 1), None, date(2024, 2, 1), None, None, UUID(int=8), b"", 4, True),
+    ]
+    table = ColumnarResult.from_rows([f"c{i}" for i in range(11)], rows)
+
+    expected = Rows(data=table.to_records()).model_dump(mode="json")["data"]
+    assert json.loads(dumps_bytes(table.to_json_records())) == expected
+
+    # NDJSON rows and columnar JSON encode the raw values the same way
+    columns = table.columns
+    assert [dict(zip(columns, json.loads(dumps(list(row))))) for row in rows] == expected
+    columnar = json.loads(dumps(table.to_columnar_json()))["data"]
+    assert [dict(zip(columns, row)) for row in zip(*columnar)] == expected
+
+def test_json_column_handles_binary_without_failing():
+    """Test that non-UTF-8 bytes and memoryviews encode (as base64) instead of erroring"""
+    from app.core.json_encoding import json_column
+    assert json_column([memoryview(b"hi"), b"\xff\x00", None]) == ["hi", "/wA=", None]
+
+def test_collector_spills_past_threshold_and_reads_back_slices(monkeypatch, tmp_path):
+    """Test that rows past the spill threshold go to a mapped file and slice back intact"""
+    from decimal import Decimal
+    from app.core.config import settings
+    from app.services.result_spill import ResultCollector, SpilledResult, spill_store
+    monkeypatch.setattr(settings, "RESULT_SPILL_THRESHOLD_BYTES", 10_000)
+    monkeypatch.setattr(settings, "RESULT_SPILL_DIR", str(tmp_path))
+    rows = [(i, f"name-{i}", Decimal(i) / 4) for i in range(1000)]
+
+    collector = ResultCollector("session-1")
+    for start in range(0, 1000, 100):
+        assert collector.add(["id", "name", "amount"], rows[start:start + 100])
+    result = collector.finish()
+
+    assert isinstance(result, SpilledResult)
+    assert result.row_count == 1000
+    assert result.nbytes() < result.disk_bytes()
+    assert list(result.slice(495, 505).iter_rows()) == rows[495:505]
+    assert result.slice(990, 2000).to_records()[-1] == {"id": 999, "name": "name-999", "amount": Decimal("249.75")}
+    assert spill_store.stats()["files"] == 1
+
+    spill_store.invalidate_session("session-1")
+    assert result.closed
+    assert spill_store.stats()["files"] == 0
+
+def test_small_results_stay_in_memory(monkeypatch):
+    """Test that results under the threshold never touch disk"""
+    from app.core.config import settings
+    from app.services.result_spill import ResultCollector
+    monkeypatch.setattr(settings, "RESULT_SPILL_THRESHOLD_BYTES", 10_000_000)
+
+    collector = ResultCollector("session-1")
+    collector.add(["id"], [(1,), (2,)])
+
+    assert isinstance(collector.finish(), ColumnarResult)
+
+if __name__ == "__main__":
+    pytest.main([__file__])
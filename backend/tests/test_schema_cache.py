@@ -0,0 +1,81 @@
+import asyncio
+import pytest
+import sqlite3
+from app.core.config import settings
+from app.services.database_cloud import CloudDatabaseService
+from app.services.schema_cache import SchemaCache
+
+@pytest.fixture
+def database(tmp_path):
+    db_path = tmp_path / "catalog.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE orders (id INTEGER PRIMARY KEY, total REAL)")
+    return db_path
+
+@pytest.fixture
+def loads(monkeypatch):
+    """Count full schema loads"""
+    calls = []
+    original = CloudDatabaseService._load_schema_info_async
+
+    async def counting(connection_string):
+        calls.append(connection_string)
+        await asyncio.sleep(0.02)
+        return await original(connection_string)
+
+    monkeypatch.setattr(CloudDatabaseService, "_load_schema_info_async", staticmethod(counting))
+    return calls
+
+@pytest.mark.asyncio
+async def test_fresh_entries_skip_the_database(database, loads):
+    """Test that concurrent misses load once and later lookups need no round trip"""
+    cache = SchemaCache()
+    connection_string = f"sqlite:///{database}"
+
+    results = await asyncio.gather(*(cache.get(connection_string) for _ in range(3)))
+
+    assert len(loads) == 1
+    assert results[0]["columns"] == {"orders": ["id", "total"]}
+    assert cache.lookup(connection_string) is results[0]
+    assert len(loads) == 1
+
+@pytest.mark.asyncio
+async def test_stale_entries_revalidate_against_schema_version(database, loads, monkeypatch):
+    """Test stale-while-revalidate: unchanged versions keep the entry, DDL triggers a reload"""
+    cache = SchemaCache()
+    connection_string = f"sqlite:///{database}"
+    first = await cache.get(connection_string)
+    monkeypatch.setattr(settings, "SCHEMA_CACHE_FRESH_SECONDS", 0)
+
+    # Unchanged: the stale entry is served and the version check finds nothing to reload
+    assert cache.lookup(connection_string) is first
+    await asyncio.sleep(0.05)
+    assert len(loads) == 1
+
+    with sqlite3.connect(database) as conn:
+        conn.execute("ALTER TABLE orders ADD COLUMN region TEXT")
+
+    # Changed: the stale entry is still served once, then replaced in the background
+    assert cache.lookup(connection_string) is first
+    await asyncio.sleep(0.1)
+    assert len(loads) == 2
+    assert cache.lookup(connection_string)["columns"]["orders"] == ["id", "total", "region"]
+
+@pytest.mark.asyncio
+async def test_successful_migration_invalidates_schema(database, monkeypatch):
+    """Test that executing a migration drops the cached schema for that database"""
+    from app.services.schema_service import schema_service, SchemaProposal
+    cache = SchemaCache()
+    monkeypatch.setattr("app.services.schema_service.schema_cache", cache)
+    connection_string = f"sqlite:///{database}"
+    await cache.get(connection_string)
+
+    proposal = SchemaProposal("p-1", "admin", "s-1", "add customers", "CREATE TABLE customers (id INTEGER)", "")
+    result = await schema_service._execute_migration(proposal, connection_string)
+
+    assert result["success"]
+    assert cache.lookup(connection_string) is None
+    assert "customers" in (await cache.get(connection_string))["tables"]
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,113 @@
+import pytest
+import sqlite3
+from app.services.database_cloud import CloudDatabaseService
+from app.services.schema_introspection import _assemble, render_schema, schema_summary
+
+@pytest.fixture
+def shop_db(tmp_path):
+    db_path = tmp_path / "shop.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.executescript("""
+            CREATE TABLE customers (id INTEGER PRIMARY KEY, email TEXT NOT NULL);
+            CREATE TABLE orders (
+                id INTEGER PRIMARY KEY,
+                customer_id INTEGER NOT NULL REFERENCES customers(id),
+                total NUMERIC
+            );
+            CREATE UNIQUE INDEX customers_email ON customers (email);
+            CREATE VIEW big_orders AS SELECT * FROM orders WHERE total > 100;
+        """)
+    return f"sqlite:///{db_path}"
+
+@pytest.mark.asyncio
+async def test_schema_info_includes_columns_keys_and_indexes(shop_db):
+    """Test the column-level schema model and the {table: [column]} map"""
+    result = await CloudDatabaseService.get_schema_info_async(shop_db)
+
+    assert result["success"]
+    assert result["tables"] == ["big_orders", "customers", "orders"]
+    assert result["columns"]["orders"] == ["id", "customer_id", "total"]
+
+    orders = result["schema"]["orders"]
+    assert orders["primary_key"] == ["id"]
+    assert orders["columns"][1] == {"name": "customer_id", "type": "integer", "nullable": False}
+    assert orders["foreign_keys"][0]["references"] == "customers"
+    assert orders["foreign_keys"][0]["referenced_columns"] == ["id"]
+    assert result["schema"]["customers"]["indexes"] == [{"name": "customers_email", "columns": ["email"], "unique": True}]
+    assert result["schema"]["big_orders"]["kind"] == "view"
+
+def test_catalog_rows_assemble_into_schema_model():
+    """Test assembling the single-query catalog document (PostgreSQL / MySQL shape)"""
+    document = {
+        "tables": [["orders", False], ["customers", False]],
+        "columns": [
+            ["orders", "customer_id", "integer", False, 2],
+            ["orders", "id", "bigint", False, 1],
+            ["customers", "id", "bigint", False, 1],
+            ["orders", "note", "text", True, 3],
+        ],
+        "keys": [
+            ["orders", "orders_pkey", "p", "id", 1, None, None],
+            ["orders", "orders_customer_fk", "f", "customer_id", 1, "customers", "id"],
+            ["customers", "customers_pkey", "p", "id", 1, None, None],
+        ],
+        "indexes": [
+            ["orders", "orders_customer_note", False, "note", 2],
+            ["orders", "orders_customer_note", False, "customer_id", 1],
+        ],
+    }
+
+    tables = _assemble(document)
+
+    assert list(tables) == ["customers", "orders"]
+    assert [c["name"] for c in tables["orders"]["columns"]] == ["id", "customer_id", "note"]
+    assert tables["orders"]["primary_key"] == ["id"]
+    assert tables["orders"]["foreign_keys"] == [
+        {"name": "orders_customer_fk", "columns": ["customer_id"], "references": "customers", "referenced_columns": ["id"]}
+    ]
+    assert tables["orders"]["indexes"] == [
+        {"name": "orders_customer_note", "columns": ["customer_id", "note"], "unique": False}
+    ]
+    # Empty schemas come back as NULL aggregates
+    assert _assemble({"tables": None, "columns": None, "keys": None, "indexes": None}) == {}
+
+def test_same_named_tables_in_other_schemas_stay_separate():
+    """Test catalog rows for tables outside the first search_path schema (named schema.table)"""
+    tables = _assemble({
+        "tables": [["orders", False], ["archive.orders", False], ["archive.customers", False]],
+        "columns": [
+            ["orders", "id", "bigint", False, 1],
+            ["archive.orders", "order_id", "bigint", False, 1],
+            ["archive.orders", "customer_id", "bigint", True, 2],
+        ],
+        "keys": [
+            ["orders", "orders_pkey", "p", "id", 1, None, None],
+            ["archive.orders", "orders_pkey", "p", "order_id", 1, None, None],
+            ["archive.orders", "orders_customer_fk", "f", "customer_id", 1, "archive.customers", "id"],
+        ],
+    })
+
+    assert list(tables) == ["archive.customers", "archive.orders", "orders"]
+    assert [c["name"] for c in tables["orders"]["columns"]] == ["id"]
+    assert tables["orders"]["primary_key"] == ["id"]
+    assert tables["archive.orders"]["primary_key"] == ["order_id"]
+    assert render_schema(schema_summary(tables)).splitlines()[1] == (
+        "- archive.orders(order_id bigint PK, customer_id bigint -> archive.customers.id)"
+    )
+
+def test_render_schema_for_prompt():
+    """Test the compact one-line-per-table prompt rendering"""
+    tables = _assemble({
+        "tables": [["orders", False]],
+        "columns": [["orders", "id", "integer", False, 1], ["orders", "customer_id", "integer", True, 2]],
+        "keys": [
+            ["orders", "pk", "p", "id", 1, None, None],
+            ["orders", "fk", "f", "customer_id", 1, "customers", "id"],
+        ],
+    })
+
+    assert render_schema(schema_summary(tables)) == "- orders(id integer PK, customer_id integer -> customers.id)"
+    assert render_schema({"tables": ["legacy"]}) == "- legacy"
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,72 @@
+import pytest
+from app.services.llm_service import llm_service
+from app.services.schema_introspection import _assemble, schema_summary, render_schema
+from app.services.schema_retrieval import tokenize, prune_schema
+
+def _schema(noise_tables: int):
+    """A small shop schema hidden among many unrelated tables"""
+    tables = [["customers", False], ["orders", False], ["order_items", False], ["products", False],
+              ["inv_hdr", False, "Invoices issued to clients"]]
+    columns = [
+        ["customers", "id", "bigint", False, 1], ["customers", "fullName", "text", False, 2],
+        ["orders", "id", "bigint", False, 1], ["orders", "customer_id", "bigint", False, 2],
+        ["orders", "placed_at", "timestamp", False, 3],
+        ["order_items", "order_id", "bigint", False, 1], ["order_items", "product_id", "bigint", False, 2],
+        ["order_items", "quantity", "integer", False, 3],
+        ["products", "id", "bigint", False, 1], ["products", "sku", "text", False, 2],
+        ["inv_hdr", "id", "bigint", False, 1],
+    ]
+    keys = [
+        ["orders", "orders_customer_fk", "f", "customer_id", 1, "customers", "id"],
+        ["order_items", "items_order_fk", "f", "order_id", 1, "orders", "id"],
+        ["order_items", "items_product_fk", "f", "product_id", 1, "products", "id"],
+    ]
+    for i in range(noise_tables):
+        name = f"telemetry_shard_{i}"
+        tables.append([name, False])
+        columns += [[name, "event_id", "bigint", False, 1], [name, "payload", "jsonb", True, 2]]
+    return schema_summary(_assemble({"tables": tables, "columns": columns, "keys": keys}))
+
+def test_tokenize_splits_identifiers_and_folds_plurals():
+    """Test snake_case, camelCase and digit splitting with stopwords dropped"""
+    assert tokenize("customerOrderID") == ["customer", "order", "id"]
+    assert tokenize("order_items_v2") == ["order", "item", "v", "2"]
+    assert tokenize("Show me all the categories") == ["category"]
+
+def test_prune_keeps_matches_and_foreign_key_neighbours():
+    """Test that the best-matching tables and the tables they join to are kept"""
+    pruned = prune_schema(_schema(200), "top customers by number of orders")
+
+    assert pruned["total_tables"] == 205
+    assert {"customers", "orders"} <= set(pruned["tables"])
+    assert not any(name.startswith("telemetry") for name in pruned["tables"])
+
+    pruned = prune_schema(_schema(200), "best selling product skus")
+    assert {"products", "order_items"} <= set(pruned["tables"])
+
+def test_prune_matches_comments():
+    """Test that table comments are searchable"""
+    assert "inv_hdr" in prune_schema(_schema(200), "unpaid invoices")["tables"]
+
+def test_prompt_size_stays_flat_as_schema_grows():
+    """Test that the rendered schema does not grow with the number of tables"""
+    small = render_schema(prune_schema(_schema(100), "orders per customer"))
+    large = render_schema(prune_schema(_schema(2000), "orders per customer"))
+
+    assert small.splitlines()[:-1] == large.splitlines()[:-1]
+    assert large.endswith("of 2005 tables shown: those most relevant to the request)")
+
+def test_small_schemas_are_not_pruned():
+    """Test that schemas within the prompt budget are passed through whole"""
+    schema = _schema(0)
+    assert prune_schema(schema, "anything") is schema
+
+def test_system_prompt_uses_relevant_tables():
+    """Test that the LLM system prompt lists the pruned schema with columns"""
+    prompt = llm_service._build_system_prompt(_schema(200), "orders per customer")
+
+    assert "- orders(id bigint, customer_id bigint -> customers.id, placed_at timestamp)" in prompt
+    assert "telemetry_shard" not in prompt
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,80 @@
+import asyncio
+import pytest
+from app.services.single_flight import SingleFlight
+from app.services.database_cloud import CloudDatabaseService
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    """Test that callers with the same key get the leader's result without re-running it"""
+    flight = SingleFlight("test")
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"success": True, "rows": [1, 2, 3]}
+
+    results = await asyncio.gather(*(flight.do("k", work) for _ in range(5)))
+
+    assert len(calls) == 1
+    assert all(r is results[0] for r in results)
+    assert flight.in_flight() == 0
+
+@pytest.mark.asyncio
+async def test_errors_are_shared_and_not_remembered():
+    """Test that a failure reaches every waiter and the next call runs fresh"""
+    flight = SingleFlight("test")
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    results = await asyncio.gather(flight.do("k", failing), flight.do("k", failing), return_exceptions=True)
+    assert [str(r) for r in results] == ["boom", "boom"]
+
+    with pytest.raises(RuntimeError):
+        await flight.do("k", failing)
+    assert len(calls) == 2
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_others():
+    """Test that one waiter going away leaves the shared execution running"""
+    flight = SingleFlight("test")
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    first = asyncio.create_task(flight.do("k", work))
+    second = asyncio.create_task(flight.do("k", work))
+    await asyncio.sleep(0.01)
+    first.cancel()
+
+    assert await second == "done"
+
+@pytest.mark.asyncio
+async def test_concurrent_schema_lookups_coalesce(tmp_path, monkeypatch):
+    """Test that get_schema_info_async runs once for concurrent callers on the same database"""
+    import sqlite3
+    db_path = tmp_path / "schema.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE customers (id INTEGER PRIMARY KEY)")
+
+    calls = []
+    original = CloudDatabaseService._load_schema_info_async
+
+    async def counting(connection_string):
+        calls.append(connection_string)
+        await asyncio.sleep(0.05)
+        return await original(connection_string)
+
+    monkeypatch.setattr(CloudDatabaseService, "_load_schema_info_async", staticmethod(counting))
+    results = await asyncio.gather(*(CloudDatabaseService.get_schema_info_async(f"sqlite:///{db_path}") for _ in range(3)))
+
+    assert len(calls) == 1
+    assert results[0] == results[1] == results[2]
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,140 @@
+import pytest
+from app.services.sql_rewriter import rewrite_query, sample_query, partition_target, partition_query, sql_dialect
+
+SCHEMA = {"orders": ["id", "total", "region"], "customers": ["id", "name"]}
+
+@pytest.mark.parametrize("sql, expected, change", [
+    ("SELECT id FROM orders", "SELECT id FROM orders LIMIT 100", "Added LIMIT 100"),
+    ("SELECT id FROM orders ORDER BY id LIMIT 5000 OFFSET 10", "SELECT id FROM orders ORDER BY id LIMIT 100 OFFSET 10", "Reduced LIMIT 5000 to 100"),
+    ("SELECT id FROM orders FETCH FIRST 500 ROWS ONLY", "SELECT id FROM orders LIMIT 100", "Reduced LIMIT 500 to 100"),
+    ("SELECT a FROM t UNION SELECT b FROM u", "SELECT a FROM t UNION SELECT b FROM u LIMIT 100", "Added LIMIT 100"),
+])
+def test_rewrite_bounds_outer_limit(sql, expected, change):
+    """Test that the outermost query always ends up with a bounded LIMIT"""
+    result = rewrite_query(sql, "postgres", max_limit=100)
+    assert result["sql"] == expected
+    assert result["changes"] == [change]
+
+def test_rewrite_leaves_bounded_queries_verbatim():
+    """Test that queries already within bounds are not regenerated"""
+    sql = "select id  from orders where note = 'limit 9999' limit 10;"
+    assert rewrite_query(sql, "postgres", max_limit=100) == {"sql": sql, "changes": []}
+
+def test_rewrite_expands_star_from_schema():
+    """Test SELECT * expansion for single tables, joins and qualified stars"""
+    single = rewrite_query("SELECT * FROM orders LIMIT 5", "postgres", schema_columns=SCHEMA)
+    assert single["sql"] == 'SELECT "id", "total", "region" FROM orders LIMIT 5'
+
+    joined = rewrite_query("SELECT c.*, o.total FROM orders o JOIN customers c ON c.id = o.id LIMIT 5",
+                           "mysql", schema_columns=SCHEMA)
+    assert joined["sql"] == "SELECT `c`.`id`, `c`.`name`, o.total FROM orders AS o JOIN customers AS c ON c.id = o.id LIMIT 5"
+
+    # Schema-qualified references use the schema.table entry, never a same-named table elsewhere
+    archived = rewrite_query("SELECT * FROM archive.orders LIMIT 5", "postgres",
+                             schema_columns={**SCHEMA, "archive.orders": ["order_id"]})
+    assert archived["sql"] == 'SELECT "order_id" FROM archive.orders LIMIT 5'
+    assert "*" in rewrite_query("SELECT * FROM other.orders LIMIT 5", "postgres", schema_columns=SCHEMA)["sql"]
+
+    # Unknown tables and subqueries are left alone
+    assert "*" in rewrite_query("SELECT * FROM invoices LIMIT 5", "postgres", schema_columns=SCHEMA)["sql"]
+    assert "*" in rewrite_query("SELECT * FROM (SELECT id FROM orders) t LIMIT 5", "postgres", schema_columns=SCHEMA)["sql"]
+
+def test_expanded_star_passes_read_only_validation(tmp_path):
+    """Test that expanding to columns like created_at / updated_at still executes end to end"""
+    import sqlite3
+    from app.services.database_cloud import CloudDatabaseService
+    db_path = tmp_path / "users.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, created_at TEXT, updated_at TEXT)")
+        conn.execute("INSERT INTO users (name, created_at, updated_at) VALUES ('ada', '2024-01-01', '2024-02-01')")
+
+    rewritten = rewrite_query("SELECT * FROM users", "sqlite",
+                              schema_columns={"users": ["id", "name", "created_at", "updated_at"]})
+    assert "updated_at" in rewritten["sql"]
+
+    result = CloudDatabaseService.execute_read_only_query(f"sqlite:///{db_path}", rewritten["sql"])
+    assert result["success"], result["message"]
+    assert result["data"] == [{"id": 1, "name": "ada", "created_at": "2024-01-01", "updated_at": "2024-02-01"}]
+
+    # Keywords as whole words outside quotes are still refused
+    result = CloudDatabaseService.execute_read_only_query(f"sqlite:///{db_path}", "SELECT 1; UPDATE users SET name = 'x'")
+    assert "prohibited keyword: UPDATE" in result["message"]
+
+def test_rewrite_wraps_unparseable_sql():
+    """Test the subquery fallback when the parser can't handle the SQL"""
+    result = rewrite_query("SELECT id FROM orders WHERE (", "postgres", max_limit=10)
+    assert result["sql"] == "SELECT * FROM (SELECT id FROM orders WHERE () AS _dv_limited LIMIT 10"
+
+def test_sample_query_per_dialect():
+    """Test TABLESAMPLE on PostgreSQL and the bounded random subquery elsewhere"""
+    from app.core.config import settings
+    sql = "SELECT region, count(*) FROM orders o GROUP BY region LIMIT 10"
+
+    postgres = sample_query(sql, "postgres", 5)
+    assert postgres["sampled"]
+    assert postgres["sql"] == "SELECT region, COUNT(*) FROM orders AS o TABLESAMPLE SYSTEM (5) GROUP BY region LIMIT 10"
+
+    mysql = sample_query(sql, "mysql", 2.5)
+    assert mysql["sampled"]
+    assert f"FROM (SELECT * FROM orders WHERE RAND() < 0.025 LIMIT {settings.SQL_SAMPLE_MAX_ROWS}) AS o" in mysql["sql"]
+
+@pytest.mark.parametrize("sql, dialect", [
+    ("SELECT * FROM a JOIN b ON a.id = b.id", "postgres"),
+    ("SELECT * FROM (SELECT id FROM orders) t", "postgres"),
+    ("WITH t AS (SELECT 1 AS x) SELECT * FROM t", "postgres"),
+    ("SELECT id FROM orders UNION SELECT id FROM refunds", "mysql"),
+    ("SELECT id FROM orders", None),
+])
+def test_sample_query_skips_ineligible_queries(sql, dialect):
+    """Test that joins, subqueries, CTEs, unions and unknown engines run unsampled"""
+    result = sample_query(sql, dialect, 5)
+    assert result["sql"] == sql
+    assert not result["sampled"]
+    assert result["changes"][0].startswith("Sampling skipped")
+
+def test_sample_query_skips_views_on_postgres():
+    """Test that TABLESAMPLE is not applied to views, which PostgreSQL rejects"""
+    views = ["order_totals", "reporting.daily_sales"]
+
+    for sql in ("SELECT * FROM order_totals", "SELECT day FROM reporting.daily_sales"):
+        result = sample_query(sql, "postgres", 5, views=views)
+        assert result["sql"] == sql
+        assert not result["sampled"]
+        assert result["changes"] == ["Sampling skipped: views can't be sampled on this database"]
+
+    assert sample_query("SELECT * FROM orders", "postgres", 5, views=views)["sampled"]
+    # The random-predicate subquery works on views elsewhere
+    assert sample_query("SELECT * FROM order_totals", "mysql", 5, views=views)["sampled"]
+
+def test_partition_query_adds_open_ended_key_ranges():
+    """Test range predicates on the key, ANDed with the existing filter"""
+    sql = "SELECT id, total FROM orders o WHERE region = 'eu' OR total > 5 ORDER BY id"
+    target = partition_target(sql, "postgres")
+    assert target == {"table": "orders", "schema": None, "alias": "o", "order_by": "id"}
+
+    queries = partition_query(sql, "postgres", target, "id", ["100", "200"])
+    assert queries == [
+        "SELECT id, total FROM orders AS o WHERE (region = 'eu' OR total > 5) AND \"o\".\"id\" < 100 ORDER BY id",
+        "SELECT id, total FROM orders AS o WHERE (region = 'eu' OR total > 5) AND (\"o\".\"id\" >= 100 AND \"o\".\"id\" < 200) ORDER BY id",
+        "SELECT id, total FROM orders AS o WHERE (region = 'eu' OR total > 5) AND \"o\".\"id\" >= 200 ORDER BY id",
+    ]
+
+@pytest.mark.parametrize("sql", [
+    "SELECT region, COUNT(*) FROM orders GROUP BY region",
+    "SELECT DISTINCT region FROM orders",
+    "SELECT id FROM orders LIMIT 10",
+    "SELECT id FROM orders ORDER BY total DESC",
+    "SELECT o.id FROM orders o JOIN customers c ON c.id = o.id",
+])
+def test_partition_target_rejects_unsplittable_queries(sql):
+    """Test that queries whose ranges can't simply be concatenated stay whole"""
+    assert "reason" in partition_target(sql, "postgres")
+
+def test_sql_dialect_from_connection_string():
+    """Test dialect detection for supported backends"""
+    assert sql_dialect("postgresql://u:p@host.neon.tech/db") == "postgres"
+    assert sql_dialect("mysql+pymysql://u:p@host.psdb.cloud/db") == "mysql"
+    assert sql_dialect("not a url") is None
+
+if __name__ == "__main__":
+    pytest.main([__file__])